@@ -0,0 +1,157 @@
+"""
+流量控制：token bucket 限速與寫入路徑的併發上限，全部在行程記憶體內完成，
+被擋下的請求不會碰到資料庫。
+
+RateLimiter 每個 key（IP、使用者、帳號）一個 bucket，每秒補 rate 個 token，最多存 burst 個；
+key 數量超過 max_keys 時丟掉最久沒出現的。ConcurrencyLimiter 限制同時執行的請求數，
+額滿時最多 max_waiting 個請求排隊等 timeout 秒，佇列也滿了就直接拒絕。
+執行緒用 acquire() 排隊；asyncio（ASGI 模式）用 acquire_async() 在事件迴圈上排隊，
+不占住執行緒，兩者共用同一組名額與排隊上限。
+
+兩者都是每個行程各自計算；多個 worker 時實際上限是設定值乘上 worker 數。
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimiter:
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate            # 每秒補幾個 token
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()   # key -> [tokens, 上次補充的時間]
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def hit(self, key, now=None):
+        """取一個 token；成功回傳 0，不足時回傳還要等幾秒"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.allowed += 1
+                return 0
+            self.rejected += 1
+            return (1 - bucket[0]) / self.rate
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "keys": len(self._buckets),
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "evicted": self.evicted,
+            }
+
+
+class ConcurrencyLimiter:
+    def __init__(self, limit, max_waiting, timeout):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout          # 秒，排隊最久等多久
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self._listeners = []
+        self._stats = {"admitted": 0, "queued": 0, "rejected_full": 0, "rejected_timeout": 0, "max_active": 0}
+
+    def _take(self):
+        # 呼叫端持有 self._cond
+        self.active += 1
+        self._stats["admitted"] += 1
+        self._stats["max_active"] = max(self._stats["max_active"], self.active)
+
+    def acquire(self):
+        """取得執行名額，回傳是否成功；成功的呼叫端之後必須呼叫 release()"""
+        with self._cond:
+            if self.active >= self.limit:
+                if self.waiting >= self.max_waiting:
+                    self._stats["rejected_full"] += 1
+                    return False
+                self.waiting += 1
+                try:
+                    ok = self._cond.wait_for(lambda: self.active < self.limit, self.timeout)
+                finally:
+                    self.waiting -= 1
+                if not ok:
+                    self._stats["rejected_timeout"] += 1
+                    return False
+                self._stats["queued"] += 1
+            self._take()
+            return True
+
+    async def acquire_async(self, next_release):
+        """acquire() 的事件迴圈版本，排隊時不占執行緒
+
+        next_release() 回傳一個在下一次 release() 後完成的 future（見 add_listener()）；
+        先拿 future 再看名額，兩者之間的 release() 不會漏掉。
+        """
+        with self._cond:
+            if self.active < self.limit:
+                self._take()
+                return True
+            if self.waiting >= self.max_waiting:
+                self._stats["rejected_full"] += 1
+                return False
+            self.waiting += 1
+        deadline = time.monotonic() + self.timeout
+        try:
+            while True:
+                released = next_release()
+                with self._cond:
+                    if self.active < self.limit:
+                        self._stats["queued"] += 1
+                        self._take()
+                        return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    with self._cond:
+                        self._stats["rejected_timeout"] += 1
+                    return False
+                await asyncio.wait({released}, timeout=remaining)
+        finally:
+            with self._cond:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback()
+
+    def add_listener(self, callback):
+        """每次 release() 後呼叫 callback()（在釋放名額的執行緒上，不持有鎖）"""
+        with self._cond:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            self._listeners.remove(callback)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "max_waiting": self.max_waiting,
+                "active": self.active,
+                "waiting": self.waiting,
+                **self._stats,
+            }
@@ -0,0 +1,135 @@
+"""
+銷售統計：訂票與退票時在同一個交易內更新彙總表，儀表板只讀彙總表，
+不必在線上資料庫對 bookings 做 GROUP BY。
+
+彙總表（migration 7）：
+    sales_by_showtime   每個場次的訂單數與票數
+    sales_by_movie      每部電影的訂單數與票數
+    sales_by_day        每天（bookings.created_at 的日期，UTC）的訂單數與票數
+
+依星期、時段的上座率由 sales_by_showtime 搭配 showtimes 算出，場次表本身不大。
+彙總表與 bookings 對不上時，用 rebuild_rollups() 從頭重建。
+"""
+import time
+from collections import defaultdict
+
+from weekdays import WEEKDAY_ORDER
+
+ROLLUP_TABLES = ("sales_by_showtime", "sales_by_movie", "sales_by_day")
+
+
+def record_sales(db, changes):
+    """在目前的交易內更新彙總表，回傳處理的筆數
+
+    changes 為 (showtime_id, created_at, 訂單數, 票數) 的可迭代物件，退票時後兩者為負數。
+    先在記憶體中依場次、日期合併，每個場次、每天只寫一次。
+    """
+    by_showtime = defaultdict(lambda: [0, 0])
+    by_day = defaultdict(lambda: [0, 0])
+    count = 0
+    for showtime_id, created_at, bookings, tickets in changes:
+        entry = by_showtime[showtime_id]
+        entry[0] += bookings
+        entry[1] += tickets
+        if created_at:
+            entry = by_day[created_at[:10]]
+            entry[0] += bookings
+            entry[1] += tickets
+        count += 1
+
+    showtime_rows = [(showtime_id, b, t) for showtime_id, (b, t) in by_showtime.items()]
+    db.executemany("""
+        INSERT INTO sales_by_showtime (showtime_id, bookings, tickets) VALUES (?, ?, ?)
+        ON CONFLICT(showtime_id) DO UPDATE SET
+            bookings = bookings + excluded.bookings,
+            tickets = tickets + excluded.tickets
+    """, showtime_rows)
+    db.executemany("""
+        INSERT INTO sales_by_movie (movie_id, bookings, tickets)
+        SELECT movie_id, ?, ? FROM showtimes WHERE id = ?
+        ON CONFLICT(movie_id) DO UPDATE SET
+            bookings = bookings + excluded.bookings,
+            tickets = tickets + excluded.tickets
+    """, [(b, t, showtime_id) for showtime_id, b, t in showtime_rows])
+    db.executemany("""
+        INSERT INTO sales_by_day (day, bookings, tickets) VALUES (?, ?, ?)
+        ON CONFLICT(day) DO UPDATE SET
+            bookings = bookings + excluded.bookings,
+            tickets = tickets + excluded.tickets
+    """, [(day, b, t) for day, (b, t) in by_day.items()])
+    return count
+
+
+def rebuild_rollups(db):
+    """清空彙總表後依 bookings 重建，回傳 {"rows", "seconds"}
+
+    bookings 以游標逐列讀過一次，記憶體裡只留各場次、各日期的合計。
+    整個重建在同一個寫入交易內，期間的訂票會等它完成，不會被漏算或重複計入。
+    """
+    start = time.perf_counter()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        for table in ROLLUP_TABLES:
+            db.execute(f"DELETE FROM {table}")
+        cursor = db.execute("SELECT showtime_id, created_at, tickets FROM bookings")
+        rows = record_sales(db, ((r[0], r[1], 1, r[2]) for r in cursor))
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return {"rows": rows, "seconds": time.perf_counter() - start}
+
+
+def _occupancy(tickets, capacity):
+    return round(tickets * 100 / capacity, 1) if capacity else 0.0
+
+
+# showtimes.time 的小時；格式不對時為 NULL
+_HOUR_SQL = "CASE WHEN instr(s.time, ':') > 1 THEN CAST(substr(s.time, 1, instr(s.time, ':') - 1) AS INTEGER) END"
+
+
+def _with_occupancy(rows):
+    return [{**r, "occupancy": _occupancy(r["tickets"], r["capacity"])} for r in map(dict, rows)]
+
+
+def load_dashboard(db, days=30, top_movies=100):
+    """儀表板資料：票房前 top_movies 名電影、各星期、各時段的上座率，以及最近 days 天的每日銷售
+
+    分組都交給 SQLite 做，掃的是 showtimes 與彙總表，不碰 bookings。
+    """
+    movies = db.execute("""
+        SELECT m.title, IFNULL(r.bookings, 0) AS bookings, IFNULL(r.tickets, 0) AS tickets,
+               IFNULL(c.capacity, 0) AS capacity
+        FROM movies m
+        LEFT JOIN sales_by_movie r ON r.movie_id = m.id
+        LEFT JOIN (
+            SELECT movie_id, SUM(total_seats) AS capacity FROM showtimes GROUP BY movie_id
+        ) c ON c.movie_id = m.id
+        ORDER BY tickets DESC, m.id
+        LIMIT ?
+    """, (top_movies,)).fetchall()
+
+    def by_slot(key):
+        return db.execute(f"""
+            SELECT {key} AS slot, COUNT(*) AS showtimes,
+                   IFNULL(SUM(r.tickets), 0) AS tickets, IFNULL(SUM(s.total_seats), 0) AS capacity
+            FROM showtimes s
+            LEFT JOIN sales_by_showtime r ON r.showtime_id = s.id
+            GROUP BY slot
+        """).fetchall()
+
+    weekdays = sorted(
+        _with_occupancy(by_slot("s.weekday")),
+        key=lambda w: (WEEKDAY_ORDER.get(w["slot"], 99), w["slot"] or "")
+    )
+    hours = sorted(_with_occupancy(by_slot(_HOUR_SQL)), key=lambda h: (h["slot"] is None, h["slot"] or 0))
+    daily = [dict(r) for r in db.execute(
+        "SELECT day, bookings, tickets FROM sales_by_day ORDER BY day DESC LIMIT ?",
+        (days,)
+    )]
+    return {
+        "movies": _with_occupancy(movies),
+        "weekdays": weekdays,
+        "hours": hours,
+        "daily": daily,
+    }
@@ -1,91 +1,264 @@
-from flask import Flask, render_template, request, redirect, url_for, g, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, g, session, jsonify, send_from_directory
+from flask import before_render_template, template_rendered
+import base64
+import click
+import gzip
+import hashlib
+import json
 import sqlite3
 import os
-import uuid
-from datetime import datetime
-from collections import defaultdict
+import random
+import secrets
+import time
+import threading
+from collections import defaultdict, namedtuple
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+from markupsafe import Markup
+
+import analytics
+import booking_export
+from admission import ConcurrencyLimiter, RateLimiter
+from cache import TTLCache
+from db_pool import ConnectionPool
+from group_commit import GroupCommitWriter
+from instrumentation import Metrics, RequestTimer, TimedConnection
+from live import Broadcaster, TooManySubscribers
+from migrations import is_current, migrate
+from order_numbers import OrderNumberGenerator
+from posters import VARIANT_DIR, build_variants, poster_sources
+import seatmap
+from schedule_import import ScheduleError, format_from_filename, import_schedule, parse_schedule, validate_schedule
+from shards import ShardSet, next_booking_id
+from weekdays import normalize_time, normalize_weekday, showtime_slot
 
 
 app = Flask(__name__)
 app.secret_key = "super_secret_key"
 DATABASE = "database.db"
+DB_POOL_SIZE = 16       # 每個行程的連線數上限，0 代表不使用連線池
 
 # -------------------------
 # 資料庫連線
 # -------------------------
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    # DATABASE 被換掉或 fork 出新的 worker 時重建連線池
+    if _pool is None or _pool.database != DATABASE or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.database != DATABASE or _pool.pid != os.getpid():
+                _pool = ConnectionPool(DATABASE, size=DB_POOL_SIZE)
+    return _pool
+
 def get_db():
     if "db" not in g:
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row
+        if DB_POOL_SIZE:
+            g.db_pool = get_pool()
+            g.db = g.db_pool.acquire()
+        else:
+            g.db = sqlite3.connect(DATABASE)
+            g.db.row_factory = sqlite3.Row
+        if INSTRUMENTATION and "request_timer" in g:
+            g.db = TimedConnection(g.db, g.request_timer, SLOW_QUERY_MS / 1000)
     return g.db
 
 @app.teardown_appcontext
 def close_db(error):
     db = g.pop("db", None)
+    pool = g.pop("db_pool", None)
+    if isinstance(db, TimedConnection):
+        db = db.raw
     if db:
-        db.close()
+        if pool:
+            pool.release(db)
+        else:
+            db.close()
+
+# -------------------------
+# 效能量測（預設關閉）
+# -------------------------
+# 開啟後每個請求的時間拆成 DB / 模板 / Python 三段，寫進 Server-Timing 標頭與 /_metrics 的直方圖；
+# 超過 SLOW_QUERY_MS 的 SQL 連同語句記到 log（不記參數，避免寫出密碼）。
+INSTRUMENTATION = False
+SLOW_QUERY_MS = 50
+METRICS_TOKEN = None    # 設定後 Prometheus 以「Authorization: Bearer <token>」讀取 /_metrics；None 時只有員工能讀
+metrics = Metrics()
+
+@app.before_request
+def start_request_timer():
+    if INSTRUMENTATION:
+        g.request_timer = RequestTimer()
+
+@before_render_template.connect_via(app)
+def _template_started(sender, template, context, **extra):
+    timer = g.get("request_timer")
+    if timer:
+        timer.template_started()
+
+@template_rendered.connect_via(app)
+def _template_finished(sender, template, context, **extra):
+    timer = g.get("request_timer")
+    if timer:
+        timer.template_finished()
+
+@app.after_request
+def record_request_timing(response):
+    timer = g.pop("request_timer", None)
+    if timer is None:
+        return response
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    total, db_time, template_time, python_time = metrics.observe(route, request.method, response.status_code, timer)
+    response.headers["Server-Timing"] = (
+        f'db;dur={db_time * 1000:.2f};desc="{timer.queries} queries", '
+        f"tpl;dur={template_time * 1000:.2f}, py;dur={python_time * 1000:.2f}, total;dur={total * 1000:.2f}"
+    )
+    for seconds, sql in timer.slow_queries:
+        app.logger.warning("慢查詢 %.1fms [%s %s]：%s", seconds * 1000, request.method, route, " ".join(sql.split()))
+    return response
+
+def _metrics_token_ok():
+    if not METRICS_TOKEN:
+        return False
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and secrets.compare_digest(token.encode(), METRICS_TOKEN.encode())
+
+@app.route("/_metrics")
+def prometheus_metrics():
+    # 員工或帶著 METRICS_TOKEN 的 Prometheus 可以讀；不看來源 IP，反向代理後面每個請求都像是本機來的
+    if "employee_id" not in session and not _metrics_token_ok():
+        return jsonify({"success": False, "message": "尚未登入"}), 403
+    return app.response_class(metrics.render() + admission_metrics(), mimetype="text/plain; version=0.0.4")
+
+# -------------------------
+# 流量控制
+# -------------------------
+# 開賣時機器人會狂打訂票與登入。限速與併發上限在 before_request 判斷，
+# 超過的請求直接回 429，不會借資料庫連線。數字都是每個行程各自計算。
+ADMISSION_CONTROL = True
+LOGIN_IP_RATE = (0.5, 10)       # (每秒補幾次, 最多連續幾次)：每個 IP 的登入、註冊
+LOGIN_USER_RATE = (0.1, 5)      # 同一個帳號的登入嘗試
+BOOK_USER_RATE = (1, 5)         # 每個登入使用者的訂票、保留
+BOOK_IP_RATE = (5, 20)          # 每個 IP 的訂票、保留（NAT 後面可能是好幾個人）
+BOOKING_MAX_CONCURRENT = 4      # 同時在跑的訂票寫入；SQLite 一次只有一個寫入者，多了只是在搶鎖
+BOOKING_MAX_WAITING = 64
+BOOKING_ADMISSION_WAIT = 2      # 秒，排隊等名額的上限
+
+rate_limiters = {
+    "login_ip": RateLimiter(*LOGIN_IP_RATE),
+    "login_user": RateLimiter(*LOGIN_USER_RATE),
+    "book_user": RateLimiter(*BOOK_USER_RATE),
+    "book_ip": RateLimiter(*BOOK_IP_RATE),
+}
+booking_slots = ConcurrencyLimiter(BOOKING_MAX_CONCURRENT, BOOKING_MAX_WAITING, BOOKING_ADMISSION_WAIT)
+
+# endpoint -> [(限速器, 取 key 的函式)]；只限制 POST。
+# 依序檢查，先看範圍小的 key：被擋下的使用者不會再扣到同一個 IP 其他人的額度。
+ADMISSION_RULES = {
+    "login": [("login_user", lambda: request.form.get("username", "")), ("login_ip", lambda: request.remote_addr)],
+    "employee_login": [("login_user", lambda: "employee:" + request.form.get("username", "")),
+                       ("login_ip", lambda: request.remote_addr)],
+    "register": [("login_ip", lambda: request.remote_addr)],
+    "book": [("book_user", lambda: session.get("user_id")), ("book_ip", lambda: request.remote_addr)],
+    "hold": [("book_user", lambda: session.get("user_id")), ("book_ip", lambda: request.remote_addr)],
+}
+BOOKING_WRITE_ENDPOINTS = {"book", "hold"}
+JSON_ENDPOINTS = {"hold"}
+# ASGI 模式在事件迴圈上先做 check_admission_rules() 並取得訂票名額（見 asgi.py），
+# 結果放在 environ 的這個 key（True / False / None：不需要名額）；
+# 名額由 ASGI 端在回應送完後歸還，這裡不再占著 executor 的執行緒排隊
+BOOKING_SLOT_ENVIRON = "movie.booking_slot"
+
+def _too_many(message, retry_after):
+    if request.endpoint in JSON_ENDPOINTS:
+        response = jsonify({"success": False, "message": message})
+    else:
+        response = app.response_class(message, mimetype="text/plain")
+    response.status_code = 429
+    response.headers["Retry-After"] = str(max(int(retry_after + 0.999), 1))
+    return response
+
+def check_admission_rules():
+    """限速與登入檢查，回傳 (429 回應或 None, 是否要取訂票名額)；不排隊、不碰資料庫
+
+    WSGI 由 admission_control() 呼叫；ASGI 模式在事件迴圈上先呼叫一次（見 asgi.py），
+    通過的訂票才去排隊等名額，未登入或被限速的請求不會占到名額。
+    """
+    if not ADMISSION_CONTROL or request.method != "POST":
+        return None, False
+    for name, key in ADMISSION_RULES.get(request.endpoint, ()):
+        key = key()
+        if key is None:
+            continue    # 未登入的訂票會被導去登入頁，不必限使用者
+        retry_after = rate_limiters[name].hit(key)
+        if retry_after:
+            return _too_many("請求太頻繁，請稍後再試", retry_after), False
+    return None, request.endpoint in BOOKING_WRITE_ENDPOINTS and "user_id" in session
+
+@app.before_request
+def admission_control():
+    if BOOKING_SLOT_ENVIRON in request.environ:
+        # ASGI 模式已在事件迴圈上檢查過（限速已扣過，不要再扣一次）；None 代表不需要名額
+        if request.environ[BOOKING_SLOT_ENVIRON] is False:
+            return _too_many("目前訂票人數眾多，請稍後再試", 1)
+        return None
+    response, wants_slot = check_admission_rules()
+    if response is not None:
+        return response
+    if wants_slot:
+        if not booking_slots.acquire():
+            return _too_many("目前訂票人數眾多，請稍後再試", 1)
+        g.booking_slot = True
+    return None
+
+@app.teardown_request
+def release_booking_slot(error):
+    if g.pop("booking_slot", False):
+        booking_slots.release()
+
+def admission_metrics():
+    """流量控制計數器（Prometheus 文字格式）"""
+    lines = ["# HELP admission_requests_total 限速器放行與拒絕的請求數",
+             "# TYPE admission_requests_total counter"]
+    for name, limiter in sorted(rate_limiters.items()):
+        stats = limiter.stats()
+        for outcome in ("allowed", "rejected"):
+            lines.append(f'admission_requests_total{{limiter="{name}",outcome="{outcome}"}} {stats[outcome]}')
+    stats = booking_slots.stats()
+    lines += ["# HELP booking_slots_total 訂票寫入名額的取得結果",
+              "# TYPE booking_slots_total counter"]
+    for outcome in ("admitted", "queued", "rejected_full", "rejected_timeout"):
+        lines.append(f'booking_slots_total{{outcome="{outcome}"}} {stats[outcome]}')
+    for name in ("active", "waiting"):
+        lines += [f"# TYPE booking_slots_{name} gauge", f"booking_slots_{name} {stats[name]}"]
+    return "\n".join(lines) + "\n"
+
+@app.route("/admission_stats")
+def admission_stats():
+    if "employee_id" not in session:
+        return jsonify({"success": False, "message": "尚未登入"}), 403
+    return jsonify({
+        "enabled": ADMISSION_CONTROL,
+        "rate_limiters": {name: limiter.stats() for name, limiter in rate_limiters.items()},
+        "booking_slots": booking_slots.stats(),
+    })
 
 # -------------------------
 # 初始化資料庫
 # -------------------------
-def init_db():
+def init_db(fast=False):
     db = sqlite3.connect(DATABASE)
     db.row_factory = sqlite3.Row
 
-    # 員工表
-    db.execute("""
-        CREATE TABLE IF NOT EXISTS employees (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )
-    """)
-
-    # 電影表
-    db.execute("""
-        CREATE TABLE IF NOT EXISTS movies (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            poster_url TEXT,
-            total_seats INTEGER DEFAULT 100
-        )
-    """)
-
-    # 場次表
-    db.execute("""
-        CREATE TABLE IF NOT EXISTS showtimes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            movie_id INTEGER NOT NULL,
-            weekday TEXT NOT NULL,
-            time TEXT NOT NULL,
-            total_seats INTEGER DEFAULT 100,
-            FOREIGN KEY (movie_id) REFERENCES movies(id)
-        )
-    """)
-
-    # 訂票表
-    db.execute("""
-        CREATE TABLE IF NOT EXISTS bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            order_no TEXT UNIQUE,
-            showtime_id INTEGER NOT NULL,
-            customer_name TEXT NOT NULL,
-            tickets INTEGER NOT NULL,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (showtime_id) REFERENCES showtimes(id)
-        )
-    """)
-
-    # 使用者表
-    db.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            password TEXT,
-            full_name TEXT,
-            phone TEXT
-        )
-    """)
+    # 快速啟動：schema 已是最新版本代表之前完整初始化過，migration 與預設資料都不必再檢查
+    if fast and is_current(db):
+        db.close()
+        return
+
+    # 建立 / 升級資料表結構
+    migrate(db)
 
     # ------------------------
     # 預設電影資料
@@ -113,29 +286,29 @@ def init_db():
         # 電影 1：週二、週四、週日 19:00，座位 100
         for day in ["週二", "週四", "週日"]:
             db.execute(
-                "INSERT INTO showtimes (movie_id, weekday, time, total_seats) VALUES (?, ?, ?, ?)",
-                (movies[0]["id"], day, "19:00", 100)
+                "INSERT INTO showtimes (movie_id, weekday, weekday_code, slot, time, total_seats) VALUES (?, ?, ?, ?, ?, ?)",
+                (movies[0]["id"], day, *showtime_slot(day, "19:00"), "19:00", 100)
             )
 
         # 電影 2：週二、週三、週五 21:00，座位 150
         for day in ["週二", "週三", "週五"]:
             db.execute(
-                "INSERT INTO showtimes (movie_id, weekday, time, total_seats) VALUES (?, ?, ?, ?)",
-                (movies[1]["id"], day, "21:00", 150)
+                "INSERT INTO showtimes (movie_id, weekday, weekday_code, slot, time, total_seats) VALUES (?, ?, ?, ?, ?, ?)",
+                (movies[1]["id"], day, *showtime_slot(day, "21:00"), "21:00", 150)
             )
 
         # 電影 3：週一、週三、週六 12:00，座位 180
         for day in ["週一", "週三", "週六"]:
             db.execute(
-                "INSERT INTO showtimes (movie_id, weekday, time, total_seats) VALUES (?, ?, ?, ?)",
-                (movies[2]["id"], day, "12:00", 180)
+                "INSERT INTO showtimes (movie_id, weekday, weekday_code, slot, time, total_seats) VALUES (?, ?, ?, ?, ?, ?)",
+                (movies[2]["id"], day, *showtime_slot(day, "12:00"), "12:00", 180)
             )
 
         # 電影 4：週一、週二、週四、週五 21:00，座位 230
         for day in ["週一", "週二", "週四", "週五"]:
             db.execute(
-                "INSERT INTO showtimes (movie_id, weekday, time, total_seats) VALUES (?, ?, ?, ?)",
-                (movies[3]["id"], day, "21:00", 230)
+                "INSERT INTO showtimes (movie_id, weekday, weekday_code, slot, time, total_seats) VALUES (?, ?, ?, ?, ?, ?)",
+                (movies[3]["id"], day, *showtime_slot(day, "21:00"), "21:00", 230)
             )
 
         db.commit()
@@ -156,20 +329,646 @@ def init_db():
 
     db.commit()
     db.close()
+
+# -------------------------
+# 已售座位計數器
+# -------------------------
+# showtimes.booked_seats 由 book() / delete_order() 在同一個交易內維護，
+# 讀取剩餘座位時不必再對 bookings 做 SUM。
+SEAT_COUNTER_MISMATCH_SQL = """
+    SELECT
+        s.id AS showtime_id,
+        s.booked_seats AS counter,
+        IFNULL(SUM(b.tickets), 0) AS actual
+    FROM showtimes s
+    LEFT JOIN bookings b ON s.id = b.showtime_id
+    GROUP BY s.id
+    HAVING s.booked_seats != IFNULL(SUM(b.tickets), 0)
+"""
+
+def rebuild_seat_counters(db, fix=True):
+    """比對 booked_seats 與 bookings 的實際票數，回傳不一致的場次；fix=True 時一併修正"""
+    if fix:
+        # 先取得寫入鎖，避免比對到一半有人訂票
+        db.execute("BEGIN IMMEDIATE")
+    mismatches = db.execute(SEAT_COUNTER_MISMATCH_SQL).fetchall()
+    mismatches = [dict(r) for r in mismatches]
+
+    if fix:
+        db.executemany(
+            "UPDATE showtimes SET booked_seats = ? WHERE id = ?",
+            [(r["actual"], r["showtime_id"]) for r in mismatches]
+        )
+        db.commit()
+    return mismatches
+
+@app.cli.command("rebuild-seats")
+@click.option("--check", is_flag=True, help="只檢查，不修正")
+def rebuild_seats_command(check):
+    """依 bookings 重建（或檢查）各場次的已售座位數"""
+    db = sqlite3.connect(DATABASE)
+    db.row_factory = sqlite3.Row
+    mismatches = rebuild_seat_counters(db, fix=not check)
+    db.close()
+
+    for r in mismatches:
+        click.echo(f"場次 {r['showtime_id']}：計數器 {r['counter']}，實際 {r['actual']}")
+    if not mismatches:
+        click.echo("計數器一致")
+    elif check:
+        raise SystemExit(1)
+    else:
+        click.echo(f"已修正 {len(mismatches)} 個場次")
+
 # -------------------------
 # 訂單號生成
 # -------------------------
+# 號段在行程內發放，不必每筆訂單都查資料庫；唯一性最終由 bookings.order_no 的 UNIQUE 保證
+_order_numbers = None
+_order_numbers_lock = threading.Lock()
+
 def generate_order_no():
-    date_str = datetime.now().strftime("%Y%m%d")
-    random_str = uuid.uuid4().hex[:6].upper()
-    return f"ORD-{date_str}-{random_str}"
+    global _order_numbers
+    if _order_numbers is None or _order_numbers.database != DATABASE or _order_numbers.pid != os.getpid():
+        with _order_numbers_lock:
+            if _order_numbers is None or _order_numbers.database != DATABASE or _order_numbers.pid != os.getpid():
+                _order_numbers = OrderNumberGenerator(DATABASE)
+    return _order_numbers.next()
 
-def generate_unique_order_no(db):
-    while True:
-        order_no = generate_order_no()
-        exists = db.execute("SELECT 1 FROM bookings WHERE order_no = ?", (order_no,)).fetchone()
-        if not exists:
-            return order_no
+# -------------------------
+# 訂票交易
+# -------------------------
+# 座位檢查與寫入必須是同一個原子操作：以 BEGIN IMMEDIATE 先取得寫入鎖，
+# 再用帶條件的 UPDATE 扣座位，超賣時 UPDATE 不會命中任何資料列。
+BUSY_RETRIES = 5        # 遇到 SQLITE_BUSY 的重試次數
+BUSY_BACKOFF = 0.02     # 第一次重試前等待秒數，之後指數遞增
+
+class SeatsUnavailable(Exception):
+    """剩餘座位不足"""
+    def __init__(self, remaining):
+        super().__init__(f"剩餘座位不足，剩餘 {remaining} 席")
+        self.remaining = remaining
+
+class BookingQueueTimeout(Exception):
+    """group commit 的寫入執行緒在 BOOKING_QUEUE_TIMEOUT 內沒有處理到這筆訂票，訂票已取消"""
+
+def _is_busy(error):
+    return "locked" in str(error) or "busy" in str(error)
+
+def _is_order_no_conflict(error):
+    return "bookings.order_no" in str(error)
+
+# -------------------------
+# 座位圖
+# -------------------------
+def load_seat_map(db, showtime_id):
+    """回傳 (rows, cols, bits)；尚未建立時依現有訂單在記憶體中算出（不寫入）"""
+    row = db.execute(
+        "SELECT rows, cols, bitmap FROM seat_maps WHERE showtime_id = ?",
+        (showtime_id,)
+    ).fetchone()
+    if row:
+        return row["rows"], row["cols"], seatmap.from_bytes(row["bitmap"])
+
+    st = db.execute("SELECT total_seats FROM showtimes WHERE id = ?", (showtime_id,)).fetchone()
+    if not st:
+        return None
+    taken = []
+    legacy = 0
+    for b in db.execute("SELECT tickets, seats FROM bookings WHERE showtime_id = ?", (showtime_id,)):
+        if b["seats"]:
+            taken.extend(seatmap.parse_seats(b["seats"]))
+        else:
+            legacy += b["tickets"]
+    for h in db.execute("SELECT seats FROM seat_holds WHERE showtime_id = ?", (showtime_id,)):
+        taken.extend(seatmap.parse_seats(h["seats"]))
+    return seatmap.build_bitmap(st["total_seats"], taken, legacy)
+
+def save_seat_map(db, showtime_id, rows, cols, bits):
+    db.execute(
+        "INSERT OR REPLACE INTO seat_maps (showtime_id, rows, cols, bitmap) VALUES (?, ?, ?, ?)",
+        (showtime_id, rows, cols, seatmap.to_bytes(bits, rows * cols))
+    )
+
+def claim_seats(db, showtime_id, tickets, requested=None):
+    """在目前的交易內配位（或占用指定座位），回傳座位編號列表"""
+    rows, cols, bits = load_seat_map(db, showtime_id)
+    if requested:
+        if len(requested) != tickets:
+            raise seatmap.SeatTaken("座位數與票數不符")
+        seats = requested
+    else:
+        seats = seatmap.allocate(bits, rows, cols, tickets)
+        if seats is None:
+            raise SeatsUnavailable(seatmap.free_count(bits, rows * cols))
+    bits = seatmap.claim(bits, seats, rows * cols)
+    save_seat_map(db, showtime_id, rows, cols, bits)
+    return seats
+
+def release_seats(db, showtime_id, seats_text):
+    """在目前的交易內歸還座位"""
+    if not seats_text:
+        # 舊訂單不知道坐哪，直接丟掉座位圖，下次訂票時依剩下的訂單重建
+        db.execute("DELETE FROM seat_maps WHERE showtime_id = ?", (showtime_id,))
+        return
+    rows, cols, bits = load_seat_map(db, showtime_id)
+    save_seat_map(db, showtime_id, rows, cols, seatmap.release(bits, seatmap.parse_seats(seats_text)))
+
+def remaining_seats(db, showtime_id):
+    row = db.execute(
+        "SELECT total_seats - booked_seats - held_seats FROM showtimes WHERE id = ?",
+        (showtime_id,)
+    ).fetchone()
+    return row[0] if row else 0
+
+def _book_seats_once(db, showtime_id, customer_name, tickets, seats=None, hold_token=None):
+    # 先取號再開交易：號段不足時要另開連線預留，不能卡在自己持有的寫入鎖上
+    order_no = generate_order_no()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        if hold_token:
+            # 保留的座位已經扣過也配好了，只要轉成訂單
+            tickets, seats = _take_hold(db, hold_token, showtime_id, customer_name)
+        else:
+            cur = db.execute("""
+                UPDATE showtimes
+                SET booked_seats = booked_seats + ?
+                WHERE id = ? AND booked_seats + held_seats + ? <= total_seats
+            """, (tickets, showtime_id, tickets))
+            if cur.rowcount == 0:
+                raise SeatsUnavailable(remaining_seats(db, showtime_id))
+            seats = claim_seats(db, showtime_id, tickets, seats)
+
+        created_at = db.execute("""
+            INSERT INTO bookings (order_no, showtime_id, customer_name, tickets, seats)
+            VALUES (?, ?, ?, ?, ?)
+            RETURNING created_at
+        """, (order_no, showtime_id, customer_name, tickets, seatmap.format_seats(seats))).fetchone()[0]
+        analytics.record_sales(db, [(showtime_id, created_at, 1, tickets)])
+        db.commit()
+        bump_data_version()
+        publish_availability(db, [showtime_id])
+        return order_no
+    except BaseException:
+        db.rollback()
+        raise
+
+def _retry_write(once, *args):
+    """執行一次寫入交易，遇到 SQLITE_BUSY 或訂單號撞號時重試"""
+    for attempt in range(BUSY_RETRIES):
+        try:
+            return once(*args)
+        except sqlite3.IntegrityError as e:
+            # 與改版前的隨機訂單號撞號，整筆重來並換下一個號碼
+            if not _is_order_no_conflict(e) or attempt == BUSY_RETRIES - 1:
+                raise
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or attempt == BUSY_RETRIES - 1:
+                raise
+            # 指數退避加上隨機抖動，避免所有 worker 同時重試
+            time.sleep(BUSY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+def book_seats(db, showtime_id, customer_name, tickets, seats=None, hold_token=None):
+    """原子地扣座位、配位並新增訂單，回傳訂單編號
+
+    seats 為指定的座位編號，不指定時自動配相鄰座位；給 hold_token 時改用該保留的張數與座位。
+    座位不足時拋出 SeatsUnavailable，指定的座位被占用時拋出 seatmap.SeatTaken，
+    保留不存在或已過期時拋出 HoldExpired。
+    """
+    if BOOKING_SHARDS:
+        if hold_token:
+            raise HoldExpired()
+        return _retry_write(_book_seats_sharded_once, db, showtime_id, customer_name, tickets, seats)
+    sweep_expired_holds(db)
+    if BOOKING_MODE == "group" and not hold_token:
+        return _retry_write(_book_seats_queued, showtime_id, customer_name, tickets, seats)
+    return _retry_write(_book_seats_once, db, showtime_id, customer_name, tickets, seats, hold_token)
+
+# -------------------------
+# Group commit 訂票
+# -------------------------
+# BOOKING_MODE = "group" 時，訂票請求排進單一寫入執行緒的佇列，同一批在一個交易內完成、
+# 只 commit 一次。剩餘座位與座位圖在這批開始時各讀一次，之後在記憶體中扣減與配位，
+# 最後一次寫回。多個 worker 各有自己的寫入執行緒，彼此仍靠 BEGIN IMMEDIATE 互斥。
+# 保留轉訂單仍走一般流程。
+BOOKING_MODE = "direct"         # "direct"：每筆各自 commit；"group"：批次 commit
+BOOKING_BATCH_SIZE = 256
+BOOKING_QUEUE_TIMEOUT = 10      # 秒，等待寫入執行緒回覆的上限
+
+QueuedBooking = namedtuple("QueuedBooking", "order_no showtime_id customer_name tickets seats")
+_booking_writer = None
+_booking_writer_lock = threading.Lock()
+
+def _book_batch(db, batch):
+    """寫入執行緒的交易內：處理一批 QueuedBooking，回傳每筆的訂單編號或例外"""
+    ids = sorted({b.showtime_id for b in batch})
+    remaining = {r[0]: r[1] for r in db.execute(
+        "SELECT id, total_seats - booked_seats - held_seats FROM showtimes WHERE id IN (%s)"
+        % ",".join("?" * len(ids)),
+        ids
+    )}
+    sold = defaultdict(int)
+    sales = []
+    seat_maps = {}
+    results = []
+    for b in batch:
+        left = remaining.get(b.showtime_id, 0)
+        if b.tickets > left:
+            results.append(SeatsUnavailable(left))
+            continue
+        if b.showtime_id not in seat_maps:
+            seat_maps[b.showtime_id] = load_seat_map(db, b.showtime_id)
+        rows, cols, bits = seat_maps[b.showtime_id]
+
+        try:
+            if b.seats:
+                if len(b.seats) != b.tickets:
+                    raise seatmap.SeatTaken("座位數與票數不符")
+                seats = b.seats
+            else:
+                seats = seatmap.allocate(bits, rows, cols, b.tickets)
+                if seats is None:
+                    results.append(SeatsUnavailable(seatmap.free_count(bits, rows * cols)))
+                    continue
+            new_bits = seatmap.claim(bits, seats, rows * cols)
+            # 單一語句失敗只會撤銷該語句，不影響同一交易內的其他訂單
+            created_at = db.execute("""
+                INSERT INTO bookings (order_no, showtime_id, customer_name, tickets, seats)
+                VALUES (?, ?, ?, ?, ?)
+                RETURNING created_at
+            """, (b.order_no, b.showtime_id, b.customer_name, b.tickets, seatmap.format_seats(seats))).fetchone()[0]
+        except (seatmap.SeatTaken, sqlite3.IntegrityError) as e:
+            results.append(e)
+            continue
+
+        remaining[b.showtime_id] = left - b.tickets
+        sold[b.showtime_id] += b.tickets
+        sales.append((b.showtime_id, created_at, 1, b.tickets))
+        seat_maps[b.showtime_id] = (rows, cols, new_bits)
+        results.append(b.order_no)
+
+    db.executemany(
+        "UPDATE showtimes SET booked_seats = booked_seats + ? WHERE id = ?",
+        [(tickets, showtime_id) for showtime_id, tickets in sold.items()]
+    )
+    for showtime_id in sold:
+        save_seat_map(db, showtime_id, *seat_maps[showtime_id])
+    analytics.record_sales(db, sales)
+    return results
+
+def _after_booking_batch(db, batch, results):
+    changed = [b.showtime_id for b, r in zip(batch, results) if not isinstance(r, BaseException)]
+    if changed:
+        bump_data_version()
+        publish_availability(db, changed)
+
+def _booking_writer_stale():
+    # 寫入執行緒出錯結束（例如連不上資料庫）時也換一個新的，下一筆訂票會重新連線
+    w = _booking_writer
+    return w is None or w.database != DATABASE or w.pid != os.getpid() or not w.alive
+
+def get_booking_writer():
+    global _booking_writer
+    if _booking_writer_stale():
+        with _booking_writer_lock:
+            if _booking_writer_stale():
+                if _booking_writer is not None and _booking_writer.pid == os.getpid():
+                    _booking_writer.close(timeout=0)    # 換資料庫：舊的寫入執行緒做完手上的就結束
+                _booking_writer = GroupCommitWriter(
+                    DATABASE, _book_batch, on_commit=_after_booking_batch, max_batch=BOOKING_BATCH_SIZE
+                )
+    return _booking_writer
+
+def _book_seats_queued(showtime_id, customer_name, tickets, seats):
+    # 訂單號在請求端先取好：寫入執行緒持有寫入鎖時不能再去預留號段
+    booking = QueuedBooking(generate_order_no(), showtime_id, customer_name, tickets, seats or None)
+    future = get_booking_writer().submit(booking)
+    try:
+        return future.result(timeout=BOOKING_QUEUE_TIMEOUT)
+    except FuturesTimeout:
+        # 還沒被寫入執行緒取走就取消，不會在回覆使用者之後才寫進資料庫；
+        # 已經在交易中的取消不了，交易很快就會結束，等它的結果
+        if future.cancel():
+            raise BookingQueueTimeout() from None
+        return future.result()
+
+# -------------------------
+# 分片訂單儲存
+# -------------------------
+# BOOKING_SHARDS > 0 時，訂單與座位狀態依 showtime_id 分到多個 SQLite 檔（見 shards.py），
+# 不同場次的訂票不必搶同一把寫入鎖。剩餘座位、訂單查詢與退票平行查詢所有分片再合併。
+# 啟用前先執行 flask shard-bookings 把既有訂單搬到分片。
+# 分片模式不支援座位保留與 group commit；銷售統計、訂單匯出、後台訂單列表與
+# rebuild-seats 只看主資料庫，不含分片上的訂單；其他 worker 在分片上的寫入也不會推送給 SSE 訂閱者。
+BOOKING_SHARDS = 0
+SHARD_POOL_SIZE = 8     # 每個分片的連線數上限
+_shards = None
+_shards_lock = threading.Lock()
+
+def get_shards():
+    global _shards
+    if _shards is None or _shards.database != DATABASE or _shards.count != BOOKING_SHARDS or _shards.pid != os.getpid():
+        with _shards_lock:
+            if _shards is None or _shards.database != DATABASE or _shards.count != BOOKING_SHARDS or _shards.pid != os.getpid():
+                db = sqlite3.connect(DATABASE)
+                pending = db.execute("SELECT 1 FROM bookings LIMIT 1").fetchone()
+                db.close()
+                if pending:
+                    raise RuntimeError("主資料庫還有訂單，啟用分片前請先執行 flask shard-bookings")
+                if _shards is not None and _shards.pid == os.getpid():
+                    _shards.close()
+                _shards = ShardSet(DATABASE, BOOKING_SHARDS, pool_size=SHARD_POOL_SIZE)
+    return _shards
+
+def _shard_seats(db, ids):
+    sql = "SELECT id, booked_seats, total_seats - booked_seats - held_seats FROM showtimes"
+    if ids is not None:
+        sql += " WHERE id IN (%s)" % ",".join("?" * len(ids))
+    return db.execute(sql, ids or ()).fetchall()
+
+def load_shard_seats(showtime_ids=None):
+    """回傳已登記到分片的場次 {showtime_id: (booked_seats, remaining_seats)}；不給 id 時回傳全部"""
+    ids = sorted(set(showtime_ids)) if showtime_ids is not None else None
+    if ids is not None and len(ids) > 500:
+        ids = None      # IN 清單太長時直接全讀，分片的 showtimes 只有幾個整數欄位
+    seats = {}
+    for rows in get_shards().fan_out(_shard_seats, ids):
+        seats.update((r[0], (r[1], r[2])) for r in rows)
+    return seats
+
+def apply_shard_seats(showtimes):
+    """分片模式下把場次 dict 的 booked_seats、remaining_seats 換成分片上的值"""
+    if not BOOKING_SHARDS or not showtimes:
+        return showtimes
+    seats = load_shard_seats(st["showtime_id"] for st in showtimes)
+    for st in showtimes:
+        if st["showtime_id"] in seats:
+            st["booked_seats"], st["remaining_seats"] = seats[st["showtime_id"]]
+    return showtimes
+
+def _book_seats_sharded_once(main_db, showtime_id, customer_name, tickets, seats):
+    shards = get_shards()
+    index = shards.index_for(showtime_id)
+    order_no = generate_order_no()
+    st = main_db.execute("SELECT total_seats FROM showtimes WHERE id = ?", (showtime_id,)).fetchone()
+    if not st:
+        raise SeatsUnavailable(0)
+    with shards.connect(index) as db:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # 場次第一次訂票時登記到分片
+            db.execute("INSERT OR IGNORE INTO showtimes (id, total_seats) VALUES (?, ?)", (showtime_id, st[0]))
+            cur = db.execute("""
+                UPDATE showtimes
+                SET booked_seats = booked_seats + ?
+                WHERE id = ? AND booked_seats + held_seats + ? <= total_seats
+            """, (tickets, showtime_id, tickets))
+            if cur.rowcount == 0:
+                raise SeatsUnavailable(remaining_seats(db, showtime_id))
+            seats = claim_seats(db, showtime_id, tickets, seats)
+            db.execute("""
+                INSERT INTO bookings (id, order_no, showtime_id, customer_name, tickets, seats)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (next_booking_id(db, index), order_no, showtime_id, customer_name, tickets,
+                  seatmap.format_seats(seats)))
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+        bump_data_version()
+        publish_availability(db, [showtime_id])
+    return order_no
+
+def _delete_sharded_order_once(order_no, showtime_id, customer_name):
+    shards = get_shards()
+    with shards.connect(shards.index_for(showtime_id)) as db:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = db.execute("""
+                DELETE FROM bookings
+                WHERE order_no = ? AND showtime_id = ? AND customer_name = ?
+                RETURNING tickets, seats
+            """, (order_no, showtime_id, customer_name)).fetchall()
+            for row in deleted:
+                db.execute(
+                    "UPDATE showtimes SET booked_seats = booked_seats - ? WHERE id = ?",
+                    (row["tickets"], showtime_id)
+                )
+                release_seats(db, showtime_id, row["seats"])
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+        if deleted:
+            bump_data_version()
+            publish_availability(db, [showtime_id])
+    return bool(deleted)
+
+def _shard_orders(db, where, params, limit):
+    return [dict(r) for r in db.execute(f"""
+        SELECT id AS booking_id, order_no, customer_name, tickets, showtime_id
+        FROM bookings o
+        WHERE {where}
+        ORDER BY o.id DESC
+        LIMIT ?
+    """, (*params, limit))]
+
+def load_shard_orders(db, where, params, limit):
+    """平行查詢各分片的訂單，依 id 由新到舊合併後補上主資料庫的電影、場次資訊"""
+    rows = [r for part in get_shards().fan_out(_shard_orders, where, params, limit) for r in part]
+    rows = sorted(rows, key=lambda r: r["booking_id"], reverse=True)[:limit]
+    ids = sorted({r["showtime_id"] for r in rows})
+    if not ids:
+        return []
+    info = {r["id"]: r for r in db.execute("""
+        SELECT s.id, m.title, s.weekday, s.time AS showtime
+        FROM showtimes s
+        JOIN movies m ON s.movie_id = m.id
+        WHERE s.id IN (%s)
+    """ % ",".join("?" * len(ids)), ids)}
+    # 與單一資料庫時的 JOIN 一致：對不到場次的訂單不列出
+    return [
+        {**r, "title": info[r["showtime_id"]]["title"], "weekday": info[r["showtime_id"]]["weekday"],
+         "showtime": info[r["showtime_id"]]["showtime"]}
+        for r in rows if r["showtime_id"] in info
+    ]
+
+def _shard_has_bookings(db, ids):
+    return db.execute(
+        "SELECT 1 FROM bookings WHERE showtime_id IN (%s) LIMIT 1" % ",".join("?" * len(ids)), ids
+    ).fetchone() is not None
+
+@app.cli.command("shard-bookings")
+@click.option("--shards", type=int, default=None, help="分片數，預設為 BOOKING_SHARDS")
+def shard_bookings_command(shards):
+    """把主資料庫的訂單搬到分片（啟用 BOOKING_SHARDS 前執行一次，可重複執行）"""
+    count = shards or BOOKING_SHARDS
+    if not count:
+        click.echo("請用 --shards 指定分片數，或先設定 BOOKING_SHARDS")
+        raise SystemExit(1)
+    db = sqlite3.connect(DATABASE)
+    shard_set = ShardSet(DATABASE, count)
+    try:
+        moved = shard_set.import_from(db)
+    except RuntimeError as e:
+        click.echo(str(e))
+        raise SystemExit(1)
+    finally:
+        shard_set.close()
+        db.close()
+    click.echo(f"已搬移 {moved} 筆訂單到 {count} 個分片")
+
+# -------------------------
+# 座位保留
+# -------------------------
+# 熱門場次開賣時，使用者可以先保留座位 HOLD_MINUTES 分鐘再送出訂單。
+# 保留中的張數記在 showtimes.held_seats，剩餘座位 = total_seats - booked_seats - held_seats；
+# 保留的座位也會在座位圖上占位。過期的保留依 seat_holds.expires_at 索引找出並歸還，
+# 沒有過期保留時只需一次索引查詢，不會掃過所有保留。
+HOLD_MINUTES = 10
+HOLD_SWEEP_INTERVAL = 1     # 讀取頁面時最多每幾秒順手清一次過期保留
+_last_hold_sweep = 0.0
+
+class HoldExpired(Exception):
+    """保留不存在或已過期"""
+
+def _release_holds(db, holds):
+    """在目前的交易內歸還已刪除的保留（DELETE ... RETURNING showtime_id, tickets, seats 的結果）"""
+    by_showtime = defaultdict(lambda: [0, []])
+    for h in holds:
+        entry = by_showtime[h["showtime_id"]]
+        entry[0] += h["tickets"]
+        entry[1].extend(seatmap.parse_seats(h["seats"]))
+    for showtime_id, (tickets, seats) in by_showtime.items():
+        db.execute(
+            "UPDATE showtimes SET held_seats = held_seats - ? WHERE id = ?",
+            (tickets, showtime_id)
+        )
+        release_seats(db, showtime_id, seatmap.format_seats(seats))
+
+def _take_hold(db, token, showtime_id, customer_name):
+    """在目前的交易內把保留轉成已售，回傳 (tickets, seats)"""
+    hold = db.execute("""
+        DELETE FROM seat_holds
+        WHERE token = ? AND showtime_id = ? AND customer_name = ? AND expires_at > ?
+        RETURNING tickets, seats
+    """, (token, showtime_id, customer_name, time.time())).fetchone()
+    if not hold:
+        raise HoldExpired()
+    db.execute(
+        "UPDATE showtimes SET held_seats = held_seats - ?, booked_seats = booked_seats + ? WHERE id = ?",
+        (hold["tickets"], hold["tickets"], showtime_id)
+    )
+    return hold["tickets"], seatmap.parse_seats(hold["seats"])
+
+EXPIRED_HOLD_EXISTS_SQL = "SELECT 1 FROM seat_holds WHERE expires_at <= ? LIMIT 1"
+
+def sweep_expired_holds(db, now=None):
+    """歸還所有已過期的保留，回傳歸還筆數"""
+    now = time.time() if now is None else now
+    # 先用索引確認有沒有過期的，沒有就不必搶寫入鎖
+    if not db.execute(EXPIRED_HOLD_EXISTS_SQL, (now,)).fetchone():
+        return 0
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        expired = db.execute(
+            "DELETE FROM seat_holds WHERE expires_at <= ? RETURNING showtime_id, tickets, seats",
+            (now,)
+        ).fetchall()
+        _release_holds(db, expired)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    if expired:
+        bump_data_version()
+        publish_availability(db, [h["showtime_id"] for h in expired])
+    return len(expired)
+
+def maybe_sweep_holds():
+    """讀取頁面用：每 HOLD_SWEEP_INTERVAL 秒最多清一次，資料庫忙碌時直接略過"""
+    global _last_hold_sweep
+    now = time.time()
+    if now - _last_hold_sweep < HOLD_SWEEP_INTERVAL:
+        return
+    _last_hold_sweep = now
+    try:
+        sweep_expired_holds(get_db(), now)
+    except sqlite3.OperationalError as e:
+        if not _is_busy(e):
+            raise
+
+def _hold_seats_once(db, showtime_id, customer_name, tickets, seats, minutes):
+    token = secrets.token_urlsafe(16)
+    expires_at = time.time() + minutes * 60
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        # 同一人同一場次只能有一組保留，新的取代舊的
+        previous = db.execute("""
+            DELETE FROM seat_holds WHERE showtime_id = ? AND customer_name = ?
+            RETURNING showtime_id, tickets, seats
+        """, (showtime_id, customer_name)).fetchall()
+        _release_holds(db, previous)
+
+        cur = db.execute("""
+            UPDATE showtimes
+            SET held_seats = held_seats + ?
+            WHERE id = ? AND booked_seats + held_seats + ? <= total_seats
+        """, (tickets, showtime_id, tickets))
+        if cur.rowcount == 0:
+            raise SeatsUnavailable(remaining_seats(db, showtime_id))
+        seats = claim_seats(db, showtime_id, tickets, seats)
+        db.execute("""
+            INSERT INTO seat_holds (token, showtime_id, customer_name, tickets, seats, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (token, showtime_id, customer_name, tickets, seatmap.format_seats(seats), expires_at))
+        db.commit()
+        bump_data_version()
+        publish_availability(db, [showtime_id])
+        return {"token": token, "expires_at": expires_at, "seats": seats}
+    except BaseException:
+        db.rollback()
+        raise
+
+def hold_seats(db, showtime_id, customer_name, tickets, seats=None, minutes=None):
+    """保留座位 minutes 分鐘（預設 HOLD_MINUTES），回傳 {"token", "expires_at", "seats"}
+
+    例外與 book_seats() 相同。
+    """
+    sweep_expired_holds(db)
+    return _retry_write(
+        _hold_seats_once, db, showtime_id, customer_name, tickets, seats, minutes or HOLD_MINUTES
+    )
+
+def _release_hold_once(db, token, customer_name):
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        released = db.execute(
+            "DELETE FROM seat_holds WHERE token = ? AND customer_name = ? RETURNING showtime_id, tickets, seats",
+            (token, customer_name)
+        ).fetchall()
+        _release_holds(db, released)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    if released:
+        bump_data_version()
+        publish_availability(db, [h["showtime_id"] for h in released])
+    return bool(released)
+
+def release_hold(db, token, customer_name):
+    """提前取消保留，回傳是否有取消到"""
+    return _retry_write(_release_hold_once, db, token, customer_name)
+
+@app.cli.command("sweep-holds")
+def sweep_holds_command():
+    """歸還所有已過期的座位保留（可由排程定期執行）"""
+    db = sqlite3.connect(DATABASE)
+    db.row_factory = sqlite3.Row
+    count = sweep_expired_holds(db)
+    db.close()
+    click.echo(f"已歸還 {count} 筆過期保留")
 
 # -------------------------
 # Routes
@@ -194,11 +993,53 @@ def logout():
     session.clear()
     return redirect(url_for("movies"))
 
+# -------------------------
+# 首頁快取
+# -------------------------
+# 電影、場次、座位有任何寫入就把 _data_version 加一，快取 key 帶版本號即可精準失效。
+# 版本號只在本行程內有效，其他 worker 的寫入最晚在 HOME_CACHE_TTL 秒後反映。
+HOME_CACHE_TTL = 5
+_data_version = 0
+_data_version_lock = threading.Lock()
+movie_list_cache = TTLCache(maxsize=8, ttl=HOME_CACHE_TTL)
+movie_card_cache = TTLCache(maxsize=2048, ttl=300)
+
+def bump_data_version():
+    """電影、場次或已售座位有變動時呼叫"""
+    global _data_version
+    with _data_version_lock:
+        _data_version += 1
+
+def render_movie_card(movie, logged_in, is_employee):
+    # 卡片內容只取決於這些欄位，用內容當 key：訂票後只有座位變動的那張卡片需要重新渲染
+    key = (
+        movie["id"], movie["title"], movie["poster_url"], movie["total_remaining_seats"],
+        movie.get("is_top1"), logged_in, is_employee,
+        bool(poster_sources(app.static_folder, movie["poster_url"]))
+    )
+    return movie_card_cache.get_or_set(key, lambda: Markup(render_template(
+        "_movie_card.html",
+        movie=movie,
+        logged_in=logged_in,
+        is_employee=is_employee
+    )))
+
+@app.route("/cache_stats")
+def cache_stats():
+    if "employee_id" not in session:
+        return jsonify({"success": False, "message": "尚未登入"}), 403
+    return jsonify({
+        "data_version": _data_version,
+        "movie_list": movie_list_cache.stats(),
+        "movie_card": movie_card_cache.stats(),
+        "api": api_cache.stats(),
+    })
+
 # -------------------------
 # 首頁：電影列表
 # -------------------------
-@app.route("/")
-def movies():
+def load_movie_list():
+    """組出首頁用的電影列表（含各場次剩餘座位）"""
     db = get_db()
 
     # 取得所有電影
@@ -210,15 +1051,14 @@ def movies():
         SELECT 
             s.id AS showtime_id,
             s.movie_id,
+            s.weekday,
             s.time AS showtime,
             s.total_seats,
-            IFNULL(SUM(b.tickets),0) AS booked_seats,
-            (s.total_seats - IFNULL(SUM(b.tickets),0)) AS remaining_seats
+            s.booked_seats,
+            (s.total_seats - s.booked_seats - s.held_seats) AS remaining_seats
         FROM showtimes s
-        LEFT JOIN bookings b ON s.id = b.showtime_id
-        GROUP BY s.id
     """).fetchall()
-    showtimes = [dict(s) for s in showtimes]
+    showtimes = apply_shard_seats([dict(s) for s in showtimes])
 
     # 將場次依電影分組
     movie_showtimes_map = {}
@@ -238,10 +1078,20 @@ def movies():
         # 標記是否已售完
         movie['sold_out'] = (movie['total_remaining_seats'] == 0)
 
+    return movies
+
+@app.route("/")
+def movies():
+    maybe_sweep_holds()
+    # 快取命中時完全不碰資料庫
+    movies = movie_list_cache.get_or_set(("movies", _data_version), load_movie_list)
+    logged_in = bool(session.get("username"))
+    is_employee = bool(session.get("employee_id"))
+    cards = [render_movie_card(m, logged_in, is_employee) for m in movies]
 
     return render_template(
         "movies.html",
-        movies=movies,
+        cards=cards,
         full_name=session.get("full_name"),
         username=session.get("username"),
         employee_id=session.get("employee_id")
@@ -251,6 +1101,25 @@ def movies():
 # 訂票頁
 # -------------------------
 
+# 星期在寫入時已正規化，slot 依 (movie_id, slot) 索引的順序讀出就是排好的
+MOVIE_SHOWTIMES_SQL = """
+    SELECT
+        s.id AS showtime_id,
+        s.weekday,
+        s.time AS showtime,
+        s.total_seats,
+        s.booked_seats,
+        s.total_seats - s.booked_seats - s.held_seats AS remaining_seats
+    FROM showtimes s
+    WHERE s.movie_id=?
+    ORDER BY s.slot, s.id
+"""
+
+def load_movie_showtimes(db, movie_id):
+    """取得電影的所有場次與剩餘座位，依星期 + 時間排序"""
+    showtimes = db.execute(MOVIE_SHOWTIMES_SQL, (movie_id,)).fetchall()
+    return apply_shard_seats([dict(s) for s in showtimes])
+
 @app.route("/book/<int:movie_id>", methods=["GET", "POST"])
 def book(movie_id):
     if "user_id" not in session:
@@ -261,75 +1130,92 @@ def book(movie_id):
     if not movie:
         return "電影不存在", 404
 
-    showtimes = db.execute("""
-        SELECT 
-            s.id AS showtime_id,
-            s.weekday,
-            s.time AS showtime,
-            s.total_seats,
-            COALESCE(SUM(b.tickets),0) AS booked_seats,
-            s.total_seats - COALESCE(SUM(b.tickets),0) AS remaining_seats
-        FROM showtimes s
-        LEFT JOIN bookings b ON s.id = b.showtime_id
-        WHERE s.movie_id=?
-        GROUP BY s.id, s.weekday, s.time, s.total_seats
-    """, (movie_id,)).fetchall()
-
-    showtimes = [dict(s) for s in showtimes]
-
-    # ✅ 依星期 + 時間排序
-    weekday_order = {"週一": 1,"週二": 2,"週三": 3,"週四": 4,"週五": 5,"週六": 6,"週日": 7,}
-    def normalize_weekday(w):
-        if not w:
-            return ""
-        w = w.strip()
-        mapping = {
-        "一": "週一", "星期一": "週一", "禮拜一": "週一", "週一": "週一",
-        "二": "週二", "星期二": "週二", "禮拜二": "週二", "週二": "週二",
-        "三": "週三", "星期三": "週三", "禮拜三": "週三", "週三": "週三",
-        "四": "週四", "星期四": "週四", "禮拜四": "週四", "週四": "週四",
-        "五": "週五", "星期五": "週五", "禮拜五": "週五", "週五": "週五",
-        "六": "週六", "星期六": "週六", "禮拜六": "週六", "週六": "週六",
-        "日": "週日", "天": "週日", "星期日": "週日", "禮拜日": "週日", "週日": "週日",
-    }
-        return mapping.get(w, w)
+    maybe_sweep_holds()
+    showtimes = load_movie_showtimes(db, movie_id)
 
-    for st in showtimes:
-        st["weekday"] = normalize_weekday(st["weekday"])
-    showtimes.sort(
-        key=lambda st: (
-            weekday_order.get(st["weekday"], 8),
-            st["showtime"]
-        )
-    )
-    
     if request.method == "POST":
         selected_showtime_id = int(request.form.get("showtime_id"))
         tickets = int(request.form.get("tickets"))
         name = session.get("username")
-        order_no = generate_unique_order_no(db)
 
         st = next((s for s in showtimes if s["showtime_id"] == selected_showtime_id), None)
         if not st:
             return "場次不存在", 404
 
-        if tickets > st["remaining_seats"]:
-            return f"剩餘座位不足，剩餘 {st['remaining_seats']} 席", 400
+        if tickets <= 0:
+            return "票數錯誤", 400
 
-        db.execute("""
-            INSERT INTO bookings (order_no, showtime_id, customer_name, tickets)
-            VALUES (?, ?, ?, ?)
-        """, (order_no, selected_showtime_id, name, tickets))
-        db.commit()
+        try:
+            seats = seatmap.parse_seats(request.form.get("seats", ""))
+        except ValueError:
+            return "座位格式錯誤", 400
+
+        # 畫面上的剩餘座位可能已過期，以交易內的檢查為準
+        try:
+            order_no = book_seats(
+                db, selected_showtime_id, name, tickets, seats,
+                hold_token=request.form.get("hold") or None
+            )
+        except SeatsUnavailable as e:
+            return str(e), 400
+        except seatmap.SeatTaken:
+            return "選擇的座位已被訂走，請重新選位", 409
+        except HoldExpired:
+            return "座位保留已過期，請重新訂票", 410
+        except BookingQueueTimeout:
+            return "目前訂票人數眾多，訂票未完成，請稍後再試", 503, {"Retry-After": "1"}
 
         return redirect(url_for("success", order_no=order_no))
 
     return render_template(
         "book.html",
         movie=movie,
-        showtimes=showtimes
+        showtimes=showtimes,
+        hold_minutes=HOLD_MINUTES
     )
 
+@app.route("/hold/<int:showtime_id>", methods=["POST"])
+def hold(showtime_id):
+    if "user_id" not in session:
+        return jsonify({"success": False, "message": "尚未登入"}), 403
+
+    tickets = request.form.get("tickets", type=int)
+    if not tickets or tickets <= 0:
+        return jsonify({"success": False, "message": "票數錯誤"}), 400
+    try:
+        seats = seatmap.parse_seats(request.form.get("seats", ""))
+    except ValueError:
+        return jsonify({"success": False, "message": "座位格式錯誤"}), 400
+
+    if BOOKING_SHARDS:
+        return jsonify({"success": False, "message": "目前不開放座位保留，請直接訂票"}), 409
+    db = get_db()
+    if not db.execute("SELECT 1 FROM showtimes WHERE id=?", (showtime_id,)).fetchone():
+        return jsonify({"success": False, "message": "場次不存在"}), 404
+    try:
+        held = hold_seats(db, showtime_id, session.get("username"), tickets, seats)
+    except SeatsUnavailable as e:
+        return jsonify({"success": False, "message": str(e), "remaining": e.remaining}), 400
+    except seatmap.SeatTaken:
+        return jsonify({"success": False, "message": "選擇的座位已被訂走，請重新選位"}), 409
+
+    rows, cols, _ = load_seat_map(db, showtime_id)
+    return jsonify({
+        "success": True,
+        "token": held["token"],
+        "expires_at": held["expires_at"],
+        "seats": held["seats"],
+        "labels": [seatmap.seat_label(i, cols) for i in held["seats"]],
+    })
+
+@app.route("/hold/<token>/release", methods=["POST"])
+def cancel_hold(token):
+    if "user_id" not in session:
+        return jsonify({"success": False, "message": "尚未登入"}), 403
+    if not release_hold(get_db(), token, session.get("username")):
+        return jsonify({"success": False, "message": "保留不存在或已過期"}), 404
+    return jsonify({"success": True})
+
 
 
 
@@ -371,51 +1257,88 @@ def success(order_no):
 # 訂單查詢
 # -------------------------
 
+ORDER_PAGE_SIZE = 20
+
+ORDER_COLUMNS = """
+    o.id AS booking_id, o.order_no, o.customer_name, o.tickets, o.showtime_id,
+    m.title, s.weekday, s.time AS showtime
+"""
+
+CUSTOMER_ORDERS_SQL = f"""
+    SELECT {ORDER_COLUMNS}
+    FROM bookings o
+    JOIN showtimes s ON o.showtime_id = s.id
+    JOIN movies m ON s.movie_id = m.id
+    WHERE o.customer_name = ? AND o.id < ?
+    ORDER BY o.id DESC
+    LIMIT ?
+"""
+
+ORDER_BY_NO_SQL = f"""
+    SELECT {ORDER_COLUMNS}
+    FROM bookings o
+    JOIN showtimes s ON o.showtime_id = s.id
+    JOIN movies m ON s.movie_id = m.id
+    WHERE o.order_no = ?
+"""
+
+def load_customer_orders(db, customer_name, before=None, limit=None):
+    """依訂單 id 由新到舊分頁（keyset），回傳 (orders, 下一頁的 before 或 None)"""
+    limit = limit or ORDER_PAGE_SIZE
+    if BOOKING_SHARDS:
+        rows = load_shard_orders(
+            db, "o.customer_name = ? AND o.id < ?",
+            (customer_name, before if before is not None else 2 ** 63 - 1), limit + 1
+        )
+        orders = rows[:limit]
+        return orders, orders[-1]["booking_id"] if len(rows) > limit else None
+    rows = db.execute(
+        CUSTOMER_ORDERS_SQL, (customer_name, before if before is not None else 2 ** 63 - 1, limit + 1)
+    ).fetchall()
+    # 多抓一筆用來判斷是否還有下一頁
+    orders = [dict(r) for r in rows[:limit]]
+    next_before = orders[-1]["booking_id"] if len(rows) > limit else None
+    return orders, next_before
+
 @app.route("/order", methods=["GET", "POST"])
 def order():
     db = get_db()
     results = []
     searched = False
+    next_before = None
 
     # 未登入：透過訂單編號查詢
     if request.method == "POST" and not session.get("username"):
         order_no = request.form.get("order_no", "").strip()
         searched = True
-        if order_no:
-            results = db.execute("""
-                SELECT o.order_no, o.customer_name, o.tickets, m.title, s.time AS showtime
-                FROM bookings o
-                JOIN showtimes s ON o.showtime_id = s.id
-                JOIN movies m ON s.movie_id = m.id
-                WHERE o.order_no = ?
-            """, (order_no,)).fetchall()
-            results = [dict(r) for r in results]
-
-            # 計算星期
-            for r in results:
-                dt = datetime.strptime(r['showtime'], "%H:%M")
-                r['weekday'] = ["一","二","三","四","五","六","日"][dt.weekday()]
-
-    # 已登入：顯示該使用者所有訂單
-    elif session.get("username"):
-        user_name = session.get("username")
-        results = db.execute("""
-            SELECT o.order_no, o.customer_name, o.tickets, m.title, s.time AS showtime
-            FROM bookings o
-            JOIN showtimes s ON o.showtime_id = s.id
-            JOIN movies m ON s.movie_id = m.id
-            WHERE o.customer_name = ?
-        """, (user_name,)).fetchall()
-        results = [dict(r) for r in results]
-
-        # 計算星期
-        for r in results:
-            dt = datetime.strptime(r['showtime'], "%H:%M")
-            r['weekday'] = ["一","二","三","四","五","六","日"][dt.weekday()]
+        if order_no and BOOKING_SHARDS:
+            results = load_shard_orders(db, "o.order_no = ?", (order_no,), 1)
+        elif order_no:
+            results = [dict(r) for r in db.execute(ORDER_BY_NO_SQL, (order_no,))]
 
-    return render_template("order.html", results=results, searched=searched)
+    # 已登入：分頁顯示該使用者的訂單
+    elif session.get("username"):
+        before = request.args.get("before", type=int)
+        results, next_before = load_customer_orders(db, session.get("username"), before)
 
+    return render_template(
+        "order.html",
+        results=results,
+        searched=searched,
+        next_before=next_before,
+        paged=request.args.get("before") is not None
+    )
 
+@app.route("/api/orders")
+def api_orders():
+    if "username" not in session:
+        return jsonify({"success": False, "message": "尚未登入"}), 403
+    before = request.args.get("before", type=int)
+    limit = min(max(request.args.get("limit", ORDER_PAGE_SIZE, type=int), 1), 100)
+    orders, next_before = load_customer_orders(get_db(), session.get("username"), before, limit)
+    response = jsonify({"orders": orders, "next_before": next_before})
+    response.headers["Cache-Control"] = "private, no-store"
+    return response
 
 # -------------------------
 # 刪除訂單
@@ -428,23 +1351,347 @@ def delete_order(order_no, showtime_id):
     db = get_db()
     user_name = session.get("username")
 
-    cur = db.execute(
+    if BOOKING_SHARDS:
+        if not _retry_write(_delete_sharded_order_once, order_no, showtime_id, user_name):
+            return jsonify({"success": False, "message": "查無此場次訂單"})
+        return jsonify({"success": True})
+
+    deleted = db.execute(
         """
         DELETE FROM bookings
         WHERE order_no = ?
         AND showtime_id = ?
         AND customer_name = ?
+        RETURNING tickets, seats, created_at
         """,
         (order_no, showtime_id, user_name)
-    )
+    ).fetchall()
 
+    # 同一個交易內歸還座位並扣回銷售統計
+    for row in deleted:
+        db.execute(
+            "UPDATE showtimes SET booked_seats = booked_seats - ? WHERE id = ?",
+            (row["tickets"], showtime_id)
+        )
+        release_seats(db, showtime_id, row["seats"])
+    analytics.record_sales(db, [(showtime_id, row["created_at"], -1, -row["tickets"]) for row in deleted])
     db.commit()
+    if deleted:
+        bump_data_version()
+        publish_availability(db, [showtime_id])
 
-    if cur.rowcount == 0:
+    if not deleted:
         return jsonify({"success": False, "message": "查無此場次訂單"})
 
     return jsonify({"success": True})
 # -------------------------
+# JSON API（唯讀）
+# -------------------------
+# 回應內容以資料版本號快取；ETag 是內容雜湊，所以不同 worker 對相同資料會給出相同 ETag。
+# 快取命中時，不論回 200 或 304 都不碰資料庫。
+API_MAX_AGE = 2         # 秒
+GZIP_MIN_SIZE = 1024    # 位元組，小於此大小不壓縮
+api_cache = TTLCache(maxsize=1024, ttl=HOME_CACHE_TTL)
+
+def _build_payload(data):
+    if data is None:
+        return None
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    gzipped = gzip.compress(body) if len(body) >= GZIP_MIN_SIZE else None
+    return body, gzipped, hashlib.sha1(body).hexdigest()
+
+def api_response(key, loader, not_found="資料不存在"):
+    payload = api_cache.get_or_set((key, _data_version), lambda: _build_payload(loader()))
+    if payload is None:
+        return jsonify({"success": False, "message": not_found}), 404
+
+    body, gzipped, etag = payload
+    use_gzip = gzipped is not None and "gzip" in request.accept_encodings
+    if use_gzip:
+        etag += "-gzip"     # 不同編碼是不同的表示，strong ETag 不能共用
+
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(gzipped if use_gzip else body, mimetype="application/json")
+        if use_gzip:
+            response.headers["Content-Encoding"] = "gzip"
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = f"public, max-age={API_MAX_AGE}"
+    response.vary.add("Accept-Encoding")
+    return response
+
+def _api_showtime(st):
+    return {
+        "showtime_id": st["showtime_id"],
+        "weekday": st["weekday"],
+        "time": st["showtime"],
+        "total_seats": st["total_seats"],
+        "remaining_seats": st["remaining_seats"],
+    }
+
+@app.route("/api/movies")
+def api_movies():
+    maybe_sweep_holds()
+    def load():
+        movies = movie_list_cache.get_or_set(("movies", _data_version), load_movie_list)
+        return [
+            {
+                "id": m["id"],
+                "title": m["title"],
+                "poster_url": url_for("static", filename=m["poster_url"]) if m["poster_url"] else None,
+                "total_remaining_seats": m["total_remaining_seats"],
+                "sold_out": m["sold_out"],
+                "showtimes": [_api_showtime(st) for st in m["showtimes"]],
+            }
+            for m in movies
+        ]
+    return api_response("movies", load)
+
+@app.route("/api/movies/<int:movie_id>/showtimes")
+def api_movie_showtimes(movie_id):
+    maybe_sweep_holds()
+    def load():
+        db = get_db()
+        if not db.execute("SELECT 1 FROM movies WHERE id=?", (movie_id,)).fetchone():
+            return None
+        return [_api_showtime(st) for st in load_movie_showtimes(db, movie_id)]
+    return api_response(("movie_showtimes", movie_id), load, not_found="電影不存在")
+
+@app.route("/api/showtimes/<int:showtime_id>/availability")
+def api_showtime_availability(showtime_id):
+    maybe_sweep_holds()
+    def load():
+        st = get_db().execute("""
+            SELECT
+                id AS showtime_id,
+                total_seats,
+                booked_seats,
+                held_seats,
+                total_seats - booked_seats - held_seats AS remaining_seats
+            FROM showtimes
+            WHERE id = ?
+        """, (showtime_id,)).fetchone()
+        return apply_shard_seats([dict(st)])[0] if st else None
+    return api_response(("availability", showtime_id), load, not_found="場次不存在")
+
+@app.route("/api/showtimes/<int:showtime_id>/seats")
+def api_showtime_seats(showtime_id):
+    maybe_sweep_holds()
+    def load():
+        seat_map = None
+        if BOOKING_SHARDS:
+            shards = get_shards()
+            with shards.connect(shards.index_for(showtime_id)) as db:
+                seat_map = load_seat_map(db, showtime_id)
+        # 還沒登記到分片的場次沒有人訂過，主資料庫的座位圖就是正確的
+        if seat_map is None:
+            seat_map = load_seat_map(get_db(), showtime_id)
+        if seat_map is None:
+            return None
+        rows, cols, bits = seat_map
+        return {
+            "showtime_id": showtime_id,
+            "rows": rows,
+            "cols": cols,
+            # 第 i 個 bit（little-endian）為 1 代表座位 i 已售出或不存在
+            "bitmap": base64.b64encode(seatmap.to_bytes(bits, rows * cols)).decode("ascii"),
+        }
+    return api_response(("seats", showtime_id), load, not_found="場次不存在")
+
+# -------------------------
+# 即時剩餘座位（SSE）
+# -------------------------
+# 訂票、退票、保留在 commit 後把該場次的剩餘座位發布到 live_availability，
+# 每條 SSE 連線各自從共用紀錄讀取，一次寫入不論多少人在看都只查一次資料庫。
+# 其他 worker 的寫入由背景執行緒每 LIVE_POLL_INTERVAL 秒檢查 PRAGMA data_version 補上。
+# 每條連線在 WSGI 下占用一個執行緒，LIVE_MAX_SUBSCRIBERS 取自 benchmarks/live_fanout.py 的量測，
+# 超過時回 503，前端改回輪詢 /api/showtimes/<id>/availability。
+# ASGI 模式（asgi.py）下 SSE 不占執行緒，上限改用 asgi.LIVE_MAX_SUBSCRIBERS。
+LIVE_HEARTBEAT = 15         # 秒，沒有更新時送註解行保持連線
+LIVE_POLL_INTERVAL = 1      # 秒
+LIVE_RETRY_MS = 3000        # 斷線後瀏覽器重連的等待時間
+LIVE_MAX_SUBSCRIBERS = 1000   # 每秒 20 筆更新時 p99 延遲約 130ms；2000 人時升到 600ms 以上
+live_availability = Broadcaster(backlog=1024, max_subscribers=LIVE_MAX_SUBSCRIBERS)
+_live_watcher = {"pid": None}
+_live_watcher_lock = threading.Lock()
+
+def publish_availability(db, showtime_ids):
+    """寫入 commit 後呼叫，把這些場次最新的剩餘座位推給訂閱者；沒有人訂閱時不查資料庫"""
+    if not live_availability.subscribers or not showtime_ids:
+        return
+    ids = sorted(set(showtime_ids))
+    rows = db.execute(
+        "SELECT id, total_seats - booked_seats - held_seats FROM showtimes WHERE id IN (%s)"
+        % ",".join("?" * len(ids)),
+        ids
+    ).fetchall()
+    live_availability.publish({r[0]: r[1] for r in rows})
+
+def load_availability_snapshot(showtime_ids=()):
+    """回傳 {showtime_id: 剩餘座位}；showtime_ids 為空時回傳所有場次"""
+    # SSE 是長連線，不能一直占著連線池的連線，查完馬上歸還
+    pool = get_pool() if DB_POOL_SIZE else None
+    db = pool.acquire() if pool else sqlite3.connect(DATABASE)
+    try:
+        sql = "SELECT id, total_seats - booked_seats - held_seats FROM showtimes"
+        ids = sorted(showtime_ids)
+        if ids:
+            sql += " WHERE id IN (%s)" % ",".join("?" * len(ids))
+        snapshot = {r[0]: r[1] for r in db.execute(sql, ids)}
+        if BOOKING_SHARDS:
+            for showtime_id, (_, remaining) in load_shard_seats(ids or None).items():
+                if showtime_id in snapshot:
+                    snapshot[showtime_id] = remaining
+        return snapshot
+    finally:
+        if pool:
+            pool.release(db)
+        else:
+            db.close()
+
+def _watch_other_workers():
+    db = None
+    watched = None
+    version = None
+    while True:
+        time.sleep(LIVE_POLL_INTERVAL)
+        if not live_availability.subscribers:
+            continue
+        try:
+            if watched != DATABASE:
+                if db is not None:
+                    db.close()
+                db = sqlite3.connect(DATABASE)
+                watched = DATABASE
+                version = None
+            # 其他連線 commit 後 data_version 就會改變，沒變就不必查
+            current = db.execute("PRAGMA data_version").fetchone()[0]
+            if current != version:
+                version = current
+                live_availability.publish(dict(db.execute(
+                    "SELECT id, total_seats - booked_seats - held_seats FROM showtimes"
+                ).fetchall()))
+        except sqlite3.Error as e:
+            app.logger.warning("剩餘座位同步失敗：%s", e)
+
+def start_availability_watcher():
+    if _live_watcher["pid"] == os.getpid():
+        return
+    with _live_watcher_lock:
+        if _live_watcher["pid"] != os.getpid():
+            threading.Thread(target=_watch_other_workers, name="availability-watcher", daemon=True).start()
+            _live_watcher["pid"] = os.getpid()
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+@app.route("/api/availability/stream")
+def availability_stream():
+    """SSE：先送一份 snapshot，之後有變動時送 seats 事件（{showtime_id: 剩餘座位}）"""
+    try:
+        showtime_ids = {int(i) for i in request.args.get("showtimes", "").split(",") if i.strip()}
+    except ValueError:
+        return jsonify({"success": False, "message": "場次格式錯誤"}), 400
+
+    try:
+        seq = live_availability.subscribe()
+    except TooManySubscribers:
+        response = jsonify({"success": False, "message": "即時連線已滿，請稍後再試"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(LIVE_RETRY_MS // 1000)
+        return response
+    start_availability_watcher()
+
+    def events(seq):
+        yield f"retry: {LIVE_RETRY_MS}\n\n"
+        yield _sse("snapshot", load_availability_snapshot(showtime_ids))
+        last_sent = time.monotonic()
+        while True:
+            seq, updates = live_availability.wait(seq, LIVE_HEARTBEAT)
+            if updates is None:
+                # 讀太慢被紀錄甩開，整份重送
+                yield _sse("snapshot", load_availability_snapshot(showtime_ids))
+                last_sent = time.monotonic()
+                continue
+            if showtime_ids:
+                updates = {k: v for k, v in updates.items() if k in showtime_ids}
+            if updates:
+                yield _sse("seats", updates)
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= LIVE_HEARTBEAT:
+                yield ": heartbeat\n\n"
+                last_sent = time.monotonic()
+
+    response = app.response_class(events(seq), mimetype="text/event-stream")
+    # 產生器可能還沒開始就被關閉，訂閱人數改在回應關閉時扣回
+    response.call_on_close(live_availability.unsubscribe)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"    # 不讓 nginx 緩衝事件
+    return response
+
+@app.route("/live_stats")
+def live_stats():
+    if "employee_id" not in session:
+        return jsonify({"success": False, "message": "尚未登入"}), 403
+    return jsonify(live_availability.stats())
+
+# -------------------------
+# 海報縮圖
+# -------------------------
+# 縮圖檔名帶內容雜湊，內容不會變，可以讓瀏覽器快取一年
+POSTER_MAX_AGE = 365 * 24 * 3600
+
+@app.template_global("poster_sources")
+def poster_sources_for_template(poster_url):
+    return poster_sources(app.static_folder, poster_url)
+
+@app.route("/posters/v/<path:filename>")
+def poster_variant(filename):
+    response = send_from_directory(
+        os.path.join(app.static_folder, VARIANT_DIR), filename, max_age=POSTER_MAX_AGE
+    )
+    response.headers["Cache-Control"] = f"public, max-age={POSTER_MAX_AGE}, immutable"
+    return response
+
+def build_poster_variants(poster_url):
+    """產生縮圖；失敗時只記錄，頁面會退回使用原圖"""
+    try:
+        return build_variants(app.static_folder, poster_url)
+    except OSError as e:
+        app.logger.warning("海報縮圖產生失敗 %s：%s", poster_url, e)
+        return None
+
+@app.cli.command("build-posters")
+def build_posters_command():
+    """為所有電影海報與 static/posters/ 下的圖片產生縮圖"""
+    db = sqlite3.connect(DATABASE)
+    poster_urls = {r[0] for r in db.execute("SELECT DISTINCT poster_url FROM movies WHERE poster_url IS NOT NULL")}
+    db.close()
+    poster_dir = os.path.join(app.static_folder, "posters")
+    for name in os.listdir(poster_dir):
+        if name.lower().endswith((".png", ".jpg", ".jpeg", ".webp")):
+            poster_urls.add(f"posters/{name}")
+
+    for poster_url in sorted(poster_urls):
+        entry = build_poster_variants(poster_url)
+        if entry is None:
+            click.echo(f"略過（找不到原圖）：{poster_url}")
+            continue
+        original = os.path.getsize(os.path.join(app.static_folder, poster_url))
+        webp = os.path.getsize(os.path.join(app.static_folder, VARIANT_DIR, entry["webp"][-1][0]))
+        click.echo(f"{poster_url}：原圖 {original // 1024}KB → WebP {webp // 1024}KB（{entry['webp'][-1][1]}w）")
+
+# -------------------------
+# 連線池狀態
+# -------------------------
+@app.route("/pool_stats")
+def pool_stats():
+    if "employee_id" not in session:
+        return jsonify({"success": False, "message": "尚未登入"}), 403
+    return jsonify(get_pool().metrics())
+
+# -------------------------
 # 員工登入與電影管理
 # -------------------------
 @app.route("/employee_login", methods=["GET", "POST"])
@@ -464,6 +1711,56 @@ def employee_login():
     return render_template("employee_login.html", error=error)
 
 
+ADMIN_PAGE_SIZE = 20
+
+# title LIKE '%q%' 開頭是萬用字元，B-tree 索引用不上，一定是全表掃描 movies。
+# 電影表只有幾百筆，刻意接受：5000 部電影時一頁的兩個查詢合計約 4ms（benchmarks/admin_listing.py）。
+# 電影數到幾十萬筆時再改用 FTS5 全文索引。
+# 分頁結果來自 CTE（co-routine），外層 ORDER BY 只能另建 TEMP B-TREE 排序，
+# 但排序的只有這一頁電影的場次，筆數有上限。
+ADMIN_MOVIES_COUNT_SQL = "SELECT COUNT(*) FROM movies WHERE title LIKE ? ESCAPE '\\'"
+
+ADMIN_MOVIES_PAGE_SQL = """
+    WITH page AS (
+        SELECT * FROM movies
+        WHERE title LIKE ? ESCAPE '\\'
+        ORDER BY id
+        LIMIT ? OFFSET ?
+    )
+    SELECT
+        p.id, p.title, p.poster_url, p.total_seats,
+        s.id AS showtime_id, s.weekday, s.time, s.total_seats AS showtime_seats
+    FROM page p
+    LEFT JOIN showtimes s ON s.movie_id = p.id
+    ORDER BY p.id, s.id
+"""
+
+def load_admin_movies(db, q="", page=1, page_size=ADMIN_PAGE_SIZE):
+    """一次查出一頁電影及其所有場次，回傳 (movies, 符合條件的電影總數)"""
+    # 跳脫 LIKE 的萬用字元，讓搜尋字串照字面比對
+    pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    total = db.execute(ADMIN_MOVIES_COUNT_SQL, (pattern,)).fetchone()[0]
+    rows = db.execute(ADMIN_MOVIES_PAGE_SQL, (pattern, page_size, (page - 1) * page_size)).fetchall()
+
+    # 依電影分組（rows 已按電影排序）
+    movies = []
+    for r in rows:
+        if not movies or movies[-1]["id"] != r["id"]:
+            movies.append({
+                "id": r["id"],
+                "title": r["title"],
+                "poster_url": r["poster_url"],
+                "total_seats": r["total_seats"],
+                "showtimes": [],
+            })
+        if r["showtime_id"] is not None:
+            movies[-1]["showtimes"].append({
+                "weekday": r["weekday"],
+                "time": r["time"],
+                "total_seats": r["showtime_seats"],
+            })
+    return movies, total
+
 @app.route("/manage_movies", methods=["GET", "POST"])
 def manage_movies():
     if "employee_id" not in session:
@@ -519,39 +1816,296 @@ def manage_movies():
                 if not time_val:  # 如果沒輸入，預設 00:00
                     time_val = "00:00"
 
+                # 星期與時間在寫入時就正規化（與排程匯入相同），並算好排序用的 slot
+                weekday = normalize_weekday(weekday)
+                time_val = normalize_time(time_val)
                 db.execute(
-                    "INSERT INTO showtimes (movie_id, weekday, time, total_seats) VALUES (?, ?, ?, ?)",
-                    (movie_id, weekday, time_val, total_seats)
+                    "INSERT INTO showtimes (movie_id, weekday, weekday_code, slot, time, total_seats) VALUES (?, ?, ?, ?, ?, ?)",
+                    (movie_id, weekday, *showtime_slot(weekday, time_val), time_val, total_seats)
                 )
                 db.commit()
 
-    # ---- 取得電影 + 場次 ----
-    movies_raw = db.execute("SELECT * FROM movies").fetchall()
-    movies = []
+            if poster_url:
+                build_poster_variants(poster_url)
+            bump_data_version()
 
-    for m in movies_raw:
-        # 取得該電影所有場次
-        showtimes = db.execute(
-            "SELECT weekday, time, total_seats FROM showtimes WHERE movie_id=? ORDER BY id",
-            (m['id'],)
-        ).fetchall()
-        m_dict = dict(m)
-        # 把 showtimes 轉成字典列表
-        m_dict['showtimes'] = [dict(st) for st in showtimes]
-        movies.append(m_dict)
+    # ---- 取得電影 + 場次（分頁、搜尋） ----
+    q = request.args.get("q", "").strip()
+    page = max(request.args.get("page", 1, type=int), 1)
+    movies, total = load_admin_movies(db, q, page)
+    pages = max((total + ADMIN_PAGE_SIZE - 1) // ADMIN_PAGE_SIZE, 1)
 
     return render_template(
         "manage_movies.html",
         movies=movies,
+        q=q,
+        page=page,
+        pages=pages,
+        total=total,
         employee_name=session.get("employee_username")
     )
 
+@app.route("/delete_movie/<int:movie_id>", methods=["POST"])
+def delete_movie(movie_id):
+    if "employee_id" not in session:
+        return redirect(url_for("employee_login"))
+    db = get_db()
+
+    # 已經有人訂票的電影不能刪，避免訂單對不到場次
+    has_bookings = db.execute("""
+        SELECT 1 FROM bookings b
+        JOIN showtimes s ON b.showtime_id = s.id
+        WHERE s.movie_id = ?
+        LIMIT 1
+    """, (movie_id,)).fetchone()
+    if BOOKING_SHARDS and not has_bookings:
+        ids = [r[0] for r in db.execute("SELECT id FROM showtimes WHERE movie_id=?", (movie_id,))]
+        has_bookings = bool(ids) and any(get_shards().fan_out(_shard_has_bookings, ids))
+    if has_bookings:
+        return "此電影已有訂單，無法刪除", 400
+
+    # 沒有訂單但可能還有保留中的座位、座位圖，以及訂了又退掉留下的零筆統計
+    for table in ("seat_holds", "seat_maps", "sales_by_showtime"):
+        db.execute(
+            f"DELETE FROM {table} WHERE showtime_id IN (SELECT id FROM showtimes WHERE movie_id=?)",
+            (movie_id,)
+        )
+    db.execute("DELETE FROM sales_by_movie WHERE movie_id=?", (movie_id,))
+    db.execute("DELETE FROM showtimes WHERE movie_id=?", (movie_id,))
+    db.execute("DELETE FROM movies WHERE id=?", (movie_id,))
+    db.commit()
+    bump_data_version()
+    return redirect(url_for("manage_movies"))
+
+# -------------------------
+# 銷售統計
+# -------------------------
+# 彙總表由訂票、退票的交易順手更新（見 analytics.py），這裡只讀彙總結果。
+ANALYTICS_DAYS = 30         # 儀表板顯示最近幾天的每日銷售
+ANALYTICS_TOP_MOVIES = 100  # 依電影的表只列票房前幾名
+
+@app.route("/analytics")
+def analytics_dashboard():
+    if "employee_id" not in session:
+        return redirect(url_for("employee_login"))
+    return render_template(
+        "analytics.html",
+        days=ANALYTICS_DAYS,
+        top_movies=ANALYTICS_TOP_MOVIES,
+        employee_name=session.get("employee_username"),
+        **analytics.load_dashboard(get_db(), ANALYTICS_DAYS, ANALYTICS_TOP_MOVIES)
+    )
+
+@app.cli.command("rebuild-analytics")
+def rebuild_analytics_command():
+    """依 bookings 重建銷售統計彙總表"""
+    db = sqlite3.connect(DATABASE)
+    result = analytics.rebuild_rollups(db)
+    db.close()
+    click.echo(f"已重建 {result['rows']} 筆訂單的統計，耗時 {result['seconds']:.2f} 秒")
+
+# -------------------------
+# 訂單匯出
+# -------------------------
+# 匯出可能跑上好幾分鐘，用自己的連線，不占用連線池；連線在產生器結束（或使用者中斷下載）時關閉。
+def _export_stream(fmt, filters):
+    db = sqlite3.connect(DATABASE, check_same_thread=False)
+    try:
+        rows = booking_export.iter_bookings(db, *filters)
+        chunks = booking_export.xlsx_chunks(rows) if fmt == "xlsx" else booking_export.csv_chunks(rows)
+        yield from chunks
+    finally:
+        db.close()
+
+@app.route("/export/bookings")
+def export_bookings():
+    """?format=csv|xlsx&from=YYYY-MM-DD&to=YYYY-MM-DD&movie_id="""
+    if "employee_id" not in session:
+        return jsonify({"success": False, "message": "尚未登入"}), 403
+    fmt = request.args.get("format", "csv")
+    if fmt not in booking_export.MIMETYPES:
+        return jsonify({"success": False, "message": "格式只支援 csv 或 xlsx"}), 400
+    try:
+        filters = booking_export.parse_filters(
+            request.args.get("from"), request.args.get("to"), request.args.get("movie_id")
+        )
+    except booking_export.ExportError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    response = app.response_class(_export_stream(fmt, filters), mimetype=booking_export.MIMETYPES[fmt])
+    response.headers["Content-Disposition"] = f"attachment; filename=bookings.{fmt}"
+    response.headers["Cache-Control"] = "private, no-store"
+    return response
+
+# -------------------------
+# 場次排程批次匯入
+# -------------------------
+@app.route("/manage_movies/import", methods=["POST"])
+def import_showtimes():
+    if "employee_id" not in session:
+        return jsonify({"success": False, "message": "尚未登入"}), 403
+
+    upload = request.files.get("schedule")
+    if not upload or not upload.filename:
+        return jsonify({"success": False, "message": "請選擇排程檔"}), 400
+
+    try:
+        rows = validate_schedule(parse_schedule(upload.stream, format_from_filename(upload.filename)))
+    except ScheduleError as e:
+        return jsonify({"success": False, "message": str(e), "errors": e.errors}), 400
+
+    result = import_schedule(get_db(), rows)
+    for poster_url in {r[1] for r in rows if r[1]}:
+        build_poster_variants(poster_url)
+    bump_data_version()
+    return jsonify({"success": True, **result})
+
+@app.cli.command("import-schedule")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_schedule_command(path):
+    """從 CSV / JSON 檔批次匯入場次"""
+    db = sqlite3.connect(DATABASE)
+    try:
+        with open(path, "rb") as f:
+            rows = validate_schedule(parse_schedule(f, format_from_filename(path)))
+        result = import_schedule(db, rows)
+    except ScheduleError as e:
+        for line, message in e.errors:
+            click.echo(f"第 {line} 列：{message}")
+        raise SystemExit(1)
+    finally:
+        db.close()
+
+    click.echo(
+        f"共 {result['rows']} 列，新增電影 {result['movies_created']} 部、"
+        f"場次 {result['showtimes_created']} 筆，略過重複 {result['duplicates']} 筆，"
+        f"{result['rows_per_sec']} 列/秒"
+    )
+
 
 
 
+# -------------------------
+# 查詢計畫檢查
+# -------------------------
+# 各頁面的熱門查詢都應該走索引：EXPLAIN QUERY PLAN 不應出現 SCAN 或為排序另建 TEMP B-TREE。
+# 這裡引用的是各 handler 實際執行的 SQL 常數，改查詢時檢查會跟著改，不會各寫一份。
+# 第三欄列出刻意接受的步驟，每一個都要寫明理由。
+# tests/test_query_plans.py 在新建並套用 migration 的資料庫上跑同一個檢查。
+HOT_QUERIES = {
+    "book(): 電影場次": (MOVIE_SHOWTIMES_SQL, (1,), ()),
+    "order(): 會員訂單（分頁）": (CUSTOMER_ORDERS_SQL, ("testuser", 2 ** 63 - 1, ORDER_PAGE_SIZE + 1), ()),
+    "order(): 訂單編號": (ORDER_BY_NO_SQL, ("ORD-00000000-000000",), ()),
+    # 本來就要逐一比對每個場次；bookings 那一側要走索引
+    "rebuild-seats: 計數器比對": (SEAT_COUNTER_MISMATCH_SQL, (), ("SCAN s",)),
+    "sweep_expired_holds(): 過期保留": (EXPIRED_HOLD_EXISTS_SQL, (0,), ()),
+    # 搜尋是 LIKE '%q%'，掃描 movies 與排序一頁的場次都是刻意接受的，理由見 ADMIN_MOVIES_PAGE_SQL 上方
+    "manage_movies(): 電影總數": (ADMIN_MOVIES_COUNT_SQL, ("%%",), ("SCAN movies",)),
+    "manage_movies(): 一頁電影與場次": (
+        ADMIN_MOVIES_PAGE_SQL, ("%%", ADMIN_PAGE_SIZE, 0),
+        ("SCAN movies", "SCAN p", "USE TEMP B-TREE FOR ORDER BY")
+    ),
+}
+
+def _is_full_scan(step):
+    return step.startswith("SCAN") or step.startswith("USE TEMP B-TREE")
+
+def explain_hot_queries(db):
+    """回傳 {查詢名稱: [查詢計畫步驟]}"""
+    plans = {}
+    for name, (sql, params, _) in HOT_QUERIES.items():
+        rows = db.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        # 舊版 SQLite 寫成「SCAN TABLE x」
+        plans[name] = [r[3].replace("SCAN TABLE ", "SCAN ") for r in rows]
+    return plans
+
+def unexpected_full_scans(plans):
+    """回傳 [(查詢名稱, 步驟)]：全表掃描或另建排序、且不在 HOT_QUERIES 允許清單裡的步驟"""
+    return [
+        (name, step)
+        for name, steps in plans.items()
+        for step in steps
+        if _is_full_scan(step) and step not in HOT_QUERIES[name][2]
+    ]
+
+@app.cli.command("check-query-plans")
+def check_query_plans_command():
+    """確認熱門查詢都有使用索引"""
+    db = sqlite3.connect(DATABASE)
+    migrate(db)
+    plans = explain_hot_queries(db)
+    db.close()
+
+    for name, steps in plans.items():
+        click.echo(name)
+        for step in steps:
+            allowed = "（允許）" if _is_full_scan(step) and step in HOT_QUERIES[name][2] else ""
+            click.echo(f"    {step}{allowed}")
+    problems = unexpected_full_scans(plans)
+    if problems:
+        click.echo(f"有 {len(problems)} 個步驟做了全表掃描或額外排序")
+        raise SystemExit(1)
+
+# -------------------------
+# 啟動
+# -------------------------
+# FAST_STARTUP 讓 init_db 在 schema 已是最新版本時直接返回；
+# 刻意清空電影或帳號後想要重新灌預設資料時要關掉。
+# PREWARM 在背景編譯常用模板、先算好首頁電影列表與訪客版卡片，第一個請求不必等。
+# Pillow、xlsxwriter 等較重的套件在第一次用到時才載入。
+FAST_STARTUP = False
+PREWARM = False
+PREWARM_WAIT = 5        # 秒，首頁預熱完成前進來的請求最多等多久
+PREWARM_TEMPLATES = ("movies.html", "_movie_card.html", "book.html", "order.html", "login.html")
+
+_prewarm_done = threading.Event()
+_prewarm_done.set()     # 沒有預熱時請求不必等
+
+def prewarm():
+    """編譯常用模板並填好首頁快取，回傳花費秒數"""
+    t0 = time.perf_counter()
+    # 首頁最先有人打，先做首頁；做完就放行等待中的請求，其餘模板接著編譯
+    with app.test_request_context("/"):
+        movies = movie_list_cache.get_or_set(("movies", _data_version), load_movie_list)
+        for movie in movies:
+            render_movie_card(movie, False, False)
+        app.jinja_env.get_template("movies.html")
+    _prewarm_done.set()
+    for name in PREWARM_TEMPLATES:
+        app.jinja_env.get_template(name)
+    return time.perf_counter() - t0
+
+def start_prewarm():
+    """在背景執行 prewarm()，不擋住開始接請求"""
+    def run():
+        try:
+            seconds = prewarm()
+        except Exception:
+            app.logger.exception("預熱失敗")
+        else:
+            app.logger.info("預熱完成，%.0fms", seconds * 1000)
+        finally:
+            _prewarm_done.set()
+
+    _prewarm_done.clear()
+    thread = threading.Thread(target=run, name="prewarm", daemon=True)
+    thread.start()
+    return thread
+
+@app.before_request
+def wait_for_prewarm():
+    # 首頁還沒預熱完就進來的請求等它做完，不要同時再查一次電影列表、再渲染一次卡片
+    if not _prewarm_done.is_set():
+        _prewarm_done.wait(PREWARM_WAIT)
+
+def startup():
+    init_db(fast=FAST_STARTUP)
+    if PREWARM:
+        start_prewarm()
+
 # -------------------------
 # 主程式
 # -------------------------
 if __name__ == "__main__":
-    init_db()
+    startup()
     app.run(debug=True)
\ No newline at end of file
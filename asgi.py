@@ -0,0 +1,367 @@
+"""
+ASGI 模式：同一個 Flask app 改由 ASGI 伺服器（uvicorn）服務，等待中的連線不占執行緒。
+
+一般請求整個交給 DB_WORKERS 條執行緒的 executor 執行：Flask 的 view、get_db() 與 SQLite 都是同步的，
+事件迴圈本身不碰資料庫。還在排隊等 executor 的請求超過 MAX_PENDING 個時直接回 503，
+不讓佇列無限變長。回應本文在 executor 內每湊滿 BATCH_BYTES 送一次，串流的匯出不會整份留在記憶體。
+
+訂票寫入（app.BOOKING_WRITE_ENDPOINTS）的併發名額在送進 executor 之前、於事件迴圈上取得
+（ConcurrencyLimiter.acquire_async），排隊等名額的請求不占 executor 的執行緒；
+否則最多 BOOKING_MAX_WAITING 個排隊中的訂票會卡住全部 DB_WORKERS 條執行緒，連讀取都進不來。
+排隊前先在事件迴圈上跑 app.check_admission_rules()（限速與登入檢查，與 WSGI 的順序相同），
+被限速的直接回 429、未登入的不取名額，不會占住名額或排隊的位置。
+取得與否放進 environ 交給 Flask 的 admission_control 回應，名額在回應送完後歸還。
+
+即時剩餘座位（/api/availability/stream）在事件迴圈內以 asyncio 實作：每條 SSE 連線只是一個
+coroutine，發布時由 Broadcaster 的 listener 喚醒，只有查快照時才用到 executor，
+所以同時連線的上限可以比 WSGI（每條連線一個執行緒）高得多，見 LIVE_MAX_SUBSCRIBERS。
+
+執行方式（在專案根目錄，需要另外安裝 uvicorn）：
+    uvicorn asgi:application --port 8000
+    python -m asgi --port 8000
+"""
+import argparse
+import asyncio
+import io
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import app as movie_app
+from live import TooManySubscribers
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RoutingException
+
+DB_WORKERS = movie_app.DB_POOL_SIZE or 16   # 與連線池同大小，執行緒不必再等連線
+MAX_PENDING = 256
+BATCH_BYTES = 64 * 1024
+LIVE_PATH = "/api/availability/stream"
+LIVE_MAX_SUBSCRIBERS = 20000
+
+
+class _Notifier:
+    """把 Broadcaster 的發布（任意執行緒）轉成事件迴圈上的 future：每次發布換一個新的"""
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def notify(self):
+        try:
+            self.loop.call_soon_threadsafe(self._fire)
+        except RuntimeError:
+            pass    # 事件迴圈已關閉
+
+    def _fire(self):
+        future, self.future = self.future, self.loop.create_future()
+        future.set_result(None)
+
+
+def _environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "CONTENT_LENGTH": str(len(body)),     # 本文已整個讀進來，chunked 上傳也有長度
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1")
+        value = value.decode("latin-1")
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+        elif name == "content-length":
+            continue
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+            if key in environ:
+                # 重複的標頭以逗號合併；Cookie 要用「; 」，HTTP/2 會把每個 cookie 拆成一個標頭
+                value = environ[key] + ("; " if name == "cookie" else ",") + value
+            environ[key] = value
+    return environ
+
+
+def _next_batch(iterator):
+    """在 executor 內讀出一批回應本文，回傳 (chunks, 是否還有)"""
+    chunks = []
+    size = 0
+    for chunk in iterator:
+        if chunk:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= BATCH_BYTES:
+                return chunks, True
+    return chunks, False
+
+
+class AsgiApp:
+    def __init__(self, wsgi_app, workers=DB_WORKERS, max_pending=MAX_PENDING):
+        self.wsgi_app = wsgi_app
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = None
+        self.pending = 0
+        self._notifier = None
+        self._slot_notifier = None
+        self._slots = None
+        self._urls = None
+        self.stats = {"requests": 0, "rejected": 0, "streams": 0}
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="asgi-db")
+        if self._notifier is None or self._notifier.loop is not loop:
+            if self._notifier is not None:
+                movie_app.live_availability.remove_listener(self._notifier.notify)
+            self._notifier = _Notifier(loop)
+            movie_app.live_availability.add_listener(self._notifier.notify)
+            movie_app.live_availability.max_subscribers = LIVE_MAX_SUBSCRIBERS
+        if self._slot_notifier is None or self._slot_notifier.loop is not loop or self._slots is not movie_app.booking_slots:
+            if self._slot_notifier is not None:
+                self._slots.remove_listener(self._slot_notifier.notify)
+            self._slot_notifier = _Notifier(loop)
+            self._slots = movie_app.booking_slots
+            self._slots.add_listener(self._slot_notifier.notify)
+        return loop
+
+    def _run(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def close(self):
+        if self._notifier is not None:
+            movie_app.live_availability.remove_listener(self._notifier.notify)
+            self._notifier = None
+        if self._slot_notifier is not None:
+            self._slots.remove_listener(self._slot_notifier.notify)
+            self._slot_notifier = self._slots = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        self._bind()
+        if scope["path"] == LIVE_PATH and scope["method"] == "GET":
+            return await self._live(scope, receive, send)
+        return await self._wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._bind()
+                await self._run(movie_app.startup)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _send_json(self, send, status, data, headers=()):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        *headers],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    # -------------------------
+    # 一般請求：整個交給 executor
+    # -------------------------
+    def _is_booking_write(self, scope):
+        if scope["method"] != "POST" or not movie_app.ADMISSION_CONTROL:
+            return False
+        if self._urls is None:
+            self._urls = movie_app.app.url_map.bind("localhost")
+        try:
+            endpoint, _ = self._urls.match(scope["path"], method="POST")
+        except (HTTPException, RoutingException):
+            return False
+        return endpoint in movie_app.BOOKING_WRITE_ENDPOINTS
+
+    def _start(self, environ):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+        iterable = self.wsgi_app(environ, start_response)
+        iterator = iter(iterable)
+        chunks, more = _next_batch(iterator)
+        return response["status"], response["headers"], iterable, iterator, chunks, more
+
+    async def _wsgi(self, scope, receive, send):
+        body = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+
+        body = b"".join(body)
+        environ = _environ(scope, body)
+        slot = False
+        if self._is_booking_write(scope):
+            response, wants_slot = self._check_admission(environ, body)
+            if response is not None:
+                return await self._send_response(send, response)
+            if wants_slot:
+                # 在事件迴圈上排隊等訂票名額；沒拿到也照樣交給 Flask，由 admission_control 回 429
+                slot = await self._slots.acquire_async(lambda: self._slot_notifier.future)
+            environ[movie_app.BOOKING_SLOT_ENVIRON] = slot if wants_slot else None
+        try:
+            await self._dispatch(environ, send)
+        finally:
+            if slot:
+                self._slots.release()
+
+    def _check_admission(self, environ, body):
+        """在事件迴圈上跑 check_admission_rules()：只解 session cookie、扣限速的 token，不碰資料庫"""
+        # 另給一份 wsgi.input，之後交給 Flask 的 environ 還能讀到本文
+        with movie_app.app.request_context({**environ, "wsgi.input": io.BytesIO(body)}):
+            return movie_app.check_admission_rules()
+
+    async def _send_response(self, send, response):
+        body = response.get_data()
+        headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in response.headers.to_wsgi_list()]
+        await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _dispatch(self, environ, send):
+        if self.pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            return await self._send_json(
+                send, 503, {"success": False, "message": "伺服器忙碌，請稍後再試"}, [(b"retry-after", b"1")]
+            )
+        self.stats["requests"] += 1
+        self.pending += 1
+        try:
+            status, headers, iterable, iterator, chunks, more = await self._run(self._start, environ)
+        finally:
+            self.pending -= 1
+
+        try:
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            while more:
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": True})
+                chunks, more = await self._run(_next_batch, iterator)
+            await send({"type": "http.response.body", "body": b"".join(chunks)})
+        finally:
+            # close() 會觸發 call_on_close 與匯出產生器的清理，可能碰資料庫
+            if hasattr(iterable, "close"):
+                await self._run(iterable.close)
+
+    # -------------------------
+    # 即時剩餘座位：事件迴圈內的 SSE
+    # -------------------------
+    async def _live(self, scope, receive, send):
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        try:
+            showtime_ids = {int(i) for i in ",".join(query.get("showtimes", [])).split(",") if i.strip()}
+        except ValueError:
+            return await self._send_json(send, 400, {"success": False, "message": "場次格式錯誤"})
+
+        live = movie_app.live_availability
+        try:
+            seq = live.subscribe()
+        except TooManySubscribers:
+            return await self._send_json(
+                send, 503, {"success": False, "message": "即時連線已滿，請稍後再試"},
+                [(b"retry-after", str(movie_app.LIVE_RETRY_MS // 1000).encode())]
+            )
+        self.stats["streams"] += 1
+        movie_app.start_availability_watcher()
+
+        loop = asyncio.get_running_loop()
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream; charset=utf-8"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            })
+            snapshot = await self._run(movie_app.load_availability_snapshot, showtime_ids)
+            await self._send_event(send, f"retry: {movie_app.LIVE_RETRY_MS}\n\n"
+                                   + movie_app._sse("snapshot", snapshot))
+            last_sent = loop.time()
+            while not disconnected.done():
+                # 先拿 future 再看序號：兩者之間的發布會完成這個 future，不會漏掉
+                changed = self._notifier.future
+                if live.seq == seq:
+                    await asyncio.wait(
+                        {changed, disconnected}, timeout=movie_app.LIVE_HEARTBEAT,
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if disconnected.done():
+                        break
+                seq, updates = live.wait(seq, 0)
+                if updates is None:
+                    # 讀太慢被紀錄甩開，整份重送
+                    snapshot = await self._run(movie_app.load_availability_snapshot, showtime_ids)
+                    await self._send_event(send, movie_app._sse("snapshot", snapshot))
+                    last_sent = loop.time()
+                    continue
+                if showtime_ids:
+                    updates = {k: v for k, v in updates.items() if k in showtime_ids}
+                if updates:
+                    await self._send_event(send, movie_app._sse("seats", updates))
+                    last_sent = loop.time()
+                elif loop.time() - last_sent >= movie_app.LIVE_HEARTBEAT:
+                    await self._send_event(send, ": heartbeat\n\n")
+                    last_sent = loop.time()
+        finally:
+            disconnected.cancel()
+            live.unsubscribe()
+
+    async def _send_event(self, send, text):
+        await send({"type": "http.response.body", "body": text.encode("utf-8"), "more_body": True})
+
+    async def _wait_disconnect(self, receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+
+application = AsgiApp(movie_app.app)
+
+
+def main(host, port):
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("ASGI 模式需要 uvicorn：pip install uvicorn")
+    uvicorn.run(application, host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    main(args.host, args.port)
@@ -0,0 +1,85 @@
+"""
+員工管理頁：比較舊的 N+1 查詢與分頁 JOIN 查詢的查詢次數與延遲。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.admin_listing --movies 5000 --showtimes 20
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import app as movie_app
+
+
+def seed(path, movies, showtimes):
+    movie_app.DATABASE = path
+    movie_app.init_db()
+    db = sqlite3.connect(path)
+    db.executemany(
+        "INSERT INTO movies (title, poster_url, total_seats) VALUES (?, ?, 100)",
+        [(f"測試電影 {i}", "posters/多哥.png") for i in range(movies)]
+    )
+    ids = [r[0] for r in db.execute("SELECT id FROM movies")]
+    db.executemany(
+        "INSERT INTO showtimes (movie_id, weekday, time, total_seats) VALUES (?, ?, ?, 100)",
+        ((mid, "週一", f"{n % 24:02d}:00") for mid in ids for n in range(showtimes))
+    )
+    db.commit()
+    db.close()
+
+
+def n_plus_one(db):
+    """改版前 manage_movies() 的查詢方式"""
+    movies = []
+    for m in db.execute("SELECT * FROM movies").fetchall():
+        showtimes = db.execute(
+            "SELECT weekday, time, total_seats FROM showtimes WHERE movie_id=? ORDER BY id",
+            (m["id"],)
+        ).fetchall()
+        m_dict = dict(m)
+        m_dict["showtimes"] = [dict(st) for st in showtimes]
+        movies.append(m_dict)
+    return movies
+
+
+def measure(db, fn):
+    queries = []
+    db.set_trace_callback(queries.append)
+    t0 = time.perf_counter()
+    fn(db)
+    elapsed = (time.perf_counter() - t0) * 1000
+    db.set_trace_callback(None)
+    return len(queries), elapsed
+
+
+def main(movies, showtimes):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    seed(path, movies, showtimes)
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+
+    count, elapsed = measure(db, n_plus_one)
+    print(f"N+1（全部電影）       查詢 {count:6d} 次  {elapsed:8.1f}ms")
+    for page in (1, movies // movie_app.ADMIN_PAGE_SIZE):
+        count, elapsed = measure(db, lambda d: movie_app.load_admin_movies(d, page=page))
+        print(f"分頁 JOIN（第 {page} 頁）  查詢 {count:6d} 次  {elapsed:8.1f}ms")
+    count, elapsed = measure(db, lambda d: movie_app.load_admin_movies(d, q="電影 42"))
+    print(f"分頁 JOIN（搜尋）      查詢 {count:6d} 次  {elapsed:8.1f}ms")
+    db.close()
+
+    client = movie_app.app.test_client()
+    with client.session_transaction() as sess:
+        sess["employee_id"] = 1
+    t0 = time.perf_counter()
+    client.get("/manage_movies")
+    print(f"GET /manage_movies 整頁 {(time.perf_counter() - t0) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--movies", type=int, default=5000)
+    parser.add_argument("--showtimes", type=int, default=20)
+    args = parser.parse_args()
+    main(args.movies, args.showtimes)
@@ -0,0 +1,134 @@
+"""
+流量控制：模擬開賣時機器人狂打 POST /book，量測一般使用者的訂票延遲與成功率，
+比較 app.ADMISSION_CONTROL 關閉與開啟的差別。
+
+機器人各自登入、收到回應後只隔 --bot-rtt-ms（模擬網路來回）就再送一次訂票，
+共用少數幾個 IP；一般使用者各有自己的 IP，每隔 --think-ms 訂一次票。每個模式跑 --seconds 秒。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.admission --bots 32 --users 8 --seconds 10
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import app as movie_app
+
+PASSWORD = "bench"
+SHOWTIMES = 50
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+
+def setup(path, accounts):
+    movie_app.DATABASE = path
+    movie_app.init_db()
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executemany(
+        "INSERT INTO users (username, password, full_name, phone) VALUES (?, ?, ?, '0912345678')",
+        ((f"u{n}", PASSWORD, f"使用者{n}") for n in range(accounts))
+    )
+    # 座位給足，量的是排隊與搶鎖，不是售完
+    ids = []
+    for n in range(SHOWTIMES):
+        cur = db.execute(
+            "INSERT INTO showtimes (movie_id, weekday, time, total_seats) VALUES (1, '週六', ?, 2000)",
+            (f"{n // 60:02d}:{n % 60:02d}",)
+        )
+        ids.append(cur.lastrowid)
+    db.commit()
+    db.close()
+    return ids
+
+
+def client(account, ip):
+    c = movie_app.app.test_client()
+    c.environ_base["REMOTE_ADDR"] = ip
+    c.post("/login", data={"username": f"u{account}", "password": PASSWORD})
+    return c
+
+
+def run(enabled, bots, users, seconds, think_ms, bot_ips, bot_rtt_ms):
+    path = os.path.join(tempfile.mkdtemp(), "admission.db")
+    showtime_ids = setup(path, bots + users)
+    movie_app.ADMISSION_CONTROL = False     # 登入不受限
+    bot_clients = [client(n, f"10.0.0.{n % bot_ips + 1}") for n in range(bots)]
+    user_clients = [client(bots + n, f"10.1.{n // 250}.{n % 250 + 1}") for n in range(users)]
+    movie_app.ADMISSION_CONTROL = enabled
+    for limiter in movie_app.rate_limiters.values():
+        limiter._buckets.clear()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {"bot": [], "user": []}
+
+    def worker(kind, c, pause):
+        mine = []
+        i = 0
+        while not stop.is_set():
+            i += 1
+            data = {"showtime_id": str(showtime_ids[(id(c) + i) % len(showtime_ids)]), "tickets": "1"}
+            t0 = time.perf_counter()
+            status = c.post("/book/1", data=data).status_code
+            mine.append((time.perf_counter() - t0, status))
+            if pause:
+                time.sleep(pause)
+        with lock:
+            results[kind].extend(mine)
+
+    threads = [threading.Thread(target=worker, args=("bot", c, bot_rtt_ms / 1000)) for c in bot_clients]
+    threads += [threading.Thread(target=worker, args=("user", c, think_ms / 1000)) for c in user_clients]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    summary = {}
+    for kind, samples in results.items():
+        ok = [s for s, status in samples if status == 302]
+        summary[kind] = {
+            "requests": len(samples),
+            "booked": len(ok),
+            "rejected": sum(1 for _, status in samples if status == 429),
+            "p50": percentile(ok, 0.5) * 1000,
+            "p99": percentile(ok, 0.99) * 1000,
+        }
+    db = sqlite3.connect(path)
+    summary["orders"] = db.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+    db.close()
+    summary["slots"] = movie_app.booking_slots.stats()
+    return summary
+
+
+def main(bots, users, seconds, think_ms, bot_ips, bot_rtt_ms):
+    print(f"{bots} 個機器人（{bot_ips} 個 IP）、{users} 個一般使用者（每 {think_ms}ms 訂一次），各跑 {seconds} 秒")
+    for enabled in (False, True):
+        r = run(enabled, bots, users, seconds, think_ms, bot_ips, bot_rtt_ms)
+        print(f"流量控制{'開' if enabled else '關'}：寫入 {r['orders']} 筆訂單")
+        if enabled:
+            print(f"  寫入名額：{r['slots']}")
+        for kind, label in (("user", "一般使用者"), ("bot", "機器人")):
+            k = r[kind]
+            print(f"  {label}：{k['requests']} 次請求，成功 {k['booked']}，429 {k['rejected']}，"
+                  f"成功者 p50 {k['p50']:.1f}ms，p99 {k['p99']:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bots", type=int, default=32)
+    parser.add_argument("--bot-ips", type=int, default=4)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--think-ms", type=float, default=2000)
+    parser.add_argument("--bot-rtt-ms", type=float, default=10)
+    args = parser.parse_args()
+    main(args.bots, args.users, args.seconds, args.think_ms, args.bot_ips, args.bot_rtt_ms)
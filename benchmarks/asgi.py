@@ -0,0 +1,261 @@
+"""
+ASGI 模式與 WSGI 的比較：開一個伺服器行程，先掛上 --idle 條閒置的 SSE 連線
+（/api/availability/stream，模擬開著訂票頁的人），再用 --pollers 個客戶端輪詢
+/api/showtimes/<id>/availability --seconds 秒，比較兩種模式：
+
+    wsgi   app.app.run(threaded=True)，每條連線一個執行緒
+    asgi   uvicorn asgi:application，SSE 在事件迴圈內，資料庫存取在有上限的 executor
+
+輸出成功掛上的 SSE 連線數、被拒絕（503）的數量、輪詢的吞吐量與 p50/p99 延遲，
+以及伺服器行程的執行緒數與記憶體。沒有安裝 uvicorn 時略過 asgi 模式。
+客戶端與伺服器在同一台機器上，CPU 少時兩邊會互搶，數字只供相對比較。
+
+--bookers 讓這麼多個使用者在輪詢的同時不斷 POST /book，並開啟 app.ADMISSION_CONTROL，
+看訂票在併發上限（BOOKING_MAX_CONCURRENT）前排隊時輪詢會不會被拖慢。所有客戶端都來自
+127.0.0.1，限速器會放寬到不會擋人，只留併發上限；--commit-ms 模擬較慢的 commit
+（同 benchmarks.shards），讓訂票名額真的會滿。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.asgi --idle 2000 --pollers 16 --seconds 10
+    python -m benchmarks.asgi --modes asgi --idle 10000
+    python -m benchmarks.asgi --idle 200 --bookers 64 --commit-ms 5
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import random
+import resource
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.routes import PASSWORD, seed
+
+SERVERS = {
+    "wsgi": "app.app.run(port={port}, threaded=True, debug=False, use_reloader=False)",
+    "asgi": "import asgi, uvicorn; uvicorn.run(asgi.application, port={port}, log_level='warning')",
+}
+CHILD = """
+import app
+app.DATABASE = {db!r}
+app.FAST_STARTUP = True
+app.ADMISSION_CONTROL = {bookers} > 0
+if {bookers}:
+    from admission import RateLimiter
+    for name in app.rate_limiters:
+        app.rate_limiters[name] = RateLimiter(1e9, 1e9)
+if {commit_ms}:
+    from benchmarks.shards import slow_commits
+    slow_commits({commit_ms} / 1000)
+app.startup()
+{server}
+"""
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_stats(pid):
+    stats = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Threads", "VmRSS"):
+                stats[key] = value.strip()
+    return stats
+
+
+async def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"port {port} 沒有開啟")
+
+
+async def http(port, method, path, form=None, cookie=None):
+    """送一個 Connection: close 的請求，回傳 (狀態碼, Set-Cookie 的 name=value)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = form.encode() if form else b""
+    head = f"{method} {path} HTTP/1.1\r\nHost: bench\r\nConnection: close\r\nContent-Length: {len(body)}\r\n"
+    if form:
+        head += "Content-Type: application/x-www-form-urlencoded\r\n"
+    if cookie:
+        head += f"Cookie: {cookie}\r\n"
+    writer.write(head.encode() + b"\r\n" + body)
+    response = await reader.read()
+    writer.close()
+    lines = response.split(b"\r\n\r\n", 1)[0].decode("latin-1").split("\r\n")
+    set_cookie = next((l.split(":", 1)[1].strip().split(";")[0] for l in lines
+                       if l.lower().startswith("set-cookie:")), None)
+    return int(lines[0].split()[1]), set_cookie
+
+
+async def get(port, path):
+    return (await http(port, "GET", path))[0]
+
+
+async def idle_stream(port, showtime_id, statuses, opened, stop):
+    async with opened:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(
+                f"GET /api/availability/stream?showtimes={showtime_id} HTTP/1.1\r\nHost: bench\r\n\r\n".encode()
+            )
+            status = int((await reader.readline()).split()[1])
+        except (OSError, IndexError, ValueError):
+            statuses["error"] += 1
+            return
+    statuses[status] += 1
+    if status != 200:
+        writer.close()
+        return
+    # 把事件讀掉，直到結束
+    read = asyncio.ensure_future(reader.read())
+    await asyncio.wait({read, asyncio.ensure_future(stop.wait())}, return_when=asyncio.FIRST_COMPLETED)
+    read.cancel()
+    writer.close()
+
+
+async def poller(port, path, seconds, latencies, statuses):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        t0 = time.perf_counter()
+        try:
+            status = await get(port, path)
+        except OSError:
+            statuses["error"] += 1
+            continue
+        statuses[status] += 1
+        if status == 200:
+            latencies.append(time.perf_counter() - t0)
+
+
+async def booker(port, user, targets, seconds, latencies, statuses):
+    _, cookie = await http(port, "POST", "/login", f"username={user}&password={PASSWORD}")
+    rng = random.Random(user)
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        movie_id, showtime_id = rng.choice(targets)
+        t0 = time.perf_counter()
+        try:
+            status, _ = await http(port, "POST", f"/book/{movie_id}", f"showtime_id={showtime_id}&tickets=1", cookie)
+        except OSError:
+            statuses["error"] += 1
+            continue
+        statuses[status] += 1
+        if status == 302:
+            latencies.append(time.perf_counter() - t0)
+
+
+async def measure(port, pid, idle, pollers, bookers, seconds, showtime_ids, targets):
+    await wait_for_port(port)
+    stop = asyncio.Event()
+    stream_statuses = Counter()
+    opened = asyncio.Semaphore(64)      # 一次最多 64 條在建立中，不要塞爆 listen backlog
+    t0 = time.perf_counter()
+    streams = [
+        asyncio.ensure_future(idle_stream(port, showtime_ids[n % len(showtime_ids)], stream_statuses, opened, stop))
+        for n in range(idle)
+    ]
+    while sum(stream_statuses.values()) < idle:
+        await asyncio.sleep(0.05)
+    connect_seconds = time.perf_counter() - t0
+    server = process_stats(pid)
+
+    latencies = []
+    poll_statuses = Counter()
+    book_latencies = []
+    book_statuses = Counter()
+    path = f"/api/showtimes/{showtime_ids[0]}/availability"
+    await asyncio.gather(
+        *(poller(port, path, seconds, latencies, poll_statuses) for _ in range(pollers)),
+        *(booker(port, f"user{n + 1}", targets, seconds, book_latencies, book_statuses) for n in range(bookers))
+    )
+    stop.set()
+    await asyncio.gather(*streams)
+    return {
+        "streams": dict(stream_statuses),
+        "connect_seconds": connect_seconds,
+        "server": server,
+        "polls": dict(poll_statuses),
+        "per_sec": len(latencies) / seconds,
+        "p50": percentile(latencies, 0.5) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "books": dict(book_statuses),
+        "book_p50": percentile(book_latencies, 0.5) * 1000,
+        "book_p99": percentile(book_latencies, 0.99) * 1000,
+    }
+
+
+def run(mode, db_path, idle, pollers, bookers, commit_ms, seconds, showtime_ids, targets):
+    port = free_port()
+    code = CHILD.format(db=db_path, bookers=bookers, commit_ms=commit_ms, server=SERVERS[mode].format(port=port))
+    proc = subprocess.Popen(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        return asyncio.run(measure(port, proc.pid, idle, pollers, bookers, seconds, showtime_ids, targets))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(modes, db_path, idle, pollers, bookers, commit_ms, seconds):
+    if not os.path.exists(db_path):
+        print(seed(db_path, 50, 14, 1000, 10000))
+    db = sqlite3.connect(db_path)
+    showtime_ids = [r[0] for r in db.execute("SELECT id FROM showtimes ORDER BY id LIMIT 100")]
+    targets = db.execute("SELECT movie_id, id FROM showtimes").fetchall()
+    db.close()
+
+    # 每條連線在客戶端與伺服器各占一個檔案描述子
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < idle + 1024:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, idle + 1024), hard))
+
+    print(f"{idle} 條閒置 SSE 連線，{pollers} 個客戶端輪詢 {seconds} 秒"
+          + (f"，同時 {bookers} 個使用者訂票（commit 延遲 {commit_ms}ms）" if bookers else ""))
+    for mode in modes:
+        if mode == "asgi" and importlib.util.find_spec("uvicorn") is None:
+            print("asgi：未安裝 uvicorn（pip install uvicorn），略過")
+            continue
+        r = run(mode, db_path, idle, pollers, bookers, commit_ms, seconds, showtime_ids, targets)
+        print(f"{mode}：SSE {r['streams']}（{r['connect_seconds']:.1f} 秒），"
+              f"伺服器 {r['server'].get('Threads')} 條執行緒、{r['server'].get('VmRSS')}")
+        print(f"  輪詢 {r['polls']}，{r['per_sec']:.0f} 次/秒，p50 {r['p50']:.1f}ms，p99 {r['p99']:.1f}ms")
+        if bookers:
+            print(f"  訂票 {r['books']}，成功的 p50 {r['book_p50']:.1f}ms，p99 {r['book_p99']:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modes", nargs="+", default=["wsgi", "asgi"], choices=list(SERVERS))
+    parser.add_argument("--db", help="資料庫路徑；已存在時直接沿用")
+    parser.add_argument("--idle", type=int, default=2000)
+    parser.add_argument("--pollers", type=int, default=16)
+    parser.add_argument("--bookers", type=int, default=0)
+    parser.add_argument("--commit-ms", type=float, default=0)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+    main(args.modes, args.db or os.path.join(tempfile.mkdtemp(), "asgi.db"), args.idle, args.pollers,
+         args.bookers, args.commit_ms, args.seconds)
@@ -0,0 +1,95 @@
+"""
+併發訂票壓力測試：多執行緒同時對同一場次訂票，確認不會超賣並回報吞吐量。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.booking_stress --threads 32 --bookings 5000 --seats 3000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import app as movie_app
+
+
+def setup_database(path, seats):
+    movie_app.DATABASE = path
+    movie_app.init_db()
+    db = sqlite3.connect(path)
+    cur = db.execute(
+        "INSERT INTO showtimes (movie_id, weekday, time, total_seats) VALUES (1, '週一', '20:00', ?)",
+        (seats,)
+    )
+    db.commit()
+    db.close()
+    return cur.lastrowid
+
+
+def run(threads, bookings, seats, max_tickets):
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, "stress.db")
+    showtime_id = setup_database(path, seats)
+
+    per_thread = bookings // threads
+    results = {"ok": 0, "sold_out": 0, "tickets": 0, "errors": 0}
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(threads)
+
+    def worker(n):
+        db = sqlite3.connect(path, timeout=5)
+        db.row_factory = sqlite3.Row
+        ok = sold_out = tickets_sold = errors = 0
+        start_barrier.wait()
+        for i in range(per_thread):
+            tickets = 1 + (n + i) % max_tickets
+            try:
+                movie_app.book_seats(db, showtime_id, f"user{n}", tickets)
+                ok += 1
+                tickets_sold += tickets
+            except movie_app.SeatsUnavailable:
+                sold_out += 1
+            except sqlite3.OperationalError:
+                errors += 1
+        db.close()
+        with lock:
+            results["ok"] += ok
+            results["sold_out"] += sold_out
+            results["tickets"] += tickets_sold
+            results["errors"] += errors
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+
+    db = sqlite3.connect(path)
+    counter, total = db.execute(
+        "SELECT booked_seats, total_seats FROM showtimes WHERE id = ?", (showtime_id,)
+    ).fetchone()
+    actual = db.execute(
+        "SELECT IFNULL(SUM(tickets), 0) FROM bookings WHERE showtime_id = ?", (showtime_id,)
+    ).fetchone()[0]
+    db.close()
+
+    attempts = per_thread * threads
+    print(f"嘗試訂票 {attempts} 次（{threads} 執行緒），成功 {results['ok']}，售完拒絕 {results['sold_out']}，錯誤 {results['errors']}")
+    print(f"已售 {actual} / {total} 席，計數器 {counter}")
+    print(f"耗時 {elapsed:.2f}s，{attempts / elapsed:.0f} 次/秒")
+
+    assert actual <= total, "超賣！"
+    assert actual == counter == results["tickets"], "計數器與訂單不一致"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--bookings", type=int, default=5000)
+    parser.add_argument("--seats", type=int, default=3000)
+    parser.add_argument("--max-tickets", type=int, default=4)
+    args = parser.parse_args()
+    run(args.threads, args.bookings, args.seats, args.max_tickets)
@@ -0,0 +1,63 @@
+"""
+訂單匯出：量測 CSV / XLSX 匯出的第一個位元組延遲、總時間與 Python 記憶體峰值，
+確認峰值不隨訂單數成長。tracemalloc 會拖慢執行，時間只供相對比較。
+
+資料庫沿用 benchmarks.routes 的合成資料（--db 已存在時直接沿用）。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.export --bookings 1000000
+    python -m benchmarks.export --db /tmp/big.db
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+import app as movie_app
+from benchmarks.routes import seed
+
+
+def measure(fmt, db_path, filters):
+    movie_app.DATABASE = db_path
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in movie_app._export_stream(fmt, filters):
+        if first is None:
+            first = time.perf_counter() - t0
+        size += len(chunk)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"first_byte": first, "seconds": elapsed, "bytes": size, "peak": peak}
+
+
+def main(db_path, bookings, movies):
+    if not os.path.exists(db_path):
+        print(seed(db_path, movies, 14, 10000, bookings))
+    movie_app.DATABASE = db_path
+    movie_app.init_db()
+
+    db = sqlite3.connect(db_path)
+    rows = db.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+    plan = db.execute("EXPLAIN QUERY PLAN SELECT * FROM bookings b ORDER BY b.created_at, b.id").fetchall()
+    db.close()
+    print(f"{rows} 筆訂單；排序方式：{'; '.join(p[3] for p in plan)}")
+
+    for fmt in ("csv", "xlsx"):
+        for label, filters in (("全部", (None, None, None)), ("單一電影", (None, None, 1))):
+            r = measure(fmt, db_path, filters)
+            print(f"{fmt:>4} {label}：第一個位元組 {r['first_byte'] * 1000:.1f}ms，共 {r['seconds']:.2f} 秒，"
+                  f"{r['bytes'] / 1e6:.1f} MB，Python 記憶體峰值 {r['peak'] / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", help="資料庫路徑；已存在時直接沿用")
+    parser.add_argument("--bookings", type=int, default=1000000)
+    parser.add_argument("--movies", type=int, default=200)
+    args = parser.parse_args()
+    main(args.db or os.path.join(tempfile.mkdtemp(), "export.db"), args.bookings, args.movies)
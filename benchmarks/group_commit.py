@@ -0,0 +1,127 @@
+"""
+Group commit 與逐筆 commit 的訂票吞吐量比較：同樣的併發訂票，分別以
+BOOKING_MODE = "direct" 與 "group" 執行，回報每秒訂單數與延遲分位數，並確認沒有超賣。
+
+座位總數刻意比需求少一點，讓最後一段走到售完拒絕的路徑。
+--synchronous FULL 可以看到每次 commit 都要 fsync 時的差距。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.group_commit --threads 32 --bookings 4000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import app as movie_app
+import db_pool
+import seatmap
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def setup(path, halls, seats):
+    movie_app.DATABASE = path
+    movie_app.init_db()
+    db = sqlite3.connect(path)
+    # 先切到 WAL，免得 32 條連線同時建立時搶著切換 journal mode
+    db.execute("PRAGMA journal_mode=WAL")
+    ids = []
+    for n in range(halls):
+        cur = db.execute(
+            "INSERT INTO showtimes (movie_id, weekday, time, total_seats) VALUES (1, '週六', ?, ?)",
+            (f"{10 + n}:00", seats)
+        )
+        ids.append(cur.lastrowid)
+    db.commit()
+    db.close()
+    return ids
+
+
+def run(mode, threads, bookings, halls, seats):
+    movie_app.BOOKING_MODE = mode
+    path = os.path.join(tempfile.mkdtemp(), f"{mode}.db")
+    showtime_ids = setup(path, halls, seats)
+    per_thread = bookings // threads
+    latencies = []
+    outcome = {"ok": 0, "sold_out": 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(n):
+        pool = movie_app.get_pool()
+        mine = []
+        ok = sold_out = 0
+        barrier.wait()
+        for i in range(per_thread):
+            # 與一般請求相同：每筆訂票借一次連線
+            t0 = time.perf_counter()
+            db = pool.acquire()
+            try:
+                movie_app.book_seats(db, showtime_ids[(n + i) % halls], f"user{n}", 1 + i % 3)
+                ok += 1
+            except movie_app.SeatsUnavailable:
+                sold_out += 1
+            finally:
+                pool.release(db)
+            mine.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(mine)
+            outcome["ok"] += ok
+            outcome["sold_out"] += sold_out
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+
+    db = sqlite3.connect(path)
+    for showtime_id in showtime_ids:
+        counter = db.execute("SELECT booked_seats FROM showtimes WHERE id = ?", (showtime_id,)).fetchone()[0]
+        assigned = []
+        for (text,) in db.execute("SELECT seats FROM bookings WHERE showtime_id = ?", (showtime_id,)):
+            assigned.extend(seatmap.parse_seats(text))
+        assert len(assigned) == len(set(assigned)) == counter <= seats, f"場次 {showtime_id} 超賣或座位重複"
+    db.close()
+
+    writer = movie_app._booking_writer.stats() if mode == "group" else None
+    return {
+        "per_sec": len(latencies) / elapsed,
+        "p50": percentile(latencies, 0.5) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "writer": writer,
+        **outcome,
+    }
+
+
+def main(threads, bookings, halls, seats, synchronous):
+    db_pool.PRAGMAS["synchronous"] = synchronous
+    print(f"{threads} 執行緒、{bookings} 次訂票、{halls} 廳 x {seats} 席，synchronous={synchronous}")
+    results = {}
+    for mode in ("direct", "group"):
+        r = results[mode] = run(mode, threads, bookings, halls, seats)
+        line = (f"{mode:>6}：{r['per_sec']:.0f} 筆/秒，p50 {r['p50']:.1f}ms，p99 {r['p99']:.1f}ms，"
+                f"成功 {r['ok']}，售完拒絕 {r['sold_out']}")
+        if r["writer"]:
+            line += f"，{r['writer']['batches']} 次 commit（平均每批 {r['writer']['avg_batch']:.1f} 筆）"
+        print(line)
+    print(f"group / direct 吞吐量：{results['group']['per_sec'] / results['direct']['per_sec']:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--bookings", type=int, default=4000)
+    parser.add_argument("--halls", type=int, default=4)
+    parser.add_argument("--seats", type=int, default=1900)
+    parser.add_argument("--synchronous", default="NORMAL", choices=["OFF", "NORMAL", "FULL"])
+    args = parser.parse_args()
+    main(args.threads, args.bookings, args.halls, args.seats, args.synchronous)
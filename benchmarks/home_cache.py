@@ -0,0 +1,72 @@
+"""
+首頁快取效益：比較快取開 / 關時匿名使用者 GET / 的延遲。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.home_cache --requests 2000 --movies 200
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import app as movie_app
+
+
+def add_movies(path, count):
+    db = sqlite3.connect(path)
+    for i in range(count):
+        cur = db.execute(
+            "INSERT INTO movies (title, poster_url, total_seats) VALUES (?, ?, 100)",
+            (f"測試電影 {i}", "posters/多哥.png")
+        )
+        db.executemany(
+            "INSERT INTO showtimes (movie_id, weekday, time, total_seats) VALUES (?, ?, ?, 100)",
+            [(cur.lastrowid, day, "19:00") for day in ["週一", "週三", "週五"]]
+        )
+    db.commit()
+    db.close()
+
+
+def measure(client, requests):
+    latencies = []
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        client.get("/")
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    return statistics.mean(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main(requests, movies):
+    tmpdir = tempfile.mkdtemp()
+    movie_app.DATABASE = os.path.join(tmpdir, "bench.db")
+    shutil.copy("database.db", movie_app.DATABASE)
+    movie_app.init_db()
+    add_movies(movie_app.DATABASE, movies)
+    client = movie_app.app.test_client()
+
+    for cache in (movie_app.movie_list_cache, movie_app.movie_card_cache):
+        cache.ttl = 0
+    uncached = measure(client, requests)
+
+    for cache in (movie_app.movie_list_cache, movie_app.movie_card_cache):
+        cache.ttl = 3600
+        cache.hits = cache.misses = 0
+    client.get("/")
+    cached = measure(client, requests)
+
+    print(f"首頁（{movies} 部電影） 無快取 平均 {uncached[0]:.2f}ms p99 {uncached[1]:.2f}ms")
+    print(f"首頁（{movies} 部電影） 有快取 平均 {cached[0]:.2f}ms p99 {cached[1]:.2f}ms  ({uncached[0] / cached[0]:.1f}x)")
+    print("電影列表快取：", movie_app.movie_list_cache.stats())
+    print("卡片快取：", movie_app.movie_card_cache.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--movies", type=int, default=200)
+    args = parser.parse_args()
+    main(args.requests, args.movies)
@@ -0,0 +1,106 @@
+"""
+SSE 剩餘座位廣播：量測單一 worker 在不同訂閱人數下，從發布到所有訂閱者收到的延遲。
+
+每個訂閱者是一條執行緒（與 WSGI 下每條 SSE 連線占一個執行緒相同）。
+p99 延遲仍在 --budget-ms 以內的最大人數，就是 app.LIVE_MAX_SUBSCRIBERS 的依據。
+另外模擬一個讀很慢的訂閱者，確認它被甩開後改收快照，不會拖住其他人。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.live_fanout --subscribers 100,500,1000,2000,4000
+"""
+import argparse
+import threading
+import time
+
+from live import Broadcaster
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def fanout(subscribers, updates, rate):
+    broadcaster = Broadcaster(backlog=1024)
+    published_at = {}
+    latencies = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    ready = threading.Barrier(subscribers + 1)
+    final = []
+
+    def subscriber():
+        seq = broadcaster.subscribe()
+        seen = []
+        last = None
+        ready.wait()
+        while not stop.is_set():
+            seq, changed = broadcaster.wait(seq, 0.5)
+            if changed:
+                now = time.perf_counter()
+                value = changed[1]
+                seen.append(now - published_at[value])
+                last = value
+        broadcaster.unsubscribe()
+        with lock:
+            latencies.extend(seen)
+            final.append(last)
+
+    threads = [threading.Thread(target=subscriber, daemon=True) for _ in range(subscribers)]
+    for t in threads:
+        t.start()
+    ready.wait()
+
+    t0 = time.perf_counter()
+    for i in range(updates):
+        # 剩餘座位遞減，值本身就是發布的編號
+        published_at[updates - i] = time.perf_counter()
+        broadcaster.publish({1: updates - i})
+        time.sleep(1 / rate)
+    elapsed = time.perf_counter() - t0
+    time.sleep(0.5)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    complete = sum(1 for v in final if v == 1)
+    return {
+        "p50": percentile(latencies, 0.5) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "complete": complete,
+        "deliveries_per_sec": len(latencies) / elapsed,
+    }
+
+
+def slow_subscriber(backlog):
+    """落後超過 backlog 筆的訂閱者應該拿到 None（改送快照）"""
+    broadcaster = Broadcaster(backlog=backlog)
+    seq = broadcaster.subscribe()
+    for i in range(backlog * 3):
+        broadcaster.publish({1: i})
+    seq, changed = broadcaster.wait(seq, 0)
+    return changed is None and broadcaster.resyncs == 1 and len(broadcaster._log) == backlog
+
+
+def main(counts, updates, rate, budget_ms):
+    best = 0
+    for n in counts:
+        r = fanout(n, updates, rate)
+        ok = r["p99"] <= budget_ms and r["complete"] == n
+        if ok:
+            best = n
+        print(f"{n:>5} 個訂閱者：p50 {r['p50']:.1f}ms，p99 {r['p99']:.1f}ms，"
+              f"{r['complete']}/{n} 收到最後一筆，每秒送出 {r['deliveries_per_sec']:.0f} 則"
+              f"{'' if ok else '（超出預算）'}")
+    print(f"p99 ≤ {budget_ms}ms 的最大訂閱人數：{best}")
+    print("慢速訂閱者改送快照：" + ("通過" if slow_subscriber(64) else "失敗"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--subscribers", default="100,500,1000,2000,4000")
+    parser.add_argument("--updates", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=20, help="每秒發布幾筆")
+    parser.add_argument("--budget-ms", type=float, default=250)
+    args = parser.parse_args()
+    main([int(n) for n in args.subscribers.split(",")], args.updates, args.rate, args.budget_ms)
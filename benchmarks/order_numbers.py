@@ -0,0 +1,78 @@
+"""
+訂單編號產生：一百萬組號碼的唯一性，以及與舊作法（隨機 + 查詢檢查）的每筆耗時比較。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.order_numbers --count 1000000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import app as movie_app
+from order_numbers import OrderNumberGenerator
+
+
+def old_generate_unique_order_no(db):
+    """改版前的作法：隨機 6 碼，每次都先查資料庫確認沒撞號"""
+    while True:
+        order_no = f"ORD-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
+        if not db.execute("SELECT 1 FROM bookings WHERE order_no = ?", (order_no,)).fetchone():
+            return order_no
+
+
+def main(count, threads):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    movie_app.DATABASE = path
+    movie_app.init_db()
+
+    # 多個產生器模擬多個 worker 行程，各自預留號段
+    generators = [OrderNumberGenerator(path) for _ in range(threads)]
+    results = [[] for _ in range(threads)]
+
+    def worker(n):
+        gen, out = generators[n], results[n]
+        for _ in range(count // threads):
+            out.append(gen.next())
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+
+    total = sum(len(r) for r in results)
+    unique = len(set().union(*results))
+    blocks = sum(g.blocks_allocated for g in generators)
+    print(f"產生 {total} 組（{threads} 個產生器），重複 {total - unique} 組，預留號段 {blocks} 次")
+    print(f"新作法：每組 {elapsed / total * 1e6:.2f}µs")
+
+    # 舊作法需要對一張有資料的 bookings 表逐筆查詢
+    db = sqlite3.connect(path)
+    db.executemany(
+        "INSERT INTO bookings (order_no, showtime_id, customer_name, tickets) VALUES (?, 1, 'bench', 1)",
+        ((order_no,) for order_no in results[0][:200000])
+    )
+    db.commit()
+    samples = 20000
+    t0 = time.perf_counter()
+    for _ in range(samples):
+        old_generate_unique_order_no(db)
+    old = (time.perf_counter() - t0) / samples
+    db.close()
+    print(f"舊作法：每組 {old * 1e6:.2f}µs（bookings 已有 {min(len(results[0]), 200000)} 筆）")
+    assert total == unique, "訂單編號重複！"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=1000000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+    main(args.count, args.threads)
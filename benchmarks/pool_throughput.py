@@ -0,0 +1,57 @@
+"""
+比較使用連線池前後 / 與 /order 的每秒請求數（多執行緒）。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.pool_throughput --threads 8 --requests 2000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import app as movie_app
+
+
+def drive(path, threads, requests_per_thread):
+    def worker():
+        client = movie_app.app.test_client()
+        client.post("/login", data={"username": "testuser", "password": "1234"})
+        barrier.wait()
+        for i in range(requests_per_thread):
+            client.get(path)
+
+    barrier = threading.Barrier(threads + 1)
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    t0 = time.perf_counter()
+    for w in workers:
+        w.join()
+    return threads * requests_per_thread / (time.perf_counter() - t0)
+
+
+def main(threads, requests):
+    tmpdir = tempfile.mkdtemp()
+    movie_app.DATABASE = os.path.join(tmpdir, "bench.db")
+    shutil.copy("database.db", movie_app.DATABASE)
+    movie_app.init_db()
+
+    per_thread = requests // threads
+    for path in ["/", "/order"]:
+        movie_app.DB_POOL_SIZE = 0
+        before = drive(path, threads, per_thread)
+        movie_app.DB_POOL_SIZE = threads
+        after = drive(path, threads, per_thread)
+        print(f"{path:8} 無連線池 {before:7.0f} req/s   連線池 {after:7.0f} req/s   ({after / before:.2f}x)")
+    print("連線池統計：", movie_app.get_pool().metrics())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.threads, args.requests)
@@ -0,0 +1,48 @@
+"""
+首頁海報流量：比較原圖與瀏覽器依 srcset 會選用的 WebP 縮圖大小。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.poster_bytes
+"""
+import os
+
+import app as movie_app
+from posters import VARIANT_DIR, build_variants
+
+CARD_WIDTH = 240    # 首頁卡片寬度（CSS px），與 _movie_card.html 的 sizes 一致
+
+
+def pick(candidates, needed):
+    """模擬瀏覽器：選寬度足夠的最小候選，沒有就用最大的"""
+    for name, width in candidates:
+        if width >= needed:
+            return name
+    return candidates[-1][0]
+
+
+def main():
+    static = movie_app.app.static_folder
+    poster_dir = os.path.join(static, "posters")
+    totals = {"original": 0, "1x": 0, "2x": 0}
+    for name in sorted(os.listdir(poster_dir)):
+        if not name.lower().endswith((".png", ".jpg", ".jpeg")):
+            continue
+        poster_url = f"posters/{name}"
+        entry = build_variants(static, poster_url)
+        original = os.path.getsize(os.path.join(static, poster_url))
+        one_x = os.path.getsize(os.path.join(static, VARIANT_DIR, pick(entry["webp"], CARD_WIDTH)))
+        two_x = os.path.getsize(os.path.join(static, VARIANT_DIR, pick(entry["webp"], CARD_WIDTH * 2)))
+        totals["original"] += original
+        totals["1x"] += one_x
+        totals["2x"] += two_x
+        print(f"{name:12} 原圖 {original / 1024:7.1f}KB  WebP 1x {one_x / 1024:6.1f}KB  2x {two_x / 1024:6.1f}KB")
+
+    print(
+        f"合計 原圖 {totals['original'] / 1024:.1f}KB → WebP 1x {totals['1x'] / 1024:.1f}KB "
+        f"({totals['original'] / totals['1x']:.1f}x)、2x {totals['2x'] / 1024:.1f}KB "
+        f"({totals['original'] / totals['2x']:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
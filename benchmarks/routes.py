@@ -0,0 +1,397 @@
+"""
+全站路由基準測試：建立指定規模的合成資料庫，用 Flask test client 逐一（單執行緒）
+與併發（多執行緒）打各個主要路由，輸出每個路由的吞吐量、p50/p95/p99 延遲與每次請求的 SQL 數。
+
+併發時每個路由各跑一段（所有執行緒同時打同一個路由），各路由的吞吐量以該段的時間計算。
+
+結果為 JSON；給 --baseline 時與上次的結果比較，任何路由的 SQL 數增加（單執行緒）、
+p95 變慢超過 --tolerance（單執行緒與併發），或併發吞吐量下降超過 --tolerance，就以結束碼 1 結束，
+可以放進 CI 擋下 app.py 的效能退步。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.routes --bookings 200000 --output bench.json
+    python -m benchmarks.routes --bookings 2000000 --db /tmp/big.db     # 已存在就直接沿用
+    python -m benchmarks.routes --baseline bench.json
+    python -m benchmarks.routes --instrument          # 開啟 app.INSTRUMENTATION，看量測本身的成本
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from array import array
+
+import analytics
+import app as movie_app
+import seatmap
+from migrations import migrate
+from order_numbers import format_order_no
+from weekdays import WEEKDAY_ORDER, showtime_slot
+
+PASSWORD = "bench"
+HEAVY_USER = "user0"        # 訂單特別多的使用者，用來測 /order
+HEADROOM = 500              # 每個場次預留給 POST /book 的空位
+
+_local = threading.local()
+
+
+# -------------------------
+# 合成資料
+# -------------------------
+def seed(path, movies, showtimes_per_movie, users, bookings, seed_value=42):
+    """建立合成資料庫，回傳各表筆數與花費時間"""
+    rng = random.Random(seed_value)
+    t0 = time.perf_counter()
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=OFF")
+    migrate(db)
+
+    db.execute("BEGIN")
+    db.executemany(
+        "INSERT INTO movies (id, title, poster_url, total_seats) VALUES (?, ?, NULL, 250)",
+        ((m, f"電影 {m:05d}") for m in range(1, movies + 1))
+    )
+    db.executemany(
+        "INSERT INTO users (username, password, full_name, phone) VALUES (?, ?, ?, '0912345678')",
+        ((f"user{u}", PASSWORD, f"使用者{u}") for u in range(users))
+    )
+
+    # 先決定每筆訂單的場次與張數，才知道每個場次要開多少座位
+    total_showtimes = movies * showtimes_per_movie
+    booking_showtime = array("i", (rng.randrange(total_showtimes) + 1 for _ in range(bookings)))
+    booking_tickets = array("b", (rng.randint(1, 4) for _ in range(bookings)))
+    booked = [0] * (total_showtimes + 1)
+    for s, t in zip(booking_showtime, booking_tickets):
+        booked[s] += t
+
+    weekdays = list(WEEKDAY_ORDER)
+    db.executemany(
+        "INSERT INTO showtimes (id, movie_id, weekday, weekday_code, slot, time, total_seats, booked_seats) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (s, (s - 1) // showtimes_per_movie + 1, weekdays[s % 7],
+             *showtime_slot(weekdays[s % 7], f"{10 + s % 12}:{s % 2 * 30:02d}"), f"{10 + s % 12}:{s % 2 * 30:02d}",
+             booked[s] + HEADROOM, booked[s])
+            for s in range(1, total_showtimes + 1)
+        )
+    )
+
+    # 座位依序配給訂單
+    next_seat = [0] * (total_showtimes + 1)
+    order_no_key = db.execute("SELECT scramble_key FROM order_no_sequence WHERE id = 1").fetchone()[0]
+
+    def booking_rows():
+        for i in range(bookings):
+            s, t = booking_showtime[i], booking_tickets[i]
+            start = next_seat[s]
+            next_seat[s] += t
+            customer = HEAVY_USER if i % 100 == 0 else f"user{rng.randrange(users)}"
+            yield (format_order_no(i, order_no_key), s, customer, t, seatmap.format_seats(range(start, start + t)))
+
+    db.executemany(
+        "INSERT INTO bookings (order_no, showtime_id, customer_name, tickets, seats) VALUES (?, ?, ?, ?, ?)",
+        booking_rows()
+    )
+    db.executemany(
+        "INSERT INTO seat_maps (showtime_id, rows, cols, bitmap) VALUES (?, ?, ?, ?)",
+        (
+            (s, *_seat_map_row(booked[s] + HEADROOM, booked[s]))
+            for s in range(1, total_showtimes + 1)
+        )
+    )
+    # 訂單號序號要接在合成資料後面
+    db.execute("UPDATE order_no_sequence SET next_value = ? WHERE id = 1", (bookings,))
+    db.commit()
+    # 合成訂單沒有經過訂票流程，銷售統計用重建的方式補上
+    rollups = analytics.rebuild_rollups(db)
+    db.execute("ANALYZE")
+    db.close()
+
+    # 補上預設員工帳號等
+    movie_app.DATABASE = path
+    movie_app.init_db()
+    return {
+        "movies": movies,
+        "showtimes": total_showtimes,
+        "users": users,
+        "bookings": bookings,
+        "seconds": round(time.perf_counter() - t0, 2),
+        "rebuild_analytics_seconds": round(rollups["seconds"], 2),
+    }
+
+
+def _seat_map_row(total_seats, taken):
+    rows, cols = seatmap.layout_for(total_seats)
+    capacity = rows * cols
+    bits = ((1 << capacity) - 1) ^ ((1 << total_seats) - 1)
+    bits |= (1 << taken) - 1
+    return rows, cols, seatmap.to_bytes(bits, capacity)
+
+
+# -------------------------
+# SQL 計數
+# -------------------------
+def _count_statement(sql):
+    _local.queries = getattr(_local, "queries", 0) + 1
+
+
+def trace_pool_connections():
+    """讓連線池的每條連線都記錄 SQL 數（記在執行請求的執行緒上）"""
+    pool = movie_app.get_pool()
+    conns = [pool.acquire() for _ in range(pool.size)]
+    for conn in conns:
+        conn.set_trace_callback(_count_statement)
+    for conn in conns:
+        pool.release(conn)
+
+
+# -------------------------
+# 路由
+# -------------------------
+class Context:
+    """每個執行緒各自的登入狀態與可刪的訂單"""
+    def __init__(self, path, username, movies, rng):
+        self.rng = rng
+        self.movies = movies
+        self.username = username
+        self.guest = movie_app.app.test_client()
+        self.user = movie_app.app.test_client()
+        self.employee = movie_app.app.test_client()
+        self.user.post("/login", data={"username": username, "password": PASSWORD})
+        self.employee.post("/employee_login", data={"username": "aa", "password": "111"})
+        db = sqlite3.connect(path)
+        self.showtimes = {}
+        self.orders = db.execute(
+            "SELECT order_no, showtime_id FROM bookings WHERE customer_name = ? ORDER BY id DESC LIMIT 2000",
+            (username,)
+        ).fetchall()
+        db.close()
+
+    def showtime_of(self, movie_id):
+        if movie_id not in self.showtimes:
+            db = sqlite3.connect(movie_app.DATABASE)
+            self.showtimes[movie_id] = [r[0] for r in db.execute(
+                "SELECT id FROM showtimes WHERE movie_id = ?", (movie_id,)
+            )]
+            db.close()
+        return self.rng.choice(self.showtimes[movie_id])
+
+
+def _book_post(ctx):
+    movie_id = ctx.rng.randint(1, ctx.movies)
+    return ctx.user.post(f"/book/{movie_id}", data={"showtime_id": ctx.showtime_of(movie_id), "tickets": 1})
+
+
+def _delete_order(ctx):
+    if not ctx.orders:
+        return None
+    order_no, showtime_id = ctx.orders.pop()
+    return ctx.user.post(f"/delete_order/{order_no}/{showtime_id}")
+
+
+ROUTES = {
+    "GET / (guest)": lambda ctx: ctx.guest.get("/"),
+    "GET / (logged in)": lambda ctx: ctx.user.get("/"),
+    "GET /book/<id>": lambda ctx: ctx.user.get(f"/book/{ctx.rng.randint(1, ctx.movies)}"),
+    "POST /book/<id>": _book_post,
+    "GET /order": lambda ctx: ctx.user.get("/order"),
+    "POST /delete_order": _delete_order,
+    "GET /manage_movies": lambda ctx: ctx.employee.get(
+        f"/manage_movies?page={ctx.rng.randint(1, max(ctx.movies // movie_app.ADMIN_PAGE_SIZE, 1))}"
+    ),
+    "GET /manage_movies?q=": lambda ctx: ctx.employee.get(f"/manage_movies?q={ctx.rng.randint(1, 999):03d}"),
+    "GET /api/movies": lambda ctx: ctx.guest.get("/api/movies"),
+    "GET /analytics": lambda ctx: ctx.employee.get("/analytics"),
+}
+
+
+def call(route, ctx):
+    """執行一次請求，回傳 (秒, SQL 數, 是否成功)；沒有可執行的請求時回傳 None"""
+    _local.queries = 0
+    t0 = time.perf_counter()
+    response = ROUTES[route](ctx)
+    elapsed = time.perf_counter() - t0
+    if response is None:
+        return None
+    ok = response.status_code < 400
+    if route == "POST /delete_order":
+        ok = ok and response.json.get("success")
+    return elapsed, _local.queries, ok
+
+
+def summarize(samples, wall=None):
+    latencies = sorted(s[0] for s in samples)
+    n = len(latencies)
+    if not n:
+        return {"requests": 0}
+
+    def pct(p):
+        return round(latencies[min(int(n * p), n - 1)] * 1000, 3)
+
+    return {
+        "requests": n,
+        "rps": round(n / (wall if wall is not None else sum(latencies)), 1),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "queries_per_request": round(sum(s[1] for s in samples) / n, 2),
+        "errors": sum(1 for s in samples if not s[2]),
+    }
+
+
+def run_sequential(path, movies, requests):
+    ctx = Context(path, HEAVY_USER, movies, random.Random(1))
+    results = {}
+    for route in ROUTES:
+        call(route, ctx)    # 暖機：模板編譯、快取
+        samples = [s for s in (call(route, ctx) for _ in range(requests)) if s]
+        results[route] = summarize(samples)
+    return results
+
+
+def run_concurrent(path, movies, threads, requests):
+    """每個路由各跑一段：所有執行緒同時打同一個路由，各 requests 次
+
+    各路由的 rps 以該段的牆鐘時間計算；若所有路由混在同一段，每個路由都只能除以同一段時間，
+    量不出個別路由的併發吞吐量。
+    """
+    contexts = [Context(path, f"user{n + 1}", movies, random.Random(100 + n)) for n in range(threads)]
+    routes = {}
+    total = elapsed = 0
+    for route in ROUTES:
+        samples, wall = _concurrent_phase(route, contexts, requests)
+        routes[route] = summarize(samples, wall)
+        routes[route]["seconds"] = round(wall, 3)
+        total += len(samples)
+        elapsed += wall
+    return {
+        "threads": threads,
+        "phase_per_route": True,
+        "seconds": round(elapsed, 2),
+        "total_rps": round(total / elapsed, 1),
+        "routes": routes,
+    }
+
+
+def _concurrent_phase(route, contexts, requests):
+    """所有執行緒同時打 route，回傳 (樣本, 牆鐘秒數)"""
+    samples = []
+    lock = threading.Lock()
+    ready = threading.Barrier(len(contexts) + 1)
+
+    def worker(ctx):
+        mine = []
+        ready.wait()
+        for _ in range(requests):
+            s = call(route, ctx)
+            if s:
+                mine.append(s)
+        with lock:
+            samples.extend(mine)
+
+    workers = [threading.Thread(target=worker, args=(ctx,)) for ctx in contexts]
+    for w in workers:
+        w.start()
+    ready.wait()
+    t0 = time.perf_counter()
+    for w in workers:
+        w.join()
+    return samples, time.perf_counter() - t0
+
+
+def compare(result, baseline, tolerance):
+    """回傳退步的項目說明"""
+    sections = [("", result["sequential"], baseline.get("sequential", {}))]
+    # 舊格式的併發結果各路由共用同一段時間，rps 不能拿來比
+    if baseline.get("concurrent", {}).get("phase_per_route"):
+        sections.append(("併發 ", result["concurrent"]["routes"], baseline["concurrent"]["routes"]))
+
+    regressions = []
+    for label, routes, before_routes in sections:
+        for route, now in routes.items():
+            before = before_routes.get(route)
+            if not before or not before.get("requests") or not now.get("requests"):
+                continue
+            name = label + route
+            # 併發時快取失效、清過期保留的時機不固定，SQL 數只看單執行緒的結果
+            if not label and now["queries_per_request"] > before["queries_per_request"]:
+                regressions.append(f"{name}：SQL 數 {before['queries_per_request']} → {now['queries_per_request']}")
+            if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{name}：p95 {before['p95_ms']}ms → {now['p95_ms']}ms")
+            if label and now["rps"] < before["rps"] * (1 - tolerance):
+                regressions.append(f"{name}：吞吐量 {before['rps']} → {now['rps']} 次/秒")
+    return regressions
+
+
+def main(args):
+    path = args.db or os.path.join(tempfile.mkdtemp(), "routes.db")
+    if os.path.exists(path):
+        movie_app.DATABASE = path
+        movie_app.init_db()
+        db = sqlite3.connect(path)
+        counts = {
+            table: db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("movies", "showtimes", "users", "bookings")
+        }
+        db.close()
+        seeded = {**counts, "reused": True}
+        movies = counts["movies"]
+    else:
+        seeded = seed(path, args.movies, args.showtimes_per_movie, args.users, args.bookings)
+        movies = args.movies
+    print(f"資料庫：{path} {seeded}", file=sys.stderr)
+
+    movie_app.INSTRUMENTATION = args.instrument
+    # 所有請求都來自同一個使用者與 IP，開著限速只會量到 429
+    movie_app.ADMISSION_CONTROL = False
+    trace_pool_connections()
+    result = {
+        "config": {
+            "database": path,
+            "booking_mode": movie_app.BOOKING_MODE,
+            "instrumentation": movie_app.INSTRUMENTATION,
+            "pool_size": movie_app.DB_POOL_SIZE,
+            "requests": args.requests,
+        },
+        "seed": seeded,
+        "sequential": run_sequential(path, movies, args.requests),
+        "concurrent": run_concurrent(path, movies, args.threads, args.concurrent_requests),
+    }
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for line in regressions:
+            print("退步：" + line, file=sys.stderr)
+        if regressions:
+            raise SystemExit(1)
+        print("與基準相比沒有退步", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=200)
+    parser.add_argument("--showtimes-per-movie", type=int, default=14)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--bookings", type=int, default=200000)
+    parser.add_argument("--db", help="資料庫路徑；已存在時直接沿用，不重新產生")
+    parser.add_argument("--requests", type=int, default=200, help="單執行緒時每個路由的請求數")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--concurrent-requests", type=int, default=25, help="併發時每個執行緒每個路由的請求數")
+    parser.add_argument("--output", help="結果寫到檔案，預設輸出到 stdout")
+    parser.add_argument("--baseline", help="上次的結果 JSON，用來檢查退步")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="p95 容許變慢、併發吞吐量容許下降的比例")
+    parser.add_argument("--instrument", action="store_true", help="開啟請求量測（Server-Timing、/_metrics）")
+    main(parser.parse_args())
@@ -0,0 +1,53 @@
+"""
+場次批次匯入速度：產生大型 CSV 排程檔並以 import-schedule 匯入。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.schedule_import --rows 100000
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+import app as movie_app
+
+WEEKDAYS = ["一", "星期二", "禮拜三", "週四", "五", "星期六", "日"]
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["title", "poster", "weekday", "time", "seats"])
+        per_movie = 7 * 24
+        for i in range(rows):
+            slot = i % per_movie
+            writer.writerow([
+                f"排程電影 {i // per_movie}",
+                "posters/多哥.png",
+                WEEKDAYS[slot % 7],
+                f"{slot // 7:02d}:00",
+                120,
+            ])
+
+
+def main(rows):
+    tmpdir = tempfile.mkdtemp()
+    movie_app.DATABASE = os.path.join(tmpdir, "bench.db")
+    movie_app.init_db()
+    path = os.path.join(tmpdir, "schedule.csv")
+    write_csv(path, rows)
+
+    runner = movie_app.app.test_cli_runner()
+    for attempt in ("首次匯入", "重複匯入（全部略過）"):
+        t0 = time.perf_counter()
+        result = runner.invoke(args=["import-schedule", path])
+        elapsed = time.perf_counter() - t0
+        print(f"{attempt}：{result.output.strip()}（含解析與驗證共 {elapsed:.2f}s，{rows / elapsed:.0f} 列/秒）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+    main(args.rows)
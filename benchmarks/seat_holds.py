@@ -0,0 +1,177 @@
+"""
+首映夜座位保留壓力測試：數千名使用者同時保留座位，一部分在期限內完成訂票，
+其餘放著讓保留過期，由清除執行緒歸還。結束後確認沒有超賣、計數器與座位圖一致。
+
+另外量測在大量未過期保留下，「沒有東西可清」的清除成本（應該只是一次索引查詢）。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.seat_holds --holders 3000 --threads 32
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+import app as movie_app
+import seatmap
+
+
+def setup(path, seats):
+    movie_app.DATABASE = path
+    movie_app.init_db()
+    db = sqlite3.connect(path)
+    cur = db.execute(
+        "INSERT INTO showtimes (movie_id, weekday, time, total_seats) VALUES (1, '週五', '23:59', ?)",
+        (seats,)
+    )
+    db.commit()
+    db.close()
+    return cur.lastrowid
+
+
+def premiere(path, showtime_id, holders, threads, hold_seconds, convert):
+    stats = {"held": 0, "booked": 0, "expired_on_submit": 0, "rejected": 0}
+    sweeps = {"runs": 0, "released": 0, "seconds": 0.0}
+    lock = threading.Lock()
+    queue = list(range(holders))
+    done = threading.Event()
+
+    def count(key):
+        with lock:
+            stats[key] += 1
+
+    def holder_worker(n):
+        db = sqlite3.connect(path, timeout=10)
+        db.row_factory = sqlite3.Row
+        rng = random.Random(n)
+        while True:
+            with lock:
+                if not queue:
+                    break
+                i = queue.pop()
+            name = f"fan{i}"
+            try:
+                held = movie_app.hold_seats(
+                    db, showtime_id, name, rng.randint(1, 4), minutes=hold_seconds / 60
+                )
+            except movie_app.SeatsUnavailable:
+                count("rejected")
+                continue
+            count("held")
+            if rng.random() >= convert:
+                continue    # 放棄，等保留過期
+            # 填資料的時間，偶爾會拖過期限
+            time.sleep(rng.uniform(0, hold_seconds * 1.2))
+            try:
+                movie_app.book_seats(db, showtime_id, name, 0, hold_token=held["token"])
+                count("booked")
+            except movie_app.HoldExpired:
+                count("expired_on_submit")
+        db.close()
+
+    def sweeper():
+        db = sqlite3.connect(path, timeout=10)
+        db.row_factory = sqlite3.Row
+        while not done.is_set():
+            t0 = time.perf_counter()
+            released = movie_app.sweep_expired_holds(db)
+            sweeps["seconds"] += time.perf_counter() - t0
+            sweeps["runs"] += 1
+            sweeps["released"] += released
+            time.sleep(0.05)
+        db.close()
+
+    sweep_thread = threading.Thread(target=sweeper)
+    sweep_thread.start()
+    workers = [threading.Thread(target=holder_worker, args=(n,)) for n in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+
+    # 等最後一批保留過期後收尾
+    time.sleep(hold_seconds)
+    done.set()
+    sweep_thread.join()
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    sweeps["released"] += movie_app.sweep_expired_holds(db)
+    db.close()
+    return stats, sweeps, elapsed
+
+
+def verify(path, showtime_id, seats):
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    st = db.execute("SELECT booked_seats, held_seats FROM showtimes WHERE id = ?", (showtime_id,)).fetchone()
+    sold = db.execute(
+        "SELECT IFNULL(SUM(tickets), 0) FROM bookings WHERE showtime_id = ?", (showtime_id,)
+    ).fetchone()[0]
+    assigned = []
+    for (text,) in db.execute("SELECT seats FROM bookings WHERE showtime_id = ?", (showtime_id,)):
+        assigned.extend(seatmap.parse_seats(text))
+    rows, cols, bits = movie_app.load_seat_map(db, showtime_id)
+    occupied = [i for i in range(seats) if bits >> i & 1]
+    holds_left = db.execute("SELECT COUNT(*) FROM seat_holds").fetchone()[0]
+    db.close()
+
+    assert st["held_seats"] == 0 and holds_left == 0, "過期保留沒有全部歸還"
+    assert st["booked_seats"] == sold <= seats, "已售計數器與訂單不一致或超賣"
+    assert len(assigned) == len(set(assigned)) == sold, "有座位重複配出"
+    assert sorted(assigned) == occupied, "座位圖與訂單不一致"
+    return sold
+
+
+def idle_sweep_cost(path, showtime_id, holds):
+    """大量未過期保留時，清除一次（沒有東西可清）的成本"""
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    far = time.time() + 3600
+    db.executemany(
+        "INSERT INTO seat_holds (token, showtime_id, customer_name, tickets, seats, expires_at) VALUES (?, ?, ?, 1, '0', ?)",
+        ((f"idle{i}", showtime_id, f"idle{i}", far + i) for i in range(holds))
+    )
+    db.commit()
+    runs = 1000
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        movie_app.sweep_expired_holds(db)
+    per_sweep = (time.perf_counter() - t0) / runs
+    db.execute("DELETE FROM seat_holds WHERE token LIKE 'idle%'")
+    db.commit()
+    db.close()
+    return per_sweep
+
+
+def main(seats, holders, threads, hold_seconds, convert, idle_holds):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    showtime_id = setup(path, seats)
+
+    stats, sweeps, elapsed = premiere(path, showtime_id, holders, threads, hold_seconds, convert)
+    sold = verify(path, showtime_id, seats)
+    print(f"首映場 {seats} 席，{holders} 人搶位（{threads} 執行緒），耗時 {elapsed:.2f}s")
+    print(f"保留成功 {stats['held']}，完成訂票 {stats['booked']}，送出時已過期 {stats['expired_on_submit']}，"
+          f"座位不足 {stats['rejected']}")
+    print(f"清除執行緒跑了 {sweeps['runs']} 次，歸還 {sweeps['released']} 筆過期保留，"
+          f"平均每次 {sweeps['seconds'] / max(sweeps['runs'], 1) * 1000:.2f}ms")
+    print(f"已售 {sold} / {seats} 席，無超賣、無重複座位，保留全部歸還")
+
+    per_sweep = idle_sweep_cost(path, showtime_id, idle_holds)
+    print(f"{idle_holds} 筆未過期保留時，清除一次 {per_sweep * 1e6:.1f}µs（只查 expires_at 索引）")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seats", type=int, default=500)
+    parser.add_argument("--holders", type=int, default=3000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--hold-seconds", type=float, default=0.5, help="保留期限（秒），壓測時縮短")
+    parser.add_argument("--convert", type=float, default=0.5, help="保留後完成訂票的比例")
+    parser.add_argument("--idle-holds", type=int, default=100000)
+    args = parser.parse_args()
+    main(args.seats, args.holders, args.threads, args.hold_seconds, args.convert, args.idle_holds)
@@ -0,0 +1,136 @@
+"""
+分片訂單儲存：多個行程（模擬多個 worker）同時對隨機場次訂票，
+比較不分片（app.BOOKING_SHARDS = 0）與不同分片數的寫入吞吐量，並確認沒有超賣。
+
+每個分片數各用一個新的資料庫。--synchronous FULL 讓每次 commit 都 fsync；
+磁碟很快（或有快取）時可以用 --commit-ms 模擬 commit 的延遲：在 COMMIT 開始執行時
+睡這麼久，期間仍持有寫入鎖，就像在等 fsync。分片只能分散寫入鎖的等待，
+CPU 核心數不夠時吞吐量仍受限於 CPU。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.shards --processes 8 --seconds 5 --shards 0 1 2 4 8
+    python -m benchmarks.shards --synchronous FULL
+    python -m benchmarks.shards --commit-ms 5
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import app as movie_app
+import db_pool
+from shards import shard_path
+
+SHOWTIMES = 64
+SEATS = 100000
+
+
+def setup(path):
+    movie_app.DATABASE = path
+    movie_app.init_db()
+    db = sqlite3.connect(path)
+    db.executemany(
+        "INSERT INTO showtimes (movie_id, weekday, time, total_seats) VALUES (1, '週六', ?, ?)",
+        ((f"{n // 60:02d}:{n % 60:02d}", SEATS) for n in range(SHOWTIMES))
+    )
+    db.commit()
+    ids = [r[0] for r in db.execute("SELECT id FROM showtimes WHERE total_seats = ?", (SEATS,))]
+    db.close()
+    return ids
+
+
+def slow_commits(delay):
+    """讓之後開的連線在每次 COMMIT 開始時睡 delay 秒（持有寫入鎖）"""
+    connect = db_pool.ConnectionPool._connect
+
+    def slow_connect(pool):
+        conn = connect(pool)
+        conn.set_trace_callback(lambda sql: time.sleep(delay) if sql == "COMMIT" else None)
+        return conn
+    db_pool.ConnectionPool._connect = slow_connect
+
+
+def worker(path, shards, showtime_ids, seconds, commit_ms, start, results):
+    if commit_ms:
+        slow_commits(commit_ms / 1000)
+    movie_app.DATABASE = path
+    movie_app.BOOKING_SHARDS = shards
+    db = db_pool.ConnectionPool(path, size=1).acquire()
+    rng = random.Random(os.getpid())
+    booked = errors = 0
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            movie_app.book_seats(db, rng.choice(showtime_ids), f"user{os.getpid()}", 1)
+            booked += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put((booked, errors))
+
+
+def verify(path, shards):
+    """回傳 (訂單筆數, 計數器與訂單不一致的場次數)"""
+    paths = [shard_path(path, i) for i in range(shards)] if shards else [path]
+    rows = mismatched = 0
+    for p in paths:
+        db = sqlite3.connect(p)
+        rows += db.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+        mismatched += db.execute("""
+            SELECT COUNT(*) FROM showtimes s
+            WHERE s.booked_seats != (SELECT IFNULL(SUM(tickets), 0) FROM bookings b WHERE b.showtime_id = s.id)
+               OR s.booked_seats > s.total_seats
+        """).fetchone()[0]
+        db.close()
+    return rows, mismatched
+
+
+def run(shards, processes, seconds, commit_ms):
+    path = os.path.join(tempfile.mkdtemp(), "shards.db")
+    showtime_ids = setup(path)
+    ctx = multiprocessing.get_context("fork")
+    start = ctx.Event()
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(path, shards, showtime_ids, seconds, commit_ms, start, results))
+        for _ in range(processes)
+    ]
+    for p in procs:
+        p.start()
+    time.sleep(0.5)     # 等所有行程都連好資料庫
+    start.set()
+    totals = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    booked = sum(t[0] for t in totals)
+    errors = sum(t[1] for t in totals)
+    rows, mismatched = verify(path, shards)
+    assert rows == booked and not mismatched, "訂單數或座位計數器不一致"
+    return {"booked": booked, "errors": errors, "per_sec": booked / seconds}
+
+
+def main(shard_counts, processes, seconds, synchronous, commit_ms):
+    db_pool.PRAGMAS["synchronous"] = synchronous
+    print(f"{processes} 個行程對 {SHOWTIMES} 個場次訂票，每種設定跑 {seconds} 秒，"
+          f"synchronous={synchronous}，commit 延遲 {commit_ms}ms，{os.cpu_count()} 個 CPU")
+    baseline = None
+    for shards in shard_counts:
+        r = run(shards, processes, seconds, commit_ms)
+        baseline = baseline or r["per_sec"]
+        label = f"{shards} 個分片" if shards else "不分片"
+        print(f"{label:>6}：{r['booked']} 筆訂單，{r['per_sec']:.0f} 筆/秒"
+              f"（{r['per_sec'] / baseline:.2f}x），忙碌錯誤 {r['errors']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--shards", type=int, nargs="+", default=[0, 1, 2, 4, 8])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--synchronous", default="NORMAL", choices=["OFF", "NORMAL", "FULL"])
+    parser.add_argument("--commit-ms", type=float, default=0)
+    args = parser.parse_args()
+    main(args.shards, args.processes, args.seconds, args.synchronous, args.commit_ms)
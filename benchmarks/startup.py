@@ -0,0 +1,122 @@
+"""
+啟動速度：每種模式各開一個新的 Python 行程跑 app（werkzeug 伺服器，不開 debug / reloader），
+從開行程算起量到 port 可以連線、第一個 GET / 完成為止，再量第二個 GET / 當作熱身後的對照。
+
+模式：
+    full      init_db() 每次都檢查 migration 與預設資料（原本的行為）
+    fast      app.FAST_STARTUP = True，schema 已是最新版本時直接略過
+    prewarm   fast 再加上 app.PREWARM = True，背景編譯模板、填首頁快取
+
+資料庫沿用 benchmarks.routes 的合成資料（--db 已存在時直接沿用），
+--settle-ms 模擬負載平衡器在 port 開啟後多久才送來第一個請求。
+
+執行方式（在專案根目錄）：
+    python -m benchmarks.startup --movies 200 --runs 5
+    python -m benchmarks.startup --db /tmp/big.db --settle-ms 100
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks.routes import seed
+
+MODES = {
+    "full": {"FAST_STARTUP": False, "PREWARM": False},
+    "fast": {"FAST_STARTUP": True, "PREWARM": False},
+    "prewarm": {"FAST_STARTUP": True, "PREWARM": True},
+}
+
+CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.DATABASE = {db!r}
+for name, value in {settings!r}.items():
+    setattr(app, name, value)
+app.startup()
+ready = time.perf_counter()
+print(json.dumps({{"import": imported - t0, "startup": ready - imported}}), flush=True)
+app.app.run(port={port}, threaded=True, debug=False, use_reloader=False)
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.002)
+    raise RuntimeError(f"port {port} 沒有開啟")
+
+
+def get(url):
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(url) as resp:
+        resp.read()
+        assert resp.status == 200
+    return time.perf_counter() - t0
+
+
+def run_once(db_path, settings, settle_ms):
+    port = free_port()
+    code = CHILD.format(db=db_path, settings=settings, port=port)
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    try:
+        phases = json.loads(proc.stdout.readline())
+        wait_for_port(port)
+        listening = time.perf_counter() - t0
+        time.sleep(settle_ms / 1000)
+        url = f"http://127.0.0.1:{port}/"
+        first = get(url)
+        first_done = time.perf_counter() - t0
+        second = get(url)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {**phases, "listening": listening, "first": first, "first_done": first_done, "second": second}
+
+
+def main(db_path, movies, runs, settle_ms):
+    if not os.path.exists(db_path):
+        print(seed(db_path, movies, 14, 10000, 100000))
+    # 先完整初始化一次，之後各模式看到的都是已是最新版本的資料庫
+    run_once(db_path, MODES["full"], 0)
+
+    print(f"每種模式跑 {runs} 次取中位數，port 開啟後等 {settle_ms}ms 才送第一個請求")
+    for mode, settings in MODES.items():
+        samples = [run_once(db_path, settings, settle_ms) for _ in range(runs)]
+        m = {k: statistics.median(s[k] for s in samples) * 1000 for k in samples[0]}
+        print(f"{mode:>8}：import {m['import']:.0f}ms，初始化 {m['startup']:.1f}ms，"
+              f"開始 listen {m['listening']:.0f}ms，第一個請求 {m['first']:.1f}ms"
+              f"（開行程起 {m['first_done']:.0f}ms 完成），第二個請求 {m['second']:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", help="資料庫路徑；已存在時直接沿用")
+    parser.add_argument("--movies", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--settle-ms", type=float, default=0)
+    args = parser.parse_args()
+    main(args.db or os.path.join(tempfile.mkdtemp(), "startup.db"), args.movies, args.runs, args.settle_ms)
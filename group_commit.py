@@ -0,0 +1,181 @@
+"""
+Group commit：所有寫入交給單一寫入執行緒，排隊中的請求一次處理、一次 commit。
+
+請求端呼叫 submit() 拿到 Future 等結果；寫入端每輪把佇列裡已經在等的請求全部取出
+（最多 max_batch 筆），在同一個交易內交給 apply_batch 處理，commit 成功後才回覆各個 Future。
+每筆請求的成敗由 apply_batch 決定（回傳值或例外物件），不會影響同一批的其他請求；
+交易本身失敗時整批都回覆同一個例外。
+
+請求端等太久可以 future.cancel()：還沒被寫入端取走的請求會被略過，不會在回覆逾時之後才寫進資料庫；
+已經在交易中的請求無法取消，cancel() 回傳 False，結果很快就會回覆。
+寫入執行緒本身出錯結束時（例如連不上資料庫），排隊中的與之後送來的請求都回覆同一個例外，
+alive 變成 False，由呼叫端換一個新的 writer。
+"""
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from db_pool import PRAGMAS
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    def __init__(self, database, apply_batch, on_commit=None, max_batch=256, max_wait=0.0,
+                 busy_retries=5, busy_backoff=0.02):
+        self.database = database
+        self.apply_batch = apply_batch      # (db, items) -> [結果或例外]，在交易內執行
+        self.on_commit = on_commit          # (db, items, results)，commit 後執行
+        self.max_batch = max_batch
+        self.max_wait = max_wait            # 秒，取到第一筆後再等多久湊批；0 代表只取已經在排隊的
+        self.busy_retries = busy_retries
+        self.busy_backoff = busy_backoff
+        self.pid = os.getpid()
+        self._queue = queue.Queue()
+        self._submit_lock = threading.Lock()
+        self._error = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"batches": 0, "items": 0, "max_batch": 0, "commit_time": 0.0, "failed_batches": 0}
+        self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def alive(self):
+        return self._error is None and self._thread.is_alive()
+
+    def submit(self, item):
+        future = Future()
+        with self._submit_lock:
+            if self._error is not None:
+                raise self._error
+            self._queue.put((item, future))
+        return future
+
+    def _fail(self, error):
+        """寫入執行緒結束前：之後的 submit() 直接拋出 error，已排隊的請求都回覆 error"""
+        with self._submit_lock:
+            self._error = error
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if entry is not _STOP and entry[1].set_running_or_notify_cancel():
+                entry[1].set_exception(error)
+
+    def close(self, timeout=None):
+        with self._submit_lock:
+            if self._error is None:
+                self._error = RuntimeError("寫入執行緒已關閉")
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _connect(self):
+        # 交易由寫入端自己控制，關掉 sqlite3 的隱含 BEGIN
+        db = sqlite3.connect(self.database, isolation_level=None, check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        for name, value in PRAGMAS.items():
+            db.execute(f"PRAGMA {name}={value}")
+        return db
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                wait = deadline - time.monotonic()
+                entry = self._queue.get(timeout=wait) if wait > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                self._queue.put(_STOP)      # 先把這批做完，下一輪再結束
+                break
+            batch.append(entry)
+        return batch
+
+    def _commit_batch(self, db, items):
+        for attempt in range(self.busy_retries):
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    results = self.apply_batch(db, items)
+                    db.execute("COMMIT")
+                except BaseException:
+                    if db.in_transaction:
+                        db.execute("ROLLBACK")
+                    raise
+                return results
+            except sqlite3.OperationalError as e:
+                # 其他行程正在寫入
+                if "locked" not in str(e) and "busy" not in str(e) or attempt == self.busy_retries - 1:
+                    raise
+                time.sleep(self.busy_backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def _run(self):
+        try:
+            db = self._connect()
+        except BaseException as e:
+            self._fail(e)
+            raise
+        batch = []
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                # 請求端已經放棄（逾時取消）的不寫入；其餘標成執行中，之後就不能再取消
+                batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+                if not batch:
+                    continue
+                self._process(db, batch)
+        except BaseException as e:
+            for _, future in batch or ():
+                if not future.done():
+                    future.set_exception(e)
+            self._fail(e)
+            raise
+        finally:
+            db.close()
+
+    def _process(self, db, batch):
+        items = [item for item, _ in batch]
+        start = time.perf_counter()
+        try:
+            results = self._commit_batch(db, items)
+        except Exception as e:
+            with self._stats_lock:
+                self._stats["failed_batches"] += 1
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - start
+
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["items"] += len(batch)
+            self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+            self._stats["commit_time"] += elapsed
+        if self.on_commit:
+            try:
+                self.on_commit(db, items, results)
+            except Exception:
+                pass    # 通知失敗不影響已經 commit 的結果
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["pending"] = self._queue.qsize()
+        stats["avg_batch"] = stats["items"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
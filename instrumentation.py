@@ -0,0 +1,219 @@
+"""
+請求層級的效能量測：把每個請求的時間拆成 DB、模板渲染與其餘的 Python 時間，
+記錄慢查詢，並以 Prometheus 文字格式輸出各路由的直方圖。
+
+TimedConnection 包住 sqlite3 連線，計算每個 SQL 的次數與時間（含 fetch），
+其他屬性原樣轉給底層連線，呼叫端不需要知道有沒有被包起來。
+"""
+import threading
+import time
+from collections import defaultdict
+
+# 秒；與 Prometheus client 預設值相同
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+class RequestTimer:
+    """單一請求的累計時間"""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = 0
+        self.template_time = 0.0
+        self._template_depth = 0
+        self._template_start = 0.0
+        self.slow_queries = []      # [(秒, SQL)]
+
+    def record_query(self, sql, seconds, slow_threshold):
+        self.queries += 1
+        self.db_time += seconds
+        if seconds >= slow_threshold:
+            self.slow_queries.append((seconds, sql))
+
+    def template_started(self):
+        # 模板裡再渲染模板時只算最外層，避免重複計入
+        if self._template_depth == 0:
+            self._template_start = time.perf_counter()
+        self._template_depth += 1
+
+    def template_finished(self):
+        self._template_depth -= 1
+        if self._template_depth == 0:
+            self.template_time += time.perf_counter() - self._template_start
+
+    def finish(self):
+        """回傳 (總時間, DB, 模板, Python)"""
+        total = time.perf_counter() - self.start
+        return total, self.db_time, self.template_time, max(total - self.db_time - self.template_time, 0.0)
+
+
+class TimedCursor:
+    def __init__(self, cursor, sql, timer, slow_threshold, elapsed):
+        self._cursor = cursor
+        self._sql = sql
+        self._timer = timer
+        self._slow_threshold = slow_threshold
+        self._elapsed = elapsed
+        self._recorded = False
+
+    def _time(self, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._elapsed += time.perf_counter() - t0
+
+    def _record(self):
+        if not self._recorded:
+            self._recorded = True
+            self._timer.record_query(self._sql, self._elapsed, self._slow_threshold)
+
+    def fetchone(self):
+        row = self._time(self._cursor.fetchone)
+        if row is None:
+            self._record()
+        return row
+
+    def fetchall(self):
+        rows = self._time(self._cursor.fetchall)
+        self._record()
+        return rows
+
+    def fetchmany(self, size=None):
+        rows = self._time(self._cursor.fetchmany, size or self._cursor.arraysize)
+        if not rows:
+            self._record()
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self._time(self._cursor.fetchone)
+            if row is None:
+                self._record()
+                return
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __del__(self):
+        # 只取第一列、沒讀完的查詢在這裡記錄
+        try:
+            self._record()
+        except Exception:
+            pass
+
+
+class TimedConnection:
+    def __init__(self, conn, timer, slow_threshold):
+        self.raw = conn
+        self._timer = timer
+        self._slow_threshold = slow_threshold
+
+    def execute(self, sql, params=()):
+        t0 = time.perf_counter()
+        cursor = self.raw.execute(sql, params)
+        elapsed = time.perf_counter() - t0
+        if cursor.description is None:
+            # 沒有結果列（BEGIN、一般的 INSERT / UPDATE），執行完就結束了
+            self._timer.record_query(sql, elapsed, self._slow_threshold)
+            return cursor
+        return TimedCursor(cursor, sql, self._timer, self._slow_threshold, elapsed)
+
+    def executemany(self, sql, seq):
+        t0 = time.perf_counter()
+        cursor = self.raw.executemany(sql, seq)
+        self._timer.record_query(sql, time.perf_counter() - t0, self._slow_threshold)
+        return cursor
+
+    def commit(self):
+        t0 = time.perf_counter()
+        self.raw.commit()
+        self._timer.record_query("COMMIT", time.perf_counter() - t0, self._slow_threshold)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class Metrics:
+    """各路由的直方圖與計數器"""
+    HISTOGRAMS = {
+        "http_request_duration_seconds": "請求總時間",
+        "http_request_db_seconds": "請求中 SQLite 的時間",
+        "http_request_template_seconds": "請求中模板渲染的時間",
+        "http_request_python_seconds": "請求中其餘 Python 的時間",
+    }
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = defaultdict(lambda: Histogram(self.buckets))    # (名稱, 路由, 方法)
+        self._queries = defaultdict(int)
+        self._slow_queries = defaultdict(int)
+        self._statuses = defaultdict(int)   # (路由, 方法, 狀態碼)
+
+    def observe(self, route, method, status, timer):
+        total, db, template, python = timer.finish()
+        with self._lock:
+            for name, value in zip(self.HISTOGRAMS, (total, db, template, python)):
+                self._histograms[(name, route, method)].observe(value)
+            self._queries[(route, method)] += timer.queries
+            self._slow_queries[(route, method)] += len(timer.slow_queries)
+            self._statuses[(route, method, status)] += 1
+        return total, db, template, python
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, help_text in self.HISTOGRAMS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (hname, route, method), histogram in sorted(self._histograms.items()):
+                    if hname == name:
+                        lines.extend(histogram.lines(name, f'route="{route}",method="{method}"'))
+            lines.append("# HELP http_requests_total 請求數")
+            lines.append("# TYPE http_requests_total counter")
+            for (route, method, status), count in sorted(self._statuses.items()):
+                lines.append(f'http_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+            for name, counter, help_text in (
+                ("db_queries_total", self._queries, "SQL 語句數"),
+                ("db_slow_queries_total", self._slow_queries, "超過門檻的慢查詢數"),
+            ):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for (route, method), count in sorted(counter.items()):
+                    lines.append(f'{name}{{route="{route}",method="{method}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._queries.clear()
+            self._slow_queries.clear()
+            self._statuses.clear()
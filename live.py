@@ -0,0 +1,104 @@
+"""
+行程內的剩餘座位廣播：一次寫入只記一筆到共用的環狀紀錄，所有 SSE 連線各自從紀錄讀取。
+
+發布的成本與訂閱人數無關（append 一筆再 notify_all），訂閱者靠序號知道自己讀到哪裡。
+讀太慢、落後超過紀錄長度的訂閱者不會拖住別人，也不會讓記憶體無限增加：
+它下次醒來時拿到 None，改送一份完整快照重新同步。
+不用執行緒等待的訂閱者（asyncio）用 add_listener() 登記回呼，每次發布後呼叫一次。
+"""
+import threading
+from collections import deque
+
+
+class TooManySubscribers(Exception):
+    """訂閱人數已達上限"""
+
+
+class Broadcaster:
+    def __init__(self, backlog=1024, max_subscribers=0):
+        self.backlog = backlog
+        self.max_subscribers = max_subscribers     # 0 代表不限
+        self._cond = threading.Condition()
+        self._log = deque(maxlen=backlog)           # [(seq, {showtime_id: remaining})]
+        self._seq = 0
+        self._latest = {}                           # 每個場次最後一次發布的值
+        self._listeners = []
+        self.subscribers = 0
+        self.peak_subscribers = 0
+        self.published = 0
+        self.resyncs = 0
+        self.rejected = 0
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def publish(self, updates):
+        """發布 {showtime_id: 剩餘座位}；與上次相同的值會被略過，回傳實際發布的筆數"""
+        with self._cond:
+            changed = {k: v for k, v in updates.items() if self._latest.get(k) != v}
+            if not changed:
+                return 0
+            self._latest.update(changed)
+            self._seq += 1
+            self._log.append((self._seq, changed))
+            self.published += 1
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback()
+        return len(changed)
+
+    def wait(self, after, timeout):
+        """等到有比 after 新的發布或逾時，回傳 (新序號, 合併後的更新)
+
+        沒有新資料時回傳 (after, {})；落後太多、紀錄已被覆蓋時回傳 (新序號, None)，
+        呼叫端應改送完整快照。
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after, timeout)
+            if self._seq == after:
+                return after, {}
+            if not self._log or self._log[0][0] > after + 1:
+                self.resyncs += 1
+                return self._seq, None
+            merged = {}
+            # 從尾端往回找，只合併 after 之後的紀錄
+            start = len(self._log) - (self._seq - after)
+            for i in range(start, len(self._log)):
+                merged.update(self._log[i][1])
+            return self._seq, merged
+
+    def add_listener(self, callback):
+        """發布後呼叫 callback()（在發布者的執行緒上，不持有鎖）"""
+        with self._cond:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            self._listeners.remove(callback)
+
+    def subscribe(self):
+        with self._cond:
+            if self.max_subscribers and self.subscribers >= self.max_subscribers:
+                self.rejected += 1
+                raise TooManySubscribers()
+            self.subscribers += 1
+            self.peak_subscribers = max(self.peak_subscribers, self.subscribers)
+            return self._seq
+
+    def unsubscribe(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                "subscribers": self.subscribers,
+                "peak_subscribers": self.peak_subscribers,
+                "max_subscribers": self.max_subscribers,
+                "published": self.published,
+                "resyncs": self.resyncs,
+                "rejected": self.rejected,
+                "seq": self._seq,
+            }
@@ -0,0 +1,273 @@
+"""
+資料庫結構版本管理：依序套用編號遞增的 migration，已套用的版本記錄在 schema_version。
+
+新增 migration 時只要在檔尾加上新的 @migration(版本號, 說明) 函式，
+不要修改已經發佈過的 migration。
+"""
+import sqlite3
+
+from weekdays import normalize_weekday, showtime_slot
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return decorator
+
+
+def _has_column(db, table, column):
+    return any(c[1] == column for c in db.execute(f"PRAGMA table_info({table})").fetchall())
+
+
+def current_version(db):
+    row = db.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def latest_version():
+    return max(v for v, _, _ in MIGRATIONS)
+
+
+def is_current(db):
+    """schema 已是最新版本時回傳 True；還沒建立過 schema_version 的資料庫回傳 False"""
+    try:
+        return current_version(db) >= latest_version()
+    except sqlite3.OperationalError:
+        return False
+
+
+def migrate(db):
+    """套用所有尚未套用的 migration，回傳本次套用的版本號；重複執行不會有副作用"""
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    db.commit()
+
+    applied = []
+    if current_version(db) >= latest_version():
+        return applied
+
+    for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        # 每個 migration 一個交易；多個 worker 同時啟動時只有一個會真的執行
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if current_version(db) >= version:
+                db.rollback()
+                continue
+            fn(db)
+            db.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+# -------------------------
+# Migrations
+# -------------------------
+@migration(1, "初始資料表")
+def _initial_tables(db):
+    # 員工表
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS employees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        )
+    """)
+
+    # 電影表
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS movies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            poster_url TEXT,
+            total_seats INTEGER DEFAULT 100
+        )
+    """)
+
+    # 場次表
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS showtimes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            movie_id INTEGER NOT NULL,
+            weekday TEXT NOT NULL,
+            time TEXT NOT NULL,
+            total_seats INTEGER DEFAULT 100,
+            FOREIGN KEY (movie_id) REFERENCES movies(id)
+        )
+    """)
+
+    # 訂票表
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_no TEXT UNIQUE,
+            showtime_id INTEGER NOT NULL,
+            customer_name TEXT NOT NULL,
+            tickets INTEGER NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (showtime_id) REFERENCES showtimes(id)
+        )
+    """)
+
+    # 使用者表
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            password TEXT,
+            full_name TEXT,
+            phone TEXT
+        )
+    """)
+
+
+@migration(2, "showtimes.booked_seats 已售座位計數器")
+def _booked_seats_counter(db):
+    if not _has_column(db, "showtimes", "booked_seats"):
+        db.execute("ALTER TABLE showtimes ADD COLUMN booked_seats INTEGER NOT NULL DEFAULT 0")
+    db.execute("""
+        UPDATE showtimes SET booked_seats = (
+            SELECT IFNULL(SUM(b.tickets), 0) FROM bookings b WHERE b.showtime_id = showtimes.id
+        )
+    """)
+
+
+@migration(3, "查詢用索引")
+def _hot_query_indexes(db):
+    db.execute("CREATE INDEX IF NOT EXISTS idx_showtimes_movie_id ON showtimes (movie_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_bookings_showtime_id ON bookings (showtime_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_bookings_customer_name ON bookings (customer_name)")
+
+
+@migration(4, "訂單編號號段")
+def _order_no_sequence(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS order_no_sequence (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            next_value INTEGER NOT NULL
+        )
+    """)
+    db.execute("INSERT OR IGNORE INTO order_no_sequence (id, next_value) VALUES (1, 0)")
+
+
+@migration(5, "座位圖")
+def _seat_maps(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS seat_maps (
+            showtime_id INTEGER PRIMARY KEY,
+            rows INTEGER NOT NULL,
+            cols INTEGER NOT NULL,
+            bitmap BLOB NOT NULL,
+            FOREIGN KEY (showtime_id) REFERENCES showtimes(id)
+        )
+    """)
+    # 逗號分隔的座位編號；舊訂單為 NULL
+    if not _has_column(db, "bookings", "seats"):
+        db.execute("ALTER TABLE bookings ADD COLUMN seats TEXT")
+
+
+@migration(6, "座位保留")
+def _seat_holds(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS seat_holds (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token TEXT UNIQUE NOT NULL,
+            showtime_id INTEGER NOT NULL,
+            customer_name TEXT NOT NULL,
+            tickets INTEGER NOT NULL,
+            seats TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            FOREIGN KEY (showtime_id) REFERENCES showtimes(id)
+        )
+    """)
+    # 清除過期保留時只掃 expires_at 已到期的那一段
+    db.execute("CREATE INDEX IF NOT EXISTS idx_seat_holds_expires_at ON seat_holds (expires_at)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_seat_holds_showtime_customer ON seat_holds (showtime_id, customer_name)")
+    if not _has_column(db, "showtimes", "held_seats"):
+        db.execute("ALTER TABLE showtimes ADD COLUMN held_seats INTEGER NOT NULL DEFAULT 0")
+
+
+@migration(7, "銷售統計彙總表")
+def _sales_rollups(db):
+    # 由 analytics.record_sales() 在訂票、退票的交易內增量更新
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS sales_by_showtime (
+            showtime_id INTEGER PRIMARY KEY,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            tickets INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS sales_by_movie (
+            movie_id INTEGER PRIMARY KEY,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            tickets INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    # day 為 bookings.created_at 的日期（UTC，YYYY-MM-DD）
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS sales_by_day (
+            day TEXT PRIMARY KEY,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            tickets INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    # 既有訂單先彙總一次；之後要重建請用 flask rebuild-analytics
+    db.execute("""
+        INSERT OR REPLACE INTO sales_by_showtime (showtime_id, bookings, tickets)
+        SELECT showtime_id, COUNT(*), SUM(tickets) FROM bookings GROUP BY showtime_id
+    """)
+    db.execute("""
+        INSERT OR REPLACE INTO sales_by_movie (movie_id, bookings, tickets)
+        SELECT s.movie_id, COUNT(*), SUM(b.tickets)
+        FROM bookings b JOIN showtimes s ON s.id = b.showtime_id
+        GROUP BY s.movie_id
+    """)
+    db.execute("""
+        INSERT OR REPLACE INTO sales_by_day (day, bookings, tickets)
+        SELECT substr(created_at, 1, 10), COUNT(*), SUM(tickets) FROM bookings
+        WHERE created_at IS NOT NULL
+        GROUP BY substr(created_at, 1, 10)
+    """)
+
+
+@migration(8, "訂單匯出用索引")
+def _bookings_created_at_index(db):
+    # 匯出依訂票時間排序與篩選，走索引就不必把整張 bookings 拿去排序
+    db.execute("CREATE INDEX IF NOT EXISTS idx_bookings_created_at ON bookings (created_at)")
+
+
+@migration(9, "場次星期代碼與排序欄位")
+def _showtime_slots(db):
+    # 寫入時算好，訂票頁直接 ORDER BY slot（見 weekdays.showtime_slot）
+    for column in ("weekday_code", "slot"):
+        if not _has_column(db, "showtimes", column):
+            db.execute(f"ALTER TABLE showtimes ADD COLUMN {column} INTEGER")
+    updates = []
+    for showtime_id, weekday, time_val in db.execute("SELECT id, weekday, time FROM showtimes").fetchall():
+        weekday = normalize_weekday(weekday)
+        updates.append((weekday, *showtime_slot(weekday, time_val), showtime_id))
+    db.executemany("UPDATE showtimes SET weekday = ?, weekday_code = ?, slot = ? WHERE id = ?", updates)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_showtimes_movie_slot ON showtimes (movie_id, slot)")
+
+
+@migration(10, "訂單編號打散金鑰")
+def _order_no_key(db):
+    # 每個資料庫各自隨機產生，不放在程式碼裡；見 order_numbers.scramble
+    if not _has_column(db, "order_no_sequence", "scramble_key"):
+        db.execute("ALTER TABLE order_no_sequence ADD COLUMN scramble_key BLOB")
+    db.execute("UPDATE order_no_sequence SET scramble_key = randomblob(32) WHERE scramble_key IS NULL")
@@ -0,0 +1,89 @@
+"""
+訂單編號產生器：ORD-YYYYMMDD-XXXXXX。
+
+每個行程一次向資料庫預留一整段序號（order_no_sequence 表），之後在記憶體內發號，
+平均每 BLOCK_SIZE 筆訂單才需要一次資料庫往返，且不同行程拿到的號段不會重疊。
+序號經過以金鑰決定的一對一置換再轉成 36 進位：金鑰是每個資料庫各自隨機產生的
+（order_no_sequence.scramble_key），不知道金鑰就無法從一張訂單編號推出其他訂單編號，
+未登入的訂單查詢不能靠列舉號碼撈出別人的訂單。
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+BLOCK_SIZE = 1000
+SUFFIX_WIDTH = 6        # 36^6 ≈ 21 億號之後自動變長
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+FEISTEL_ROUNDS = 4
+
+
+def to_base36(n, width=SUFFIX_WIDTH):
+    chars = []
+    while n:
+        n, r = divmod(n, 36)
+        chars.append(DIGITS[r])
+    return "".join(reversed(chars)).rjust(width, "0")
+
+
+def _round(key, width, i, half, modulus):
+    digest = hashlib.blake2b(f"{width}:{i}:{half}".encode(), key=key, digest_size=8).digest()
+    return int.from_bytes(digest, "big") % modulus
+
+
+def scramble(seq, key):
+    """以金鑰把序號一對一地映射到同長度的號碼空間，回傳 (號碼, 位數)
+
+    36^n 剛好是 6^n × 6^n，拆成左右兩半做平衡 Feistel 置換（每輪以帶金鑰的 BLAKE2b 當輪函數），
+    結果一定落在同一個空間內，不需要 cycle-walking。
+    """
+    width = SUFFIX_WIDTH
+    while seq >= 36 ** width:
+        width += 1
+    half = 6 ** width
+    left, right = divmod(seq, half)
+    for i in range(FEISTEL_ROUNDS):
+        left, right = right, (left + _round(key, width, i, right, half)) % half
+    return left * half + right, width
+
+
+def format_order_no(seq, key, now=None):
+    date_str = (now or datetime.now()).strftime("%Y%m%d")
+    return f"ORD-{date_str}-{to_base36(*scramble(seq, key))}"
+
+
+class OrderNumberGenerator:
+    def __init__(self, database, block_size=BLOCK_SIZE):
+        self.database = database
+        self.block_size = block_size
+        self.pid = os.getpid()
+        self.blocks_allocated = 0
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._key = None
+
+    def _allocate_block(self):
+        # 用獨立連線預留號段並立即 commit，不受訂票交易回滾影響
+        db = sqlite3.connect(self.database, timeout=10)
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            end, self._key = db.execute(
+                "UPDATE order_no_sequence SET next_value = next_value + ? WHERE id = 1 RETURNING next_value, scramble_key",
+                (self.block_size,)
+            ).fetchone()
+            db.commit()
+        finally:
+            db.close()
+        self._next, self._end = end - self.block_size, end
+        self.blocks_allocated += 1
+
+    def next(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._allocate_block()
+            seq = self._next
+            self._next += 1
+            key = self._key
+        return format_order_no(seq, key)
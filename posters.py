@@ -0,0 +1,103 @@
+"""
+海報縮圖：把 static/posters/ 下的原圖轉成多種寬度的 WebP 與 JPEG 縮圖。
+
+檔名帶原圖內容的雜湊（多哥-1a2b3c4d5e-320.webp），原圖一換檔名就跟著變，
+所以縮圖可以用很長的快取時間。產生結果記錄在 variants/manifest.json，
+模板依此輸出 srcset；沒有縮圖的海報照舊使用原圖。
+"""
+import hashlib
+import json
+import os
+import threading
+
+WIDTHS = (160, 320, 480)
+FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 6},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+VARIANT_DIR = "posters/variants"    # 相對於 static 目錄
+MANIFEST = "manifest.json"
+
+_manifest_lock = threading.Lock()
+_manifest_cache = {"mtime": None, "data": {}}
+
+
+def _variant_root(static_folder):
+    return os.path.join(static_folder, VARIANT_DIR)
+
+
+def load_manifest(static_folder):
+    """讀取 manifest（依修改時間快取）：{poster_url: {"webp": [[檔名, 寬]], "jpeg": [...], "width": 原圖寬}}"""
+    path = os.path.join(_variant_root(static_folder), MANIFEST)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    if _manifest_cache["mtime"] != mtime:
+        with open(path, encoding="utf-8") as f:
+            _manifest_cache["data"] = json.load(f)
+        _manifest_cache["mtime"] = mtime
+    return _manifest_cache["data"]
+
+
+def _save_manifest(static_folder, manifest):
+    path = os.path.join(_variant_root(static_folder), MANIFEST)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def build_variants(static_folder, poster_url):
+    """為單張海報產生縮圖並寫入 manifest；原圖不存在時回傳 None"""
+    source = os.path.join(static_folder, poster_url)
+    if not poster_url or not os.path.isfile(source):
+        return None
+
+    with open(source, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:10]
+    stem = os.path.splitext(os.path.basename(poster_url))[0]
+    root = _variant_root(static_folder)
+    os.makedirs(root, exist_ok=True)
+
+    # Pillow 只有產生縮圖時才用到，不在啟動時載入
+    from PIL import Image
+
+    with Image.open(source) as img:
+        img.load()
+        # 透明背景鋪黑，JPEG 不支援 alpha
+        if img.mode in ("RGBA", "LA", "P"):
+            background = Image.new("RGB", img.size, (0, 0, 0))
+            background.paste(img.convert("RGBA"), mask=img.convert("RGBA").getchannel("A"))
+            img = background
+        else:
+            img = img.convert("RGB")
+
+        # 不放大：比原圖寬的尺寸一律用原圖寬
+        widths = sorted({min(w, img.width) for w in WIDTHS})
+        entry = {"width": img.width}
+        for ext, options in FORMATS.items():
+            entry[ext] = []
+            for width in widths:
+                name = f"{stem}-{digest}-{width}.{ext}"
+                path = os.path.join(root, name)
+                if not os.path.exists(path):
+                    height = round(img.height * width / img.width)
+                    resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+                    tmp = f"{path}.{os.getpid()}.tmp"
+                    resized.save(tmp, **options)
+                    os.replace(tmp, path)
+                entry[ext].append([name, width])
+
+    with _manifest_lock:
+        manifest = dict(load_manifest(static_folder))
+        manifest[poster_url] = entry
+        _save_manifest(static_folder, manifest)
+    return entry
+
+
+def poster_sources(static_folder, poster_url):
+    """回傳該海報的縮圖資訊，尚未產生縮圖時回傳 None"""
+    if not poster_url:
+        return None
+    return load_manifest(static_folder).get(poster_url)
@@ -0,0 +1,143 @@
+"""
+場次排程批次匯入：一次匯入一整週（或更多）的場次。
+
+支援 CSV（標題列：title,poster,weekday,time,seats）與 JSON（同欄位的物件陣列）。
+整份檔案先全部驗證，有任何錯誤就整份拒絕；驗證通過後在同一個交易內寫入，
+已存在的場次（同電影、同星期、同時間，依 showtimes.slot 比對）會被略過。
+"""
+import csv
+import io
+import json
+import re
+import time
+
+from weekdays import WEEKDAY_ORDER, normalize_time, normalize_weekday, showtime_slot
+
+DEFAULT_SEATS = 250     # 與 manage_movies() 的預設值相同
+MAX_ERRORS = 50         # 最多回報幾筆錯誤
+TIME_RE = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+
+class ScheduleError(Exception):
+    """排程檔內容有誤，errors 為 [(列號, 訊息)]"""
+    def __init__(self, errors):
+        super().__init__(f"排程檔有 {len(errors)} 筆錯誤")
+        self.errors = errors
+
+
+def parse_schedule(stream, fmt):
+    """把 CSV / JSON 檔案內容（bytes 串流）轉成 dict 列表"""
+    if fmt == "json":
+        try:
+            rows = json.load(stream)
+        except ValueError as e:
+            raise ScheduleError([(0, f"JSON 格式錯誤：{e}")])
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise ScheduleError([(0, "JSON 需為物件陣列")])
+        return rows
+    if fmt == "csv":
+        return list(csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")))
+    raise ScheduleError([(0, f"不支援的格式：{fmt}")])
+
+
+def format_from_filename(filename):
+    return filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+
+
+def validate_schedule(rows):
+    """驗證並正規化每一列，回傳 [(title, poster_url, weekday, time, seats)]"""
+    cleaned = []
+    errors = []
+    for line, row in enumerate(rows, start=1):
+        title = str(row.get("title") or "").strip()
+        poster = str(row.get("poster") or "").strip()
+        weekday = normalize_weekday(str(row.get("weekday") or ""))
+        time_val = str(row.get("time") or "").strip()
+        seats = row.get("seats")
+        seats = "" if seats is None else str(seats).strip()     # JSON 的 0 要報錯，不是當成沒填
+
+        if not title:
+            errors.append((line, "缺少電影名稱"))
+        if weekday not in WEEKDAY_ORDER:
+            errors.append((line, f"無法辨識的星期：{row.get('weekday')}"))
+        match = TIME_RE.match(time_val)
+        if not match:
+            errors.append((line, f"時間格式錯誤：{time_val}"))
+        else:
+            time_val = normalize_time(time_val)
+        if not seats:
+            seats = DEFAULT_SEATS
+        elif not seats.isdigit() or int(seats) <= 0:
+            errors.append((line, f"座位數錯誤：{seats}"))
+        else:
+            seats = int(seats)
+
+        if len(errors) >= MAX_ERRORS:
+            break
+        # 海報路徑處理與 manage_movies() 相同
+        poster = poster.split("/")[-1]
+        cleaned.append((title, f"posters/{poster}" if poster else None, weekday, time_val, seats))
+
+    if errors:
+        raise ScheduleError(errors)
+    return cleaned
+
+
+def import_schedule(db, rows):
+    """在單一交易內寫入已驗證的排程，回傳統計"""
+    start = time.perf_counter()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        # ---- 電影：不存在的新增，有給海報的更新 ----
+        movie_ids = {}
+        for r in db.execute("SELECT id, title FROM movies ORDER BY id"):
+            movie_ids.setdefault(r[1], r[0])
+
+        new_movies = {}
+        posters = {}
+        for title, poster_url, _, _, seats in rows:
+            if title not in movie_ids and title not in new_movies:
+                new_movies[title] = (title, poster_url, seats)
+            if poster_url:
+                posters[title] = poster_url
+        db.executemany(
+            "INSERT INTO movies (title, poster_url, total_seats) VALUES (?, ?, ?)",
+            new_movies.values()
+        )
+        if new_movies:
+            for r in db.execute("SELECT id, title FROM movies ORDER BY id"):
+                movie_ids.setdefault(r[1], r[0])
+        db.executemany(
+            "UPDATE movies SET poster_url = ? WHERE id = ? AND poster_url IS NOT ?",
+            [(p, movie_ids[t], p) for t, p in posters.items() if t not in new_movies]
+        )
+
+        # ---- 場次：與資料庫及檔案內重複的略過 ----
+        # 以 (電影, slot) 比對：slot 由星期與時間的數值算出，「9:30」與「09:30」視為同一場
+        existing = {tuple(r) for r in db.execute("SELECT movie_id, slot FROM showtimes")}
+        new_showtimes = []
+        for title, _, weekday, time_val, seats in rows:
+            code, slot = showtime_slot(weekday, time_val)
+            key = (movie_ids[title], slot)
+            if key in existing:
+                continue
+            existing.add(key)
+            new_showtimes.append((key[0], weekday, code, slot, time_val, seats))
+        db.executemany(
+            "INSERT INTO showtimes (movie_id, weekday, weekday_code, slot, time, total_seats) VALUES (?, ?, ?, ?, ?, ?)",
+            new_showtimes
+        )
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": len(rows),
+        "movies_created": len(new_movies),
+        "showtimes_created": len(new_showtimes),
+        "duplicates": len(rows) - len(new_showtimes),
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(len(rows) / elapsed) if elapsed else None,
+    }
@@ -0,0 +1,113 @@
+"""
+座位圖：每個場次一個 bitmap（seat_maps.bitmap），第 i 個 bit 為 1 代表第 i 個座位已售出。
+
+座位依「排」編號：第 r 排第 c 個座位的編號是 r * cols + c。
+最後一排不滿時，超出 total_seats 的位置在建立時就標成已占用，配位時自然會跳過。
+容量檢查仍以 showtimes.booked_seats 為準，座位圖只決定坐哪裡。
+"""
+SEATS_PER_ROW = 20
+
+
+class SeatTaken(Exception):
+    """指定的座位已被占用或不存在"""
+
+
+def layout_for(total_seats, cols=SEATS_PER_ROW):
+    """回傳 (rows, cols)"""
+    cols = max(min(cols, total_seats), 1)
+    return (total_seats + cols - 1) // cols, cols
+
+
+def build_bitmap(total_seats, taken=(), legacy=0, cols=SEATS_PER_ROW):
+    """建立座位圖，回傳 (rows, cols, bits)
+
+    taken 為已指定座位的訂單所占的座位；legacy 為沒有座位資料的舊訂單張數，
+    依序占用剩下的空位。
+    """
+    rows, cols = layout_for(total_seats, cols)
+    capacity = rows * cols
+    bits = ((1 << capacity) - 1) ^ ((1 << total_seats) - 1)    # 不存在的座位
+    for i in taken:
+        bits |= 1 << i
+    i = 0
+    while legacy > 0 and i < capacity:
+        if not bits >> i & 1:
+            bits |= 1 << i
+            legacy -= 1
+        i += 1
+    return rows, cols, bits
+
+
+def to_bytes(bits, capacity):
+    return bits.to_bytes((capacity + 7) // 8, "little")
+
+
+def from_bytes(blob):
+    return int.from_bytes(blob, "little")
+
+
+def free_count(bits, capacity):
+    return capacity - bin(bits & ((1 << capacity) - 1)).count("1")
+
+
+def find_adjacent(bits, rows, cols, n):
+    """找同一排連續 n 個空位，回傳座位編號列表；沒有時回傳 None。優先選靠中間的排"""
+    if n > cols:
+        return None
+    row_mask = (1 << cols) - 1
+    # 由中間往前後兩側找
+    order = sorted(range(rows), key=lambda r: abs(r - rows // 2))
+    for r in order:
+        free = ~(bits >> (r * cols)) & row_mask
+        # 連續 n 個 1 的起點：把 free 與自己右移後的結果連續 AND n-1 次
+        starts = free
+        for _ in range(n - 1):
+            starts &= starts >> 1
+        if starts:
+            # 取最靠近該排中間的起點
+            candidates = [c for c in range(cols - n + 1) if starts >> c & 1]
+            c = min(candidates, key=lambda c: abs(c + n / 2 - cols / 2))
+            return [r * cols + c + i for i in range(n)]
+    return None
+
+
+def allocate(bits, rows, cols, n):
+    """配 n 個座位：優先同排相鄰，否則依序取空位；不夠時回傳 None"""
+    seats = find_adjacent(bits, rows, cols, n)
+    if seats is not None:
+        return seats
+    seats = []
+    for i in range(rows * cols):
+        if not bits >> i & 1:
+            seats.append(i)
+            if len(seats) == n:
+                return seats
+    return None
+
+
+def claim(bits, seats, capacity):
+    for i in seats:
+        if i < 0 or i >= capacity or bits >> i & 1:
+            raise SeatTaken(i)
+        bits |= 1 << i
+    return bits
+
+
+def release(bits, seats):
+    for i in seats:
+        bits &= ~(1 << i)
+    return bits
+
+
+def seat_label(i, cols):
+    row, col = divmod(i, cols)
+    return f"{row + 1}排{col + 1}號"
+
+
+def parse_seats(text):
+    """'3,4,5' → [3, 4, 5]；空字串回傳 []"""
+    return [int(s) for s in text.split(",") if s.strip()] if text else []
+
+
+def format_seats(seats):
+    return ",".join(str(i) for i in seats)
@@ -0,0 +1,165 @@
+"""
+分片訂單儲存：依 showtime_id 把場次的訂單與座位狀態分到 N 個 SQLite 檔
+（database.db → database.shard0.db、database.shard1.db …），不同分片的訂票各自持有
+自己的寫入鎖，可以同時 commit。
+
+分片檔裡的 showtimes（只有座位欄位）、bookings、seat_maps、seat_holds 與主資料庫同名同欄位，
+app.py 裡操作這些表的函式可以直接拿分片連線使用。電影、場次資訊、帳號仍在主資料庫；
+場次第一次訂票時才登記到所屬分片，登記後已售座位與訂單都以分片為準。
+跨分片的讀取由 fan_out() 平行查詢每個分片，再由呼叫端合併。
+
+訂單 id 在所有分片間不重複且大致依時間遞增（微秒時間戳 × MAX_SHARDS + 分片編號），
+依 id 由新到舊分頁時合併各分片的結果即可。分片數決定後就不能再改，否則場次會對到別的檔案。
+"""
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from db_pool import ConnectionPool
+
+MAX_SHARDS = 64
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS showtimes (
+        id INTEGER PRIMARY KEY,
+        total_seats INTEGER NOT NULL,
+        booked_seats INTEGER NOT NULL DEFAULT 0,
+        held_seats INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS bookings (
+        id INTEGER PRIMARY KEY,
+        order_no TEXT UNIQUE,
+        showtime_id INTEGER NOT NULL,
+        customer_name TEXT NOT NULL,
+        tickets INTEGER NOT NULL,
+        seats TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_bookings_showtime_id ON bookings (showtime_id);
+    CREATE INDEX IF NOT EXISTS idx_bookings_customer_name ON bookings (customer_name);
+    CREATE TABLE IF NOT EXISTS seat_maps (
+        showtime_id INTEGER PRIMARY KEY,
+        rows INTEGER NOT NULL,
+        cols INTEGER NOT NULL,
+        bitmap BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS seat_holds (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        token TEXT UNIQUE NOT NULL,
+        showtime_id INTEGER NOT NULL,
+        customer_name TEXT NOT NULL,
+        tickets INTEGER NOT NULL,
+        seats TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+"""
+
+
+def shard_path(database, index):
+    root, ext = os.path.splitext(database)
+    return f"{root}.shard{index}{ext or '.db'}"
+
+
+def next_booking_id(db, index):
+    """在分片的寫入交易內取下一個訂單 id"""
+    last = db.execute("SELECT MAX(id) FROM bookings").fetchone()[0] or 0
+    stamp = max(time.time_ns() // 1000, last // MAX_SHARDS + 1)
+    return stamp * MAX_SHARDS + index
+
+
+class ShardSet:
+    def __init__(self, database, count, pool_size=8):
+        if not 0 < count <= MAX_SHARDS:
+            raise ValueError(f"分片數必須介於 1 到 {MAX_SHARDS}")
+        self.database = database
+        self.count = count
+        self.pid = os.getpid()
+        self.paths = [shard_path(database, i) for i in range(count)]
+        for path in self.paths:
+            db = sqlite3.connect(path)
+            db.executescript(SCHEMA)
+            db.close()
+        self.pools = [ConnectionPool(path, size=pool_size) for path in self.paths]
+        # 每個分片一條執行緒；sqlite3 查詢時會釋放 GIL，各分片的查詢可以真的同時跑
+        self._executor = ThreadPoolExecutor(max_workers=count, thread_name_prefix="shard")
+
+    def index_for(self, showtime_id):
+        return showtime_id % self.count
+
+    @contextmanager
+    def connect(self, index):
+        pool = self.pools[index]
+        db = pool.acquire()
+        try:
+            yield db
+        finally:
+            pool.release(db)
+
+    def fan_out(self, fn, *args):
+        """在每個分片上平行執行 fn(db, *args)，依分片順序回傳結果"""
+        def run(index):
+            with self.connect(index) as db:
+                return fn(db, *args)
+        if self.count == 1:
+            return [run(0)]
+        return list(self._executor.map(run, range(self.count)))
+
+    def import_from(self, main):
+        """把主資料庫的訂單搬到各分片，回傳搬移筆數；中途失敗可以直接重跑
+
+        整個搬移期間都持有主資料庫的寫入鎖：讀第一個分片之前就 BEGIN IMMEDIATE，
+        清掉主資料庫的訂單後才 commit，搬移中間不會有新的訂單或保留寫進主資料庫而被一起清掉。
+        各分片的已售座位依搬過去的訂單重算，座位圖刪掉讓下次訂票時依訂單重建；
+        分片先各自 commit，主資料庫最後才 commit，中途失敗時主資料庫不變，重跑時已搬的訂單會略過。
+        """
+        main.execute("BEGIN IMMEDIATE")
+        try:
+            if main.execute("SELECT 1 FROM seat_holds LIMIT 1").fetchone():
+                raise RuntimeError("還有座位保留，請等保留過期或歸還後再搬移")
+            moved = 0
+            for index in range(self.count):
+                moved += self._import_shard(main, index)
+            main.execute("DELETE FROM bookings")
+            main.execute("DELETE FROM seat_maps")
+            main.execute("UPDATE showtimes SET booked_seats = 0 WHERE booked_seats != 0")
+            main.commit()
+        except BaseException:
+            main.rollback()
+            raise
+        return moved
+
+    def _import_shard(self, main, index):
+        with self.connect(index) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany(
+                    "INSERT OR IGNORE INTO showtimes (id, total_seats) VALUES (?, ?)",
+                    main.execute(
+                        "SELECT id, total_seats FROM showtimes WHERE id % ? = ?", (self.count, index)
+                    )
+                )
+                cur = db.executemany("""
+                    INSERT OR IGNORE INTO bookings (id, order_no, showtime_id, customer_name, tickets, seats, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, main.execute("""
+                    SELECT id, order_no, showtime_id, customer_name, tickets, seats, created_at
+                    FROM bookings WHERE showtime_id % ? = ?
+                """, (self.count, index)))
+                db.execute("""
+                    UPDATE showtimes SET booked_seats = (
+                        SELECT IFNULL(SUM(tickets), 0) FROM bookings b WHERE b.showtime_id = showtimes.id
+                    )
+                """)
+                db.execute("DELETE FROM seat_maps WHERE showtime_id IN (SELECT DISTINCT showtime_id FROM bookings)")
+                db.commit()
+            except BaseException:
+                db.rollback()
+                raise
+        return cur.rowcount
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        for pool in self.pools:
+            pool.close()
@@ -0,0 +1,6 @@
+"""
+自動化測試。根目錄的 test.py 是產生簡報的腳本，不要用沒有參數的 python -m unittest。
+
+執行方式（在專案根目錄）：
+    python -m unittest discover tests
+"""
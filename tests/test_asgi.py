@@ -0,0 +1,183 @@
+"""
+ASGI 模式（asgi.AsgiApp）：直接以 ASGI 介面呼叫，不需要 uvicorn。
+
+執行方式（在專案根目錄）：
+    python -m unittest discover tests
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+import app as movie_app
+import asgi
+from admission import ConcurrencyLimiter, RateLimiter
+
+
+def _scope(method, path, headers=(), query_string=b""):
+    return {
+        "type": "http", "method": method, "path": path, "query_string": query_string,
+        "headers": list(headers), "http_version": "1.1", "scheme": "http",
+        "server": ("127.0.0.1", 8000), "client": ("10.0.0.1", 5555), "root_path": "",
+    }
+
+
+async def request(application, method, path, form=None, cookie=None):
+    """送一個請求，回傳 {"status", "headers", "body"}；cookie 給 list 時每個各自一個 Cookie 標頭"""
+    headers = []
+    body = form.encode() if form else b""
+    if form:
+        headers.append((b"content-type", b"application/x-www-form-urlencoded"))
+    for value in (cookie if isinstance(cookie, list) else [cookie] if cookie else []):
+        headers.append((b"cookie", value))
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    response = {"body": b""}
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = dict(message["headers"])
+        else:
+            response["body"] += message.get("body", b"")
+
+    await application(_scope(method, path, headers), receive, send)
+    return response
+
+
+class AsgiTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved = {name: getattr(movie_app, name)
+                      for name in ("DATABASE", "ADMISSION_CONTROL", "booking_slots", "rate_limiters")}
+        movie_app.DATABASE = os.path.join(self.tmp.name, "asgi.db")
+        movie_app.ADMISSION_CONTROL = True
+        movie_app.booking_slots = ConcurrencyLimiter(1, 4, 2)
+        movie_app.rate_limiters = {name: RateLimiter(1000, 1000) for name in self.saved["rate_limiters"]}
+        movie_app.init_db()
+        self.application = asgi.AsgiApp(movie_app.app, workers=4)
+
+    def tearDown(self):
+        self.application.close()
+        for name, value in self.saved.items():
+            setattr(movie_app, name, value)
+        self.tmp.cleanup()
+
+    def test_anonymous_booking_does_not_queue_for_a_slot(self):
+        slots = movie_app.booking_slots
+        self.assertTrue(slots.acquire())    # 名額全滿
+        before = slots.stats()
+
+        t0 = time.perf_counter()
+        response = asyncio.run(request(self.application, "POST", "/book/1", "showtime_id=1&tickets=1"))
+        elapsed = time.perf_counter() - t0
+
+        self.assertEqual(response["status"], 302)
+        self.assertIn(b"/login", response["headers"][b"location"])
+        self.assertLess(elapsed, slots.timeout / 2)
+        self.assertEqual(slots.stats(), before)
+        slots.release()
+
+    def login(self):
+        response = asyncio.run(request(self.application, "POST", "/login", "username=testuser&password=1234"))
+        return response["headers"][b"set-cookie"].split(b";")[0]
+
+    def test_split_cookie_headers_keep_the_session(self):
+        session_cookie = self.login()
+        response = asyncio.run(request(
+            self.application, "GET", "/api/orders", cookie=[b"theme=dark", session_cookie, b"lang=zh"]
+        ))
+        self.assertEqual(response["status"], 200)
+
+    def add_showtime(self):
+        db = sqlite3.connect(movie_app.DATABASE)
+        movie_id = db.execute("INSERT INTO movies (title, total_seats) VALUES ('測試', 50)").lastrowid
+        showtime_id = db.execute(
+            "INSERT INTO showtimes (movie_id, weekday, time, total_seats) VALUES (?, '週一', '10:00', 50)",
+            (movie_id,)
+        ).lastrowid
+        db.commit()
+        db.close()
+        return movie_id, showtime_id
+
+    def test_logged_in_booking_takes_and_releases_one_slot(self):
+        slots = movie_app.booking_slots
+        movie_id, showtime_id = self.add_showtime()
+        session_cookie = self.login()
+        active_during = []
+        book_seats = movie_app.book_seats
+
+        def recording_book_seats(*args, **kwargs):
+            active_during.append(slots.active)
+            return book_seats(*args, **kwargs)
+
+        movie_app.book_seats = recording_book_seats
+        try:
+            response = asyncio.run(request(
+                self.application, "POST", f"/book/{movie_id}",
+                f"showtime_id={showtime_id}&tickets=1", session_cookie
+            ))
+        finally:
+            movie_app.book_seats = book_seats
+
+        self.assertEqual(response["status"], 302)
+        self.assertIn(b"/success/", response["headers"][b"location"])
+        self.assertEqual(active_during, [1])
+        stats = slots.stats()
+        self.assertEqual((stats["admitted"], stats["active"], stats["waiting"]), (1, 0, 0))
+
+    def test_rate_limited_booking_gets_429_without_queueing(self):
+        slots = movie_app.booking_slots
+        movie_id, showtime_id = self.add_showtime()
+        session_cookie = self.login()
+        movie_app.rate_limiters["book_user"] = RateLimiter(1, 0)    # 一個 token 都沒有
+        self.assertTrue(slots.acquire())
+        before = slots.stats()
+
+        t0 = time.perf_counter()
+        response = asyncio.run(request(
+            self.application, "POST", f"/book/{movie_id}", f"showtime_id={showtime_id}&tickets=1", session_cookie
+        ))
+        elapsed = time.perf_counter() - t0
+
+        self.assertEqual(response["status"], 429)
+        self.assertIn(b"retry-after", response["headers"])
+        self.assertLess(elapsed, slots.timeout / 2)
+        self.assertEqual(slots.stats(), before)
+        self.assertEqual(movie_app.rate_limiters["book_user"].stats()["rejected"], 1)
+        slots.release()
+
+    def test_sse_disconnect_releases_subscriber(self):
+        live = movie_app.live_availability
+        before = live.subscribers
+        during = []
+
+        async def stream():
+            disconnected = asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if b"event: snapshot" in message.get("body", b""):
+                    during.append(live.subscribers)
+                    disconnected.set()
+
+            await asyncio.wait_for(
+                self.application(_scope("GET", asgi.LIVE_PATH), receive, send), timeout=5
+            )
+
+        asyncio.run(stream())
+        self.assertEqual(during, [before + 1])
+        self.assertEqual(live.subscribers, before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+"""
+熱門查詢的查詢計畫：在套用全部 migration 的空資料庫上跑 app.HOT_QUERIES 的 EXPLAIN QUERY PLAN。
+
+執行方式（在專案根目錄）：
+    python -m unittest discover tests
+"""
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import app
+from migrations import migrate
+
+
+class QueryPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = sqlite3.connect(os.path.join(self.tmp.name, "plans.db"))
+        migrate(self.db)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_hot_queries_use_indexes(self):
+        plans = app.explain_hot_queries(self.db)
+        self.assertEqual(app.unexpected_full_scans(plans), [], plans)
+
+    def test_allowed_steps_still_happen(self):
+        # 允許清單裡的步驟已經不會出現時要拿掉，不要留著掩蓋以後的退化
+        plans = app.explain_hot_queries(self.db)
+        for name, (_, _, allowed) in app.HOT_QUERIES.items():
+            for step in allowed:
+                self.assertIn(step, plans[name], name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+星期的正規化：員工輸入的「一」「星期一」「禮拜一」都統一成「週一」。
+
+場次寫入時一併算好 weekday_code 與 slot（見 showtime_slot()），
+讀取時直接 ORDER BY slot，不必每次在 Python 裡正規化再排序。
+"""
+import re
+
+WEEKDAY_ORDER = {"週一": 1, "週二": 2, "週三": 3, "週四": 4, "週五": 5, "週六": 6, "週日": 7}
+
+WEEKDAY_ALIASES = {
+    "一": "週一", "星期一": "週一", "禮拜一": "週一", "週一": "週一",
+    "二": "週二", "星期二": "週二", "禮拜二": "週二", "週二": "週二",
+    "三": "週三", "星期三": "週三", "禮拜三": "週三", "週三": "週三",
+    "四": "週四", "星期四": "週四", "禮拜四": "週四", "週四": "週四",
+    "五": "週五", "星期五": "週五", "禮拜五": "週五", "週五": "週五",
+    "六": "週六", "星期六": "週六", "禮拜六": "週六", "週六": "週六",
+    "日": "週日", "天": "週日", "星期日": "週日", "禮拜日": "週日", "週日": "週日",
+}
+
+
+def normalize_weekday(w):
+    """回傳標準寫法（週一～週日）；認不得的原樣回傳"""
+    if not w:
+        return ""
+    w = w.strip()
+    return WEEKDAY_ALIASES.get(w, w)
+
+
+UNKNOWN_WEEKDAY = 8     # 認不得的星期排在最後
+_TIME_RE = re.compile(r"^\s*(\d{1,2}):(\d{2})")
+_FULL_TIME_RE = re.compile(r"^(\d{1,2}):(\d{2})$")
+
+
+def normalize_time(time_val):
+    """「9:30」統一成「09:30」，與匯入的場次寫法相同；其他寫法原樣回傳"""
+    time_val = (time_val or "").strip()
+    match = _FULL_TIME_RE.match(time_val)
+    return f"{int(match.group(1)):02d}:{match.group(2)}" if match else time_val
+
+
+def showtime_slot(weekday, time_val):
+    """回傳 (weekday_code, slot)；weekday 應已正規化
+
+    slot = weekday_code * 10000 + HHMM，依 slot 排序就是依星期、時間排序；
+    時間格式不對的排在當天最後。
+    """
+    code = WEEKDAY_ORDER.get(weekday, UNKNOWN_WEEKDAY)
+    match = _TIME_RE.match(time_val or "")
+    hhmm = int(match.group(1)) * 100 + int(match.group(2)) if match else 9999
+    return code, code * 10000 + hhmm